@@ -12,15 +12,22 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import time
+
+# To measure the add-on time-to-ready: from the import of the package to the end of register().
+_IMPORT_START_TIME = time.perf_counter()
+
 import bpy
 from bpy.utils import register_class
 from bpy.utils import unregister_class
 
 from . import mblab_tools
-from . mblab_tools import is_female
-from . mblab_tools import is_male
+from . mblab_tools import cached_setup_updates
 from . mblab_tools import is_mblab_body
+from . mblab_tools import mblab_phenotype
+from . mblab_tools import CheckSetupUpdates
 from . mblab_tools import SetupMBLabCharacter
+from . mblab_tools import SetupMBLabCharacters
 
 from . mblab_tools import RemoveAnimationFromFingers
 from . mblab_tools import SetRelaxedPoseToFingers
@@ -29,11 +36,14 @@ from . mblab_tools import ResetCharacterPose
 
 from . vertex_utils import LoadVertexGroups
 from . vertex_utils import SaveVertexGroups
+from . vertex_utils import SaveAllVertexGroups
 
 from . anim_utils import SetDummyUserToAllActions
 from . anim_utils import AddStartEndFramesToAllAnimationCurves
 from . anim_utils import CreateAPoseAction
 
+from . shape_key_utils import PrepareShapeKeysForExport
+
 from . import shape_key_utils
 from . import vertex_utils
 from . import anim_utils
@@ -56,6 +66,14 @@ YALLAH_VERSION = ".".join([str(n) for n in bl_info["version"]])
 YALLAH_DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 YALLAH_FEATURES_DIR = os.path.join(os.path.dirname(__file__), "features")
 
+# Seconds from the import of the package to the end of register(). Set by register().
+YALLAH_READY_SECONDS = None
+
+
+# By mblab_tools.mblab_phenotype()
+PHENOTYPE_LABELS = {'female': "MBLab Female Character", 'male': "MBLab Male Character"}
+PHENOTYPE_CLOTHES_MASK_FILES = {'female': "ClothesMasks-F_CA01.json", 'male': "ClothesMasks-M_CA01.json"}
+
 
 class YALLAH_PT_main_panel(bpy.types.Panel):
     bl_idname = "YALLAH_PT_main_panel"
@@ -74,28 +92,42 @@ class YALLAH_PT_main_panel(bpy.types.Panel):
         #
         # MESH selected
         elif obj.type == 'MESH':
-            if not is_mblab_body(mesh_obj=obj):
-                layout.row().label(text="The MESH must be a _finalized_ MBLab character")
+            phenotype = mblab_phenotype(mesh_obj=obj)
+            if phenotype is None:
+                if not is_mblab_body(mesh_obj=obj):
+                    layout.row().label(text="The MESH must be a _finalized_ MBLab character")
+                else:
+                    layout.label(text="Not an MBLab supported phenotype (male or female)")
                 return
 
-            if is_female(mesh_obj=obj):
-                layout.row().label(text="MBLab Female Character")
-                clothes_mask_file = "ClothesMasks-F_CA01.json"
-            elif is_male(mesh_obj=obj):
-                layout.row().label(text="MBLab Male Character")
-                clothes_mask_file = "ClothesMasks-M_CA01.json"
-            else:
-                layout.label("Not an MBLab supported phenotype (male or female)")
-                return
+            layout.row().label(text=PHENOTYPE_LABELS[phenotype])
+            clothes_mask_file = PHENOTYPE_CLOTHES_MASK_FILES[phenotype]
         
             # SETUP
             row = layout.row()
             box = row.box()
             box.label(text="Setup:")
             if obj.yallah_setup_done:
-                box.label(text="Setup already performed.")
+                # Resolving the features imports them and reads their data files: only on request.
+                updates = cached_setup_updates(mesh_obj=obj)
+                if updates is None:
+                    box.label(text="Setup already performed.")
+                    box.operator(CheckSetupUpdates.bl_idname, text="Check for updates")
+                else:
+                    outdated, error = updates
+                    if error is not None:
+                        box.label(text=error)
+                    elif len(outdated) == 0:
+                        box.label(text="Setup already performed and up to date.")
+                    else:
+                        box.label(text="Outdated features: " + ", ".join(outdated))
+                        box.operator(SetupMBLabCharacter.bl_idname, text="Update the setup")
+                op = box.operator(SetupMBLabCharacter.bl_idname, text="Generate LODs")
+                op.features = "LOD"
             else:
                 box.operator(SetupMBLabCharacter.bl_idname, text="Setup an MBLab character")
+            if len(context.selected_objects) > 1:
+                box.operator(SetupMBLabCharacters.bl_idname, text="Setup the selected MBLab characters")
 
             # CLOTHES
             row = layout.row()
@@ -106,6 +138,13 @@ class YALLAH_PT_main_panel(bpy.types.Panel):
             op.vertex_groups_filename = os.path.join(YALLAH_DATA_DIR, clothes_mask_file)
             op.replace_existing = True
 
+            # EXPORT
+            if obj.yallah_setup_done:
+                row = layout.row()
+                box = row.box()
+                box.label(text="Export:")
+                box.operator(PrepareShapeKeysForExport.bl_idname)
+
         #
         # ARMATURE selected
         elif obj.type == 'ARMATURE':
@@ -134,14 +173,21 @@ classes = (YALLAH_PT_main_panel,)
 
 
 def register():
+    global YALLAH_READY_SECONDS
+
     mblab_tools.register()
     shape_key_utils.register()
     vertex_utils.register()
     anim_utils.register()
 
-    # 2.83 api for (un)registering
-    for cls in classes:
-        register_class(cls)
+    # The UI is of no use in background mode (e.g., headless render nodes and batch setups)
+    if not bpy.app.background:
+        # 2.83 api for (un)registering
+        for cls in classes:
+            register_class(cls)
+
+    YALLAH_READY_SECONDS = time.perf_counter() - _IMPORT_START_TIME
+    print("YALLAH {} ready in {:.1f} ms".format(YALLAH_VERSION, YALLAH_READY_SECONDS * 1000))
 
 
 def unregister():
@@ -150,9 +196,10 @@ def unregister():
     vertex_utils.unregister()
     anim_utils.unregister()
 
-    # 2.83 api for (un)registering
-    for cls in reversed(classes):
-        unregister_class(cls)
+    if not bpy.app.background:
+        # 2.83 api for (un)registering
+        for cls in reversed(classes):
+            unregister_class(cls)
 
 
 if __name__ == "__main__":
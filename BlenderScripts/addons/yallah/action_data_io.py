@@ -0,0 +1,313 @@
+# Bulk reading and writing of the keyframes of many actions, as a columnar .npz container.
+#
+# The keyframes of all the F-Curves of all the actions are concatenated into a few arrays:
+# * action_names (n_actions) and action_curve_offsets (n_actions + 1): the curves of action i are
+#   action_curve_offsets[i]:action_curve_offsets[i+1];
+# * curve_data_paths, curve_array_indices, curve_groups (n_curves) and curve_key_offsets (n_curves + 1):
+#   the keyframes of curve j are curve_key_offsets[j]:curve_key_offsets[j+1];
+# * co, handle_left, handle_right (n_keys, 2) float32, and the enum properties (interpolation, ...) as int8.
+#   The identifiers of the enum items are saved in enum_<property>, so the values can be mapped back by name.
+#
+# Members are stored uncompressed, so that load_action_data() can memory-map them (zero-copy).
+#
+# The bpy objects are accessed only through their properties: this module can be used outside Blender
+# to inspect the files, e.g.:
+#   python action_data_io.py exported_actions.npz
+
+import struct
+import zipfile
+
+import numpy as np
+
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+ACTION_DATA_FORMAT_VERSION = 1
+
+# The Keyframe properties that can be transferred in bulk with foreach_get/foreach_set, with their width.
+KEYFRAME_FLOAT_ATTRIBUTES = [("co", 2), ("handle_left", 2), ("handle_right", 2)]
+KEYFRAME_ENUM_ATTRIBUTES = ["interpolation", "handle_left_type", "handle_right_type", "easing"]
+
+ENUM_ITEMS_PREFIX = "enum_"
+
+# The size of the fixed part of a zip local file header
+ZIP_LOCAL_HEADER_SIZE = 30
+
+
+def read_actions(actions: list) -> Dict[str, np.ndarray]:
+    """Read the keyframes of the actions, with one foreach_get per F-Curve and property.
+
+    :param actions: The bpy.types.Action to read.
+    :return: The columnar arrays described at the top of this module.
+    """
+    import bpy
+
+    curves = [(action_idx, fc) for action_idx, action in enumerate(actions) for fc in action.fcurves]
+    curve_lengths = np.array([len(fc.keyframe_points) for _, fc in curves], dtype=np.int64)
+    curve_key_offsets = np.concatenate(([0], np.cumsum(curve_lengths))).astype(np.int64)
+    n_keys = int(curve_key_offsets[-1])
+
+    curve_actions = np.array([action_idx for action_idx, _ in curves], dtype=np.int64)
+    action_curve_offsets = np.searchsorted(curve_actions, np.arange(len(actions) + 1)).astype(np.int64)
+
+    out = {
+        "format_version": np.array(ACTION_DATA_FORMAT_VERSION, dtype=np.int32),
+        "action_names": np.array([action.name for action in actions], dtype=np.str_),
+        "action_curve_offsets": action_curve_offsets,
+        "curve_data_paths": np.array([fc.data_path for _, fc in curves], dtype=np.str_),
+        "curve_array_indices": np.array([fc.array_index for _, fc in curves], dtype=np.int32),
+        "curve_groups": np.array([fc.group.name if fc.group is not None else "" for _, fc in curves], dtype=np.str_),
+        "curve_key_offsets": curve_key_offsets,
+    }  # type: Dict[str, np.ndarray]
+
+    # Each curve is read straight into its slice of the (contiguous) output buffers.
+    for attr, width in KEYFRAME_FLOAT_ATTRIBUTES:
+        buf = np.empty(n_keys * width, dtype=np.float32)
+        for (_, fc), start, end in zip(curves, curve_key_offsets[:-1], curve_key_offsets[1:]):
+            fc.keyframe_points.foreach_get(attr, buf[start * width:end * width])
+        out[attr] = buf.reshape(n_keys, width)
+
+    keyframe_props = bpy.types.Keyframe.bl_rna.properties
+    for attr in KEYFRAME_ENUM_ATTRIBUTES:
+        buf = np.empty(n_keys, dtype=np.int32)
+        for (_, fc), start, end in zip(curves, curve_key_offsets[:-1], curve_key_offsets[1:]):
+            fc.keyframe_points.foreach_get(attr, buf[start:end])
+        out[attr] = buf.astype(np.int8)
+        out[ENUM_ITEMS_PREFIX + attr] = enum_identifiers_table(keyframe_props[attr].enum_items)
+
+    return out
+
+
+def enum_identifiers_table(enum_items) -> np.ndarray:
+    """The identifiers of the enum items, indexed by their value (foreach_get reads the values, not the positions)."""
+
+    table = np.full(max(item.value for item in enum_items) + 1, "", dtype=object)
+    for item in enum_items:
+        table[item.value] = item.identifier
+
+    return table.astype(np.str_)
+
+
+def json_to_arrays(actions: Dict[str, dict]) -> Dict[str, np.ndarray]:
+    """Convert actions in the ExportActionData JSON format into the columnar arrays (keyframe times and values only).
+
+    :param actions: {action_name: {data_path: {array_index: [[time, value], ...]}}}
+    """
+
+    action_names = []
+    action_curve_offsets = [0]
+    curve_data_paths = []
+    curve_array_indices = []
+    curve_key_offsets = [0]
+    co = []
+    for action_name, action_dict in actions.items():
+        action_names.append(action_name)
+        for data_path, index_dict in action_dict.items():
+            for array_index, points in index_dict.items():
+                curve_data_paths.append(data_path)
+                curve_array_indices.append(int(array_index))
+                curve_key_offsets.append(curve_key_offsets[-1] + len(points))
+                co.extend(points)
+        action_curve_offsets.append(len(curve_data_paths))
+
+    return {
+        "format_version": np.array(ACTION_DATA_FORMAT_VERSION, dtype=np.int32),
+        "action_names": np.array(action_names, dtype=np.str_),
+        "action_curve_offsets": np.array(action_curve_offsets, dtype=np.int64),
+        "curve_data_paths": np.array(curve_data_paths, dtype=np.str_),
+        "curve_array_indices": np.array(curve_array_indices, dtype=np.int32),
+        "curve_groups": np.full(len(curve_data_paths), "", dtype=np.str_),
+        "curve_key_offsets": np.array(curve_key_offsets, dtype=np.int64),
+        "co": np.array(co, dtype=np.float32).reshape(-1, 2),
+    }
+
+
+class ActionData:
+    """The arrays of an action data container, with the access to the curves of each action."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.arrays = arrays
+
+        self.action_names = [str(name) for name in arrays["action_names"]]  # type: List[str]
+        self.action_curve_offsets = arrays["action_curve_offsets"]
+        self.curve_data_paths = arrays["curve_data_paths"]
+        self.curve_array_indices = arrays["curve_array_indices"]
+        self.curve_groups = arrays["curve_groups"]
+        self.curve_key_offsets = arrays["curve_key_offsets"]
+
+    def __getitem__(self, item: str) -> np.ndarray:
+        return self.arrays[item]
+
+    def n_keys(self) -> int:
+        return int(self.curve_key_offsets[-1])
+
+    def curves(self, action_idx: int) -> Iterator[Tuple[str, int, str, int, int]]:
+        """The curves of an action, as (data_path, array_index, group, first_key, end_key)."""
+
+        for j in range(self.action_curve_offsets[action_idx], self.action_curve_offsets[action_idx + 1]):
+            yield str(self.curve_data_paths[j]), int(self.curve_array_indices[j]), str(self.curve_groups[j]), \
+                int(self.curve_key_offsets[j]), int(self.curve_key_offsets[j + 1])
+
+    def to_json_dict(self, action_idx: int) -> dict:
+        """The keyframe times and values of an action, in the original ExportActionData JSON format:
+        {data_path: {array_index: [[time, value], ...]}}"""
+
+        co = self.arrays["co"]
+        out = {}
+        for data_path, array_index, _, start, end in self.curves(action_idx):
+            out.setdefault(data_path, {})[array_index] = co[start:end].tolist()
+
+        return out
+
+
+def write_action(action, data: ActionData, action_idx: int) -> int:
+    """Create the F-Curves of an action of the container into the (empty) bpy action.
+    Each curve is allocated with keyframe_points.add(), filled with one foreach_set per property, and updated once.
+
+    :return: The number of keyframes written.
+    """
+    import bpy
+
+    keyframe_props = bpy.types.Keyframe.bl_rna.properties
+
+    # Map the saved enum values to the ones of this Blender version, through their identifiers.
+    enum_maps = {}  # type: Dict[str, np.ndarray]
+    for attr in KEYFRAME_ENUM_ATTRIBUTES:
+        if attr not in data.arrays or ENUM_ITEMS_PREFIX + attr not in data.arrays:
+            continue
+        current_values = {item.identifier: item.value for item in keyframe_props[attr].enum_items}
+        saved_identifiers = [str(identifier) for identifier in data[ENUM_ITEMS_PREFIX + attr]]
+        unknown = [identifier for identifier in saved_identifiers
+                   if identifier != "" and identifier not in current_values]
+        if len(unknown) > 0:
+            raise Exception("Unknown values {} for Keyframe.{}".format(unknown, attr))
+        enum_maps[attr] = np.array([current_values.get(identifier, 0) for identifier in saved_identifiers],
+                                   dtype=np.int32)
+
+    n_keys = 0
+    for data_path, array_index, group, start, end in data.curves(action_idx):
+        if group != "":
+            fc = action.fcurves.new(data_path, index=array_index, action_group=group)
+        else:
+            fc = action.fcurves.new(data_path, index=array_index)
+
+        fc.keyframe_points.add(end - start)
+        for attr, width in KEYFRAME_FLOAT_ATTRIBUTES:
+            if attr in data.arrays:
+                values = np.ascontiguousarray(data[attr][start:end], dtype=np.float32)
+                fc.keyframe_points.foreach_set(attr, values.ravel())
+        for attr, values_map in enum_maps.items():
+            fc.keyframe_points.foreach_set(attr, values_map[data[attr][start:end].astype(np.int64)])
+
+        # Sorts the keyframes and computes the automatic handles
+        fc.update()
+        n_keys += end - start
+
+    return n_keys
+
+
+def save_action_data(filename: str, arrays: Dict[str, np.ndarray]) -> None:
+    """Save the arrays returned by read_actions(). Members are not compressed, to allow memory mapping."""
+    np.savez(filename, **arrays)
+
+
+def _memmap_member(filename: str, info: zipfile.ZipInfo) -> Optional[np.ndarray]:
+    """Memory-map an uncompressed .npy member of a zip file. None for empty and scalar arrays, which can't be mapped."""
+
+    with open(filename, "rb") as in_file:
+        in_file.seek(info.header_offset)
+        local_header = in_file.read(ZIP_LOCAL_HEADER_SIZE)
+        name_length, extra_length = struct.unpack("<HH", local_header[26:30])
+        in_file.seek(info.header_offset + ZIP_LOCAL_HEADER_SIZE + name_length + extra_length)
+
+        version = np.lib.format.read_magic(in_file)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(in_file)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(in_file)
+        data_offset = in_file.tell()
+
+    if len(shape) == 0 or 0 in shape:
+        return None
+
+    return np.memmap(filename, dtype=dtype, mode="r", offset=data_offset, shape=shape,
+                     order="F" if fortran_order else "C")
+
+
+def load_action_data(filename: str) -> ActionData:
+    """Load a container written by save_action_data().
+    The arrays are memory-mapped: the keyframes are read from the disk only when accessed.
+    Compressed members (e.g., if the file was re-saved with np.savez_compressed), empty and scalar arrays
+    are read normally."""
+
+    arrays = {}  # type: Dict[str, np.ndarray]
+    with zipfile.ZipFile(filename) as zip_file:
+        for info in zip_file.infolist():
+            if not info.filename.endswith(".npy"):
+                continue
+            key = info.filename[:-len(".npy")]
+            if info.compress_type == zipfile.ZIP_STORED:
+                array = _memmap_member(filename, info)
+                if array is not None:
+                    arrays[key] = array
+                    continue
+            with zip_file.open(info) as member:
+                arrays[key] = np.lib.format.read_array(member)
+
+    version = int(arrays["format_version"])
+    if version > ACTION_DATA_FORMAT_VERSION:
+        raise Exception("Action data file '{}' has format version {}, newer than the supported {}".format(
+            filename, version, ACTION_DATA_FORMAT_VERSION))
+
+    return ActionData(arrays)
+
+
+def is_single_action_json(in_dict: dict) -> bool:
+    """Tells whether a JSON action data file holds a single action {data_path: {array_index: points}},
+    rather than several {action_name: {data_path: {array_index: points}}}."""
+
+    for index_dict in in_dict.values():
+        for points in index_dict.values():
+            return isinstance(points, list)
+
+    return True
+
+
+def load_action_file(filename: str, single_action_name: str) -> ActionData:
+    """Load a .npz or .json action data file.
+
+    :param single_action_name: The name given to the action of a single-action JSON file.
+    """
+
+    if filename.endswith(".npz"):
+        return load_action_data(filename)
+
+    import json
+
+    with open(filename, "r") as in_file:
+        in_dict = json.load(fp=in_file)
+
+    if type(in_dict) != dict:
+        raise Exception("File '{}' should contain a dictionary at top level".format(filename))
+
+    if is_single_action_json(in_dict):
+        in_dict = {single_action_name: in_dict}
+
+    return ActionData(json_to_arrays(in_dict))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Print the content of a YALLAH action data (.npz) file")
+    parser.add_argument("filename")
+    args = parser.parse_args()
+
+    data = load_action_data(args.filename)
+    for idx, name in enumerate(data.action_names):
+        n_curves = data.action_curve_offsets[idx + 1] - data.action_curve_offsets[idx]
+        print("{}: {} curves".format(name, n_curves))
+    print("Total: {} actions, {} keyframes".format(len(data.action_names), data.n_keys()))
@@ -1,13 +1,32 @@
 import bpy
 import bpy.types
 
+import fnmatch
+import re
+
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
 from typing import Tuple
 
 
-def frame_range(action: bpy.types.Action) -> Tuple[float, float]:
-    """Retrieves the first and the last frame of an action.
-    Replaces the original Action.frame_range property, which is wrongly returning (1.0, 2.0)
-     on animations with a single keyframe."""
+#
+# ACTION CACHES
+# The frame range of each action is computed once and kept until the action changes.
+# Edits done through the UI are detected by a depsgraph handler.
+# Scripts adding or removing keyframes or F-Curves directly must call invalidate_action_caches().
+# F-Curve indices hold live FCurve references, which a script removing curves would leave dangling:
+# they are built once per operator call and passed down (see fcurve_index()), never kept across calls.
+#
+
+# The cached frame ranges, by action pointer, together with the action name (to detect a reused pointer).
+_FRAME_RANGE_CACHE = {}  # type: Dict[int, Tuple[str, Tuple[float, float]]]
+
+def compute_frame_range(action: bpy.types.Action) -> Tuple[float, float]:
+    """Compute the first and the last frame of an action, without the cache.
+    The range of each F-Curve is read with one call, FCurve.range(), instead of reading its first and last keyframes.
+    """
 
     s = None
     e = None
@@ -16,77 +35,331 @@ def frame_range(action: bpy.types.Action) -> Tuple[float, float]:
         raise Exception("No F-Curves defined in action {}".format(action.name))
 
     for fc in action.fcurves:
-        kfps = fc.keyframe_points
-
-        if len(kfps) == 0:
+        if len(fc.keyframe_points) == 0:
             raise Exception("No keyframes for path {}[{}] in action {}".format(fc.data_path, fc.array_index, action.name))
 
-        first_frame = kfps[0].co[0]
-        last_frame = kfps[-1].co[0]
+        first_frame, last_frame = fc.range()
 
-        if s is None:
-            s = first_frame
-        elif first_frame < s:
+        if s is None or first_frame < s:
             s = first_frame
 
-        if e is None:
-            e = last_frame
-        elif last_frame > e:
+        if e is None or last_frame > e:
             e = last_frame
 
     return s, e
 
 
+def frame_range(action: bpy.types.Action) -> Tuple[float, float]:
+    """Retrieves the first and the last frame of an action.
+    Replaces the original Action.frame_range property, which is wrongly returning (1.0, 2.0)
+     on animations with a single keyframe."""
+
+    key = action.as_pointer()
+    cached = _FRAME_RANGE_CACHE.get(key)
+    if cached is not None and cached[0] == action.name_full:
+        return cached[1]
+
+    # Errors (e.g., curves without keyframes) are raised at each call: only valid ranges are cached.
+    action_range = compute_frame_range(action)
+    _FRAME_RANGE_CACHE[key] = action.name_full, action_range
+
+    return action_range
+
+
+# Splits the data_path of a pose bone F-Curve into bone name and property
+BONE_DATA_PATH_RE = re.compile(r'^pose\.bones\["(.+)"\]\.(\w+)$')
+
+
+class FCurveIndex:
+    """The F-Curves of an action, by (bone name, property, array_index).
+    F-Curves not animating a pose bone property are indexed with bone name None and their full data_path as property.
+    """
+
+    def __init__(self, action: bpy.types.Action):
+        self.action_name = action.name_full
+        self.curves = {}  # type: Dict[Tuple[Optional[str], str, int], bpy.types.FCurve]
+        self.bone_curves = {}  # type: Dict[str, List[bpy.types.FCurve]]
+
+        for fc in action.fcurves:
+            match_res = BONE_DATA_PATH_RE.match(fc.data_path)
+            if match_res is not None:
+                bone_name, prop = match_res.group(1), match_res.group(2)
+                self.bone_curves.setdefault(bone_name, []).append(fc)
+            else:
+                bone_name, prop = None, fc.data_path
+            self.curves[bone_name, prop, fc.array_index] = fc
+
+    def find(self, bone_name: Optional[str], prop: str, array_index: int = 0) -> Optional[bpy.types.FCurve]:
+        return self.curves.get((bone_name, prop, array_index))
+
+    def find_channels(self, bone_name: Optional[str], prop: str, n_channels: int) -> List[Optional[bpy.types.FCurve]]:
+        """The curves of the n_channels components of a property (e.g., 4 for rotation_quaternion). None if missing."""
+        return [self.find(bone_name, prop, i) for i in range(n_channels)]
+
+    def bone_names(self) -> Set[str]:
+        return set(self.bone_curves.keys())
+
+    def curves_of_bones(self, bone_names: Set[str]) -> List[bpy.types.FCurve]:
+        return [fc for bone_name in self.bone_curves.keys() & bone_names for fc in self.bone_curves[bone_name]]
+
+
+def fcurve_index(action: bpy.types.Action, indices: Optional[Dict[str, FCurveIndex]] = None) -> FCurveIndex:
+    """The F-Curve index of an action.
+
+    :param indices: The indices already built during the current operator call, by action name (filled here).
+     Functions removing F-Curves must drop the index of the action from it. None to always build a new index.
+    """
+
+    if indices is None:
+        return FCurveIndex(action)
+
+    index = indices.get(action.name_full)
+    if index is None:
+        index = FCurveIndex(action)
+        indices[action.name_full] = index
+
+    return index
+
+
+def invalidate_action_caches(action: Optional[bpy.types.Action] = None) -> None:
+    """Forget the cached frame range of an action, or of all the actions if None."""
+
+    if action is None:
+        _FRAME_RANGE_CACHE.clear()
+    else:
+        _FRAME_RANGE_CACHE.pop(action.as_pointer(), None)
+
+
+@bpy.app.handlers.persistent
+def _action_caches_depsgraph_handler(scene: bpy.types.Scene, depsgraph: bpy.types.Depsgraph) -> None:
+    for update in depsgraph.updates:
+        if isinstance(update.id, bpy.types.Action):
+            invalidate_action_caches(update.id.original)
+
+
+@bpy.app.handlers.persistent
+def _action_caches_clear_handler(dummy) -> None:
+    # After loading a file, undo and redo, the actions are new datablocks: their pointers can be reused.
+    invalidate_action_caches()
+
+
+# The handlers lists and the functions clearing the action caches in them
+_ACTION_CACHES_HANDLERS = [
+    ("depsgraph_update_post", _action_caches_depsgraph_handler),
+    ("load_post", _action_caches_clear_handler),
+    ("undo_post", _action_caches_clear_handler),
+    ("redo_post", _action_caches_clear_handler),
+]
+
+
+def _remove_action_caches_handlers() -> None:
+    """Remove the action caches handlers, by name, so that also the ones of a previously loaded
+    (e.g., hot-reloaded) copy of this module are removed."""
+
+    for list_name, handler in _ACTION_CACHES_HANDLERS:
+        handlers = getattr(bpy.app.handlers, list_name)
+        for h in [h for h in handlers if getattr(h, "__name__", None) == handler.__name__]:
+            handlers.remove(h)
+
+
+# The keyframe easing parameters (of the BACK and ELASTIC interpolations), not part of the action data files.
+KEYFRAME_EASING_ATTRIBUTES = ["back", "amplitude", "period"]
+
+
+def copy_fcurve_modifiers(src: bpy.types.FCurve, dst: bpy.types.FCurve) -> None:
+    """Append to dst a copy of each modifier (e.g., Cycles) of src."""
+
+    for src_mod in src.modifiers:
+        dst_mod = dst.modifiers.new(type=src_mod.type)
+        # Scalars first: the length of some arrays depends on them (e.g., Generator poly_order and coefficients)
+        props = [p for p in src_mod.bl_rna.properties
+                 if not p.is_readonly and p.type not in {'POINTER', 'COLLECTION'} and p.identifier != "rna_type"]
+        for prop in sorted(props, key=lambda p: getattr(p, "is_array", False)):
+            value = getattr(src_mod, prop.identifier)
+            setattr(dst_mod, prop.identifier, value[:] if getattr(prop, "is_array", False) else value)
+
+        if src_mod.type == 'ENVELOPE':
+            for src_point in src_mod.control_points:
+                dst_point = dst_mod.control_points.add(src_point.frame)
+                dst_point.min = src_point.min
+                dst_point.max = src_point.max
+
+
+def copy_fcurve_keyframes(src: bpy.types.FCurve, dst: bpy.types.FCurve) -> None:
+    """Append all the keyframes of src to the (empty) dst curve, with bulk reads and writes.
+    Also the extrapolation and the modifiers of src are copied."""
+    import numpy as np
+    from .action_data_io import KEYFRAME_FLOAT_ATTRIBUTES
+    from .action_data_io import KEYFRAME_ENUM_ATTRIBUTES
+
+    n = len(src.keyframe_points)
+    dst.keyframe_points.add(n)
+
+    for attr, width in KEYFRAME_FLOAT_ATTRIBUTES + [(a, 1) for a in KEYFRAME_EASING_ATTRIBUTES]:
+        buf = np.empty(n * width, dtype=np.float32)
+        src.keyframe_points.foreach_get(attr, buf)
+        dst.keyframe_points.foreach_set(attr, buf)
+
+    for attr in KEYFRAME_ENUM_ATTRIBUTES:
+        buf = np.empty(n, dtype=np.int32)
+        src.keyframe_points.foreach_get(attr, buf)
+        dst.keyframe_points.foreach_set(attr, buf)
+
+    dst.extrapolation = src.extrapolation
+    copy_fcurve_modifiers(src=src, dst=dst)
+
+    dst.update()
+
+
 class ExportActionData(bpy.types.Operator):
-    """Operator to export the animation data of the current action into a JSON file."""
+    """Operator to export the animation data of one, several or all actions into a JSON or NPZ file.
+    The file format is chosen by the extension. See action_data_io for the NPZ layout."""
 
     bl_idname = "yallah.export_action_data"
-    bl_label = """Export the animation data of the current action into a JSON file."""
+    bl_label = """Export the animation data of actions into a JSON or NPZ file."""
+
+    filename: bpy.props.StringProperty(name="Action Data File",
+                                       description="The .json or .npz file that will hold the animation data",
+                                       subtype="FILE_PATH")
+
+    json_filename: bpy.props.StringProperty(name="Action JSON File",
+                                            description="Deprecated: use filename. Used only if filename is empty",
+                                            subtype="FILE_PATH")
+
+    action_names: bpy.props.StringProperty(name="Action Names",
+                                           description="Comma-separated list of the actions to export."
+                                                       " If empty, the action of the active object",
+                                           default="")
 
-    json_filename = bpy.props.StringProperty(name="Action JSON File",
-                                             description="The json file that will hold the animation data",
-                                             subtype="FILE_PATH")
+    all_actions: bpy.props.BoolProperty(name="All Actions",
+                                        description="Export all the actions",
+                                        default=False)
 
     @classmethod
     def poll(cls, context):
-        obj = context.active_object  # type: bpy.types.Object
-        if obj is not None:
-            anim_data = obj.animation_data
-            if anim_data is not None:
-                act = anim_data.action
-                if act is not None:
-                    return True
-
-        return False
+        return len(bpy.data.actions) > 0
 
     def execute(self, context):
 
         import json
+        from .action_data_io import ActionData
+        from .action_data_io import read_actions
+        from .action_data_io import save_action_data
+
+        if self.all_actions:
+            actions = list(bpy.data.actions)
+        elif self.action_names.strip() != "":
+            actions = []
+            for action_name in [name.strip() for name in self.action_names.split(",")]:
+                if action_name not in bpy.data.actions:
+                    self.report({'ERROR'}, "Action '{}' not found".format(action_name))
+                    return {'CANCELLED'}
+                actions.append(bpy.data.actions[action_name])
+        else:
+            obj = context.active_object  # type: bpy.types.Object
+            if obj is None or obj.animation_data is None or obj.animation_data.action is None:
+                self.report({'ERROR'}, "The active object has no action. Set action_names or all_actions.")
+                return {'CANCELLED'}
+            actions = [obj.animation_data.action]
+
+        filename = self.filename
+        if filename == "" and self.json_filename != "":
+            print("WARNING: export_action_data json_filename is deprecated. Use filename.")
+            filename = self.json_filename
+        if filename == "":
+            self.report({'ERROR'}, "Specify the output filename.")
+            return {'CANCELLED'}
+
+        arrays = read_actions(actions)
+
+        if filename.endswith(".npz"):
+            save_action_data(filename, arrays)
+        else:
+            # A single action is saved in the original format: {data_path: {array_index: [[time, value], ...]}}
+            # Several actions are saved by name: {action_name: {data_path: ...}}
+            data = ActionData(arrays)
+            if len(actions) == 1:
+                out_data = data.to_json_dict(0)
+            else:
+                out_data = {name: data.to_json_dict(i) for i, name in enumerate(data.action_names)}
 
-        obj = context.active_object  # type: bpy.types.Object
-        act = obj.animation_data.action
-        fcurves = act.fcurves
+            with open(filename, 'w') as out_file:
+                json.dump(obj=out_data, fp=out_file)
+
+        print("Exported {} actions, {} curves, {} keyframes to '{}'".format(
+            len(actions), len(arrays["curve_data_paths"]), len(arrays["co"]), filename))
+
+        return {'FINISHED'}
+
+
+class ImportActionData(bpy.types.Operator):
+    """Operator to import the actions of a JSON or NPZ file written by ExportActionData.
+    Actions are created, or replaced if already existing. They get a fake user, to be kept in the blend file."""
+
+    bl_idname = "yallah.import_action_data"
+    bl_label = """Import the actions of a JSON or NPZ action data file."""
+
+    filename: bpy.props.StringProperty(name="Action Data File",
+                                       description="The .json or .npz file holding the animation data",
+                                       subtype="FILE_PATH")
+
+    action_name: bpy.props.StringProperty(name="Action Name",
+                                          description="The name of the action of a single-action JSON file."
+                                                      " If empty, the file name without extension",
+                                          default="")
 
-        out_data = {}
+    replace_existing: bpy.props.BoolProperty(name="Replace Existing",
+                                             description="Replace the curves of the existing actions with the same"
+                                                         " name. Otherwise, new actions are created"
+                                                         " (Blender adds a numeric suffix to their names)",
+                                             default=True)
 
-        for fc in fcurves:  # type: bpy.types.FCurve
+    assign_to_active: bpy.props.BoolProperty(name="Assign to Active",
+                                             description="Set the (first) imported action as the action of the"
+                                                         " active object",
+                                             default=False)
 
-            print("Inserting data_path {}, array_index {}".format(fc.data_path, fc.array_index))
+    def execute(self, context):
+
+        import os
+        from .action_data_io import load_action_file
+        from .action_data_io import write_action
+
+        if not os.path.exists(self.filename):
+            self.report({'ERROR'}, "File '{}' not found".format(self.filename))
+            return {'CANCELLED'}
 
-            if fc.data_path not in out_data:
-                index_dict = {}
-                out_data[fc.data_path] = index_dict
+        single_action_name = self.action_name
+        if single_action_name == "":
+            single_action_name = os.path.splitext(os.path.basename(self.filename))[0]
+
+        data = load_action_file(self.filename, single_action_name=single_action_name)
+
+        imported = []  # type: List[bpy.types.Action]
+        n_keys = 0
+        for action_idx, name in enumerate(data.action_names):
+            if self.replace_existing and name in bpy.data.actions:
+                action = bpy.data.actions[name]
+                for fc in list(action.fcurves):
+                    action.fcurves.remove(fc)
             else:
-                index_dict = out_data[fc.data_path]
+                action = bpy.data.actions.new(name)
+            action.use_fake_user = True
 
-            points = []
-            for kfpoint in fc.keyframe_points:  # type: bpy.types.Keyframe
-                points.append([kfpoint.co[0], kfpoint.co[1]])  # we save it as a 2-array, not as Vector
+            n_keys += write_action(action, data, action_idx)
+            invalidate_action_caches(action)
+            imported.append(action)
 
-            index_dict[fc.array_index] = points
+        if self.assign_to_active and len(imported) > 0:
+            obj = context.active_object
+            if obj is None:
+                self.report({'ERROR'}, "No active object to assign the action to")
+                return {'CANCELLED'}
+            if obj.animation_data is None:
+                obj.animation_data_create()
+            obj.animation_data.action = imported[0]
 
-        with open(self.json_filename, 'w') as out_file:
-            json.dump(obj=out_data, fp=out_file, indent=2)
+        print("Imported {} actions, {} keyframes from '{}'".format(len(imported), n_keys, self.filename))
 
         return {'FINISHED'}
 
@@ -114,6 +387,85 @@ class SetDummyUserToAllActions(bpy.types.Operator):
         return {'FINISHED'}
 
 
+#
+# START/END PADDING
+# A planning pass finds the curves that don't cover the range of their action, reading only the curve ranges.
+# The apply pass adds all the padding keyframes of a curve at once, and updates the curve once.
+#
+
+# A curve to pad, with the (time, value) of the keyframes to add at the start and at the end (None if not needed).
+PaddingPlan = Tuple[bpy.types.FCurve, Optional[Tuple[float, float]], Optional[Tuple[float, float]]]
+
+
+def filter_actions(actions: List[bpy.types.Action], armature: Optional[bpy.types.Object] = None,
+                   name_patterns: Optional[List[str]] = None, only_fake_user: bool = False,
+                   indices: Optional[Dict[str, FCurveIndex]] = None) -> List[bpy.types.Action]:
+    """The actions animating at least one bone of the armature, with a name matching any of the (fnmatch) patterns,
+    and with a fake user. None (or False) disables a filter.
+    The F-Curve indices built to check the bones are added to indices (see fcurve_index())."""
+
+    out = []
+    for action in actions:
+        if only_fake_user and not action.use_fake_user:
+            continue
+        if name_patterns is not None and not any(fnmatch.fnmatchcase(action.name, p) for p in name_patterns):
+            continue
+        if armature is not None and fcurve_index(action, indices).bone_names().isdisjoint(armature.data.bones.keys()):
+            continue
+        out.append(action)
+
+    return out
+
+
+def plan_start_end_padding(action: bpy.types.Action) -> List[PaddingPlan]:
+    """The curves of the action needing a keyframe at the start and/or at the end of the action range."""
+
+    action_frame_start, action_frame_end = frame_range(action)
+
+    out = []
+    for fc in action.fcurves:
+        first_kf_time, last_kf_time = fc.range()
+
+        # If the first keyframe is set after the action start
+        start_point = None
+        if first_kf_time > action_frame_start:
+            start_point = action_frame_start, fc.keyframe_points[0].co[1]
+
+        # If the last keyframe is set before the action end
+        end_point = None
+        if last_kf_time < action_frame_end:
+            end_point = action_frame_end, fc.keyframe_points[-1].co[1]
+
+        if start_point is not None or end_point is not None:
+            out.append((fc, start_point, end_point))
+
+    return out
+
+
+def apply_start_end_padding(plan: List[PaddingPlan]) -> int:
+    """Add the planned keyframes, with one keyframe_points.add() and one update() per curve.
+
+    :return: The number of keyframes added.
+    """
+
+    n_added = 0
+    for fc, start_point, end_point in plan:
+        points = [p for p in (start_point, end_point) if p is not None]
+        kfps = fc.keyframe_points
+        n = len(kfps)
+        kfps.add(len(points))
+        for kfp, co in zip(kfps[n:], points):
+            kfp.co = co
+            kfp.handle_left = co
+            kfp.handle_right = co
+
+        # Sorts the new keyframes into place and computes their (automatic) handles
+        fc.update()
+        n_added += len(points)
+
+    return n_added
+
+
 class AddStartEndFramesToAllAnimationCurves(bpy.types.Operator):
     """Operator to force every animation curve to have a keyframe at the beginning and at the end of the
      action containing them."""
@@ -121,6 +473,20 @@ class AddStartEndFramesToAllAnimationCurves(bpy.types.Operator):
     bl_idname = "yallah.add_start_end_frames_to_all_actions"
     bl_label = "Add Start/End keyframes to all animation curves."
 
+    armature_name: bpy.props.StringProperty(name="Armature",
+                                            description="Process only the actions animating bones of this armature."
+                                                        " If empty, all the actions",
+                                            default="")
+
+    name_patterns: bpy.props.StringProperty(name="Name Patterns",
+                                            description="Comma-separated list of patterns (e.g., 'Walk*,Idle*')"
+                                                        " of the actions to process. If empty, all the actions",
+                                            default="")
+
+    only_fake_user: bpy.props.BoolProperty(name="Only Fake User",
+                                           description="Process only the actions with a fake user",
+                                           default=False)
+
     @classmethod
     def poll(cls, context):
         if not (context.mode == 'POSE' or context.mode == 'OBJECT'):
@@ -132,35 +498,318 @@ class AddStartEndFramesToAllAnimationCurves(bpy.types.Operator):
 
         import bpy
 
+        armature = None
+        if self.armature_name != "":
+            armature = bpy.data.objects.get(self.armature_name)
+            if armature is None or armature.type != 'ARMATURE':
+                self.report({'ERROR'}, "Armature '{}' not found".format(self.armature_name))
+                return {'CANCELLED'}
+
+        name_patterns = None
+        if self.name_patterns.strip() != "":
+            name_patterns = [p.strip() for p in self.name_patterns.split(",") if p.strip() != ""]
+
+        actions = filter_actions(list(bpy.data.actions), armature=armature, name_patterns=name_patterns,
+                                 only_fake_user=self.only_fake_user)
+
         #
-        # For each action in the database
-        for action in bpy.data.actions:
+        # Plan all the actions before modifying any
+        plans = [(action, plan_start_end_padding(action)) for action in actions]
+
+        #
+        # Apply
+        n_curves = 0
+        n_added = 0
+        for action, plan in plans:
+            if len(plan) == 0:
+                continue
+            n_added += apply_start_end_padding(plan)
+            n_curves += len(plan)
+            invalidate_action_caches(action)
+
+        print("Padded {} curves with {} keyframes, in {} of {} actions".format(n_curves, n_added, len(actions),
+                                                                             len(bpy.data.actions)))
+
+        return {'FINISHED'}
+
+
+#
+# BONE SUBTREE FILTERING
+#
+
+def bone_subtree_names(armature: bpy.types.Armature, root_names: List[str], include_roots: bool = True) -> Set[str]:
+    """The names of the bones descending from the root bones (the roots themselves too, if include_roots)."""
+
+    out = set()
+    for root_name in root_names:
+        root = armature.bones[root_name]
+        if include_roots:
+            out.add(root.name)
+        out.update(b.name for b in root.children_recursive)
+
+    return out
+
+
+def remove_bone_curves(action: bpy.types.Action, bone_names: Set[str], keep: bool = False,
+                       indices: Optional[Dict[str, FCurveIndex]] = None) -> int:
+    """Remove the F-Curves animating the given bones (or, if keep, the F-Curves animating any other bone).
+    F-Curves not animating pose bones are never removed. The index of the action is dropped from indices.
+
+    :return: The number of removed F-Curves.
+    """
+
+    index = fcurve_index(action, indices)
+    if keep:
+        curves_to_remove = index.curves_of_bones(index.bone_names() - bone_names)
+    else:
+        curves_to_remove = index.curves_of_bones(bone_names)
+
+    for fc in curves_to_remove:
+        action.fcurves.remove(fc)
+
+    if len(curves_to_remove) > 0:
+        invalidate_action_caches(action)
+        if indices is not None:
+            indices.pop(action.name_full, None)
+
+    return len(curves_to_remove)
+
+
+class FilterBoneSubtreeAnimation(bpy.types.Operator):
+    """Operator to remove the animation of bone subtrees (e.g., fingers, face, lower body) from many actions,
+    or to keep only that animation."""
+
+    bl_idname = "yallah.filter_bone_subtree_animation"
+    bl_label = "Strip or keep the animation of bone subtrees"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    root_bones: bpy.props.StringProperty(name="Root Bones",
+                                         description="Comma-separated list of the root bones of the subtrees"
+                                                     " (e.g., 'hand_L,hand_R')",
+                                         default="")
+
+    include_roots: bpy.props.BoolProperty(name="Include Roots",
+                                          description="The root bones are part of the subtrees",
+                                          default=False)
+
+    keep: bpy.props.BoolProperty(name="Keep",
+                                 description="Keep only the animation of the subtrees, instead of removing it",
+                                 default=False)
+
+    action_names: bpy.props.StringProperty(name="Action Names",
+                                           description="Comma-separated list of patterns (e.g., 'Walk*,Idle*')"
+                                                       " of the actions to process. If empty, the active action",
+                                           default="")
+
+    all_actions: bpy.props.BoolProperty(name="All Actions",
+                                        description="Process all the actions animating bones of the armature",
+                                        default=False)
+
+    @classmethod
+    def poll(cls, context):
+        obj = context.active_object  # type: bpy.types.Object
+        return obj is not None and obj.type == 'ARMATURE'
+
+    def execute(self, context):
 
-            action_frame_start, action_frame_end = frame_range(action)
-            # print("For action ", action.name, action_frame_start, action_frame_end)
+        arm_obj = context.active_object  # type: bpy.types.Object
 
-            #
-            # For each animation curve in the action
-            for fc in action.fcurves:
-                first_kf = fc.keyframe_points[0]
-                first_kf_time = first_kf.co[0]
-                last_kf = fc.keyframe_points[-1]
-                last_kf_time = last_kf.co[0]
-                # print("FCURVE range ", first_kf_time, last_kf_time)
+        root_names = [name.strip() for name in self.root_bones.split(",") if name.strip() != ""]
+        if len(root_names) == 0:
+            self.report({'ERROR'}, "No root bones specified")
+            return {'CANCELLED'}
 
-                # If the first keyframe is set after the action start
-                if first_kf_time > action_frame_start:
-                    first_kf_value = first_kf.co[1]
-                    fc.keyframe_points.insert(frame=action_frame_start, value=first_kf_value)
+        for root_name in root_names:
+            if root_name not in arm_obj.data.bones:
+                self.report({'ERROR'}, "No bone named '{}' in armature {}".format(root_name, arm_obj.name))
+                return {'CANCELLED'}
 
-                # If the last keyframe is set before the action end
-                if last_kf_time < action_frame_end:
-                    last_kf_value = last_kf.co[1]
-                    fc.keyframe_points.insert(frame=action_frame_end, value=last_kf_value)
+        bone_names = bone_subtree_names(armature=arm_obj.data, root_names=root_names,
+                                        include_roots=self.include_roots)
+
+        # The F-Curve indices of this call, by action name
+        indices = {}  # type: Dict[str, FCurveIndex]
+
+        if self.all_actions or self.action_names.strip() != "":
+            name_patterns = None
+            if not self.all_actions:
+                name_patterns = [p.strip() for p in self.action_names.split(",") if p.strip() != ""]
+            actions = filter_actions(list(bpy.data.actions), armature=arm_obj, name_patterns=name_patterns,
+                                     indices=indices)
+        else:
+            if arm_obj.animation_data is None or arm_obj.animation_data.action is None:
+                self.report({'ERROR'}, "The armature has no action. Set action_names or all_actions.")
+                return {'CANCELLED'}
+            actions = [arm_obj.animation_data.action]
+
+        n_removed = 0
+        for action in actions:
+            n_removed += remove_bone_curves(action=action, bone_names=bone_names, keep=self.keep, indices=indices)
+
+        print("Removed {} curves from {} actions ({} bones {})".format(
+            n_removed, len(actions), len(bone_names), "kept" if self.keep else "stripped"))
+
+        return {'FINISHED'}
+
+
+class ApplyRotationOffsets(bpy.types.Operator):
+    """Operator to pre-multiply rotation offsets to the bone rotations of many actions,
+    to match animations (e.g., from Mixamo) with the skeleton of the active armature. See rotation_offsets."""
+
+    bl_idname = "yallah.apply_rotation_offsets"
+    bl_label = "Apply rotation offsets to the bones animation"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    offsets_filename: bpy.props.StringProperty(name="Offsets File",
+                                               description="A json file {bone_name: [w, x, y, z], ...}. If empty,"
+                                                           " the built-in Mixamo offsets for the rest pose (T or A)"
+                                                           " of the armature",
+                                               default="",
+                                               subtype="FILE_PATH")
+
+    action_names: bpy.props.StringProperty(name="Action Names",
+                                           description="Comma-separated list of patterns (e.g., 'Walk*,Idle*')"
+                                                       " of the actions to process. If empty, the active action",
+                                           default="")
+
+    all_actions: bpy.props.BoolProperty(name="All Actions",
+                                        description="Process all the actions animating bones of the armature",
+                                        default=False)
+
+    @classmethod
+    def poll(cls, context):
+        obj = context.active_object  # type: bpy.types.Object
+        return obj is not None and obj.type == 'ARMATURE'
+
+    def execute(self, context):
+
+        from .rotation_offsets import apply_rotation_offsets
+        from .rotation_offsets import offsets_for_armature
+
+        arm_obj = context.active_object  # type: bpy.types.Object
+
+        # The F-Curve indices of this call, by action name
+        indices = {}  # type: Dict[str, FCurveIndex]
+
+        if self.all_actions or self.action_names.strip() != "":
+            name_patterns = None
+            if not self.all_actions:
+                name_patterns = [p.strip() for p in self.action_names.split(",") if p.strip() != ""]
+            actions = filter_actions(list(bpy.data.actions), armature=arm_obj, name_patterns=name_patterns,
+                                     indices=indices)
+        else:
+            if arm_obj.animation_data is None or arm_obj.animation_data.action is None:
+                self.report({'ERROR'}, "The armature has no action. Set action_names or all_actions.")
+                return {'CANCELLED'}
+            actions = [arm_obj.animation_data.action]
+
+        if self.offsets_filename == "":
+            for bone_name in ["upperarm_L", "lowerarm_L"]:
+                if bone_name not in arm_obj.pose.bones:
+                    self.report({'ERROR'}, "No bone named '{}' in armature {}, needed to detect the rest pose".format(
+                        bone_name, arm_obj.name))
+                    return {'CANCELLED'}
+
+        try:
+            offsets = offsets_for_armature(arm_obj=arm_obj, filename=self.offsets_filename)
+        except (OSError, ValueError) as e:
+            self.report({'ERROR'}, "Can not read offsets file '{}': {}".format(self.offsets_filename, e))
+            return {'CANCELLED'}
+
+        n_bones = 0
+        n_resampled = 0
+        for action in actions:
+            action_bones, action_resampled, warnings = apply_rotation_offsets(action=action, offsets=offsets,
+                                                                             index=fcurve_index(action, indices))
+            n_bones += action_bones
+            n_resampled += action_resampled
+            for warning in warnings:
+                print(warning)
+
+        print("Applied {} offsets to {} actions: {} bone curves offset, {} resampled".format(
+            len(offsets), len(actions), n_bones, n_resampled))
+
+        # Force update of GUI and other properties
+        context.scene.frame_set(context.scene.frame_current)
+
+        return {'FINISHED'}
+
+
+class GenerateRotationOffsets(bpy.types.Operator):
+    """Operator to compute the rotation offsets database between the rest poses of a source armature
+    (where the animations come from) and the active armature (where they will be played). See rotation_offsets."""
+
+    bl_idname = "yallah.generate_rotation_offsets"
+    bl_label = "Generate the rotation offsets between two armatures"
+
+    source_armature: bpy.props.StringProperty(name="Source Armature",
+                                              description="The name of the armature the animations were made for",
+                                              default="")
+
+    offsets_filename: bpy.props.StringProperty(name="Offsets File",
+                                               description="The json file to write, usable by ApplyRotationOffsets",
+                                               subtype="FILE_PATH")
+
+    bone_map_filename: bpy.props.StringProperty(name="Bone Map File",
+                                                description="A json file {target_bone: source_bone, ...}. If empty,"
+                                                            " the bones with the same name in both armatures",
+                                                default="",
+                                                subtype="FILE_PATH")
+
+    min_angle: bpy.props.FloatProperty(name="Min Angle",
+                                       description="Offsets smaller than this angle (degrees) are not written",
+                                       default=0.01,
+                                       min=0.0)
+
+    @classmethod
+    def poll(cls, context):
+        obj = context.active_object  # type: bpy.types.Object
+        return obj is not None and obj.type == 'ARMATURE'
+
+    def execute(self, context):
+
+        import json
+        from .rotation_offsets import generate_offsets
+        from .rotation_offsets import save_offsets
+
+        target_obj = context.active_object  # type: bpy.types.Object
+
+        source_obj = bpy.data.objects.get(self.source_armature)
+        if source_obj is None or source_obj.type != 'ARMATURE':
+            self.report({'ERROR'}, "Armature '{}' not found".format(self.source_armature))
+            return {'CANCELLED'}
+
+        bone_map = None
+        if self.bone_map_filename != "":
+            with open(self.bone_map_filename, "r") as in_file:
+                bone_map = json.load(fp=in_file)
+
+        try:
+            offsets = generate_offsets(source_obj=source_obj, target_obj=target_obj, bone_map=bone_map,
+                                       min_angle=self.min_angle)
+        except Exception as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+
+        save_offsets(self.offsets_filename, offsets)
+
+        print("Written {} offsets from '{}' to '{}' in '{}'".format(len(offsets), source_obj.name, target_obj.name,
+                                                                   self.offsets_filename))
 
         return {'FINISHED'}
 
 
+def pose_bone_rotation_path(pbone: bpy.types.PoseBone) -> str:
+    """The rotation property of the pose bone animated in its current rotation mode."""
+
+    if pbone.rotation_mode == 'QUATERNION':
+        return "rotation_quaternion"
+    elif pbone.rotation_mode == 'AXIS_ANGLE':
+        return "rotation_axis_angle"
+    else:
+        return "rotation_euler"
+
+
 class CreateAPoseAction(bpy.types.Operator):
     """Operator to set an A-Pose animation key frame."""
 
@@ -198,20 +847,30 @@ class CreateAPoseAction(bpy.types.Operator):
 
         # Object
         # Clear object position and pose.
-        # bpy.ops.object.mode_set(mode='OBJECT')
-        bpy.ops.object.location_clear()
-        bpy.ops.object.rotation_clear()
-        bpy.ops.object.scale_clear()
+        # The transforms are cleared and keyed directly, without operators needing a UI area,
+        # so that the setup runs also in background mode (blender -b).
+        obj.location = (0.0, 0.0, 0.0)
+        obj.rotation_euler = (0.0, 0.0, 0.0)
+        obj.rotation_quaternion = (1.0, 0.0, 0.0, 0.0)
+        obj.rotation_axis_angle = (0.0, 0.0, 1.0, 0.0)
+        obj.scale = (1.0, 1.0, 1.0)
         obj.keyframe_insert("location", frame=1)
         obj.keyframe_insert("rotation_euler", frame=1)
         obj.keyframe_insert("scale", frame=1)
 
         # Bones
         bpy.ops.object.mode_set(mode='POSE')
-        bpy.ops.pose.select_all(action='SELECT')
-        bpy.ops.pose.transforms_clear()
-        # Insert the keyframe for the bones
-        bpy.ops.anim.keyframe_insert_menu(type='LocRotScale')
+        for pbone in obj.pose.bones:  # type: bpy.types.PoseBone
+            pbone.location = (0.0, 0.0, 0.0)
+            pbone.rotation_quaternion = (1.0, 0.0, 0.0, 0.0)
+            pbone.rotation_euler = (0.0, 0.0, 0.0)
+            pbone.rotation_axis_angle = (0.0, 0.0, 1.0, 0.0)
+            pbone.scale = (1.0, 1.0, 1.0)
+
+            # Insert the keyframe for the bone (as the LocRotScale keying set)
+            pbone.keyframe_insert("location", frame=1, group=pbone.name)
+            pbone.keyframe_insert(pose_bone_rotation_path(pbone), frame=1, group=pbone.name)
+            pbone.keyframe_insert("scale", frame=1, group=pbone.name)
 
         # Be sure that the action stays in memory.
         bpy.data.actions[CreateAPoseAction.A_POSE_ACTION_NAME].use_fake_user = True
@@ -229,20 +888,37 @@ class CreateAPoseAction(bpy.types.Operator):
             # If the first keyframe is set after the action start
             fc.keyframe_points.insert(frame=first_kf_time + 1, value=first_kf_value + EPSILON)
 
+        invalidate_action_caches(action)
+
         return {'FINISHED'}
 
 
 def register():
+    _remove_action_caches_handlers()
+    for list_name, handler in _ACTION_CACHES_HANDLERS:
+        getattr(bpy.app.handlers, list_name).append(handler)
+
     bpy.utils.register_class(ExportActionData)
+    bpy.utils.register_class(ImportActionData)
     bpy.utils.register_class(SetDummyUserToAllActions)
     bpy.utils.register_class(AddStartEndFramesToAllAnimationCurves)
+    bpy.utils.register_class(FilterBoneSubtreeAnimation)
+    bpy.utils.register_class(ApplyRotationOffsets)
+    bpy.utils.register_class(GenerateRotationOffsets)
     bpy.utils.register_class(CreateAPoseAction)
 
 
 def unregister():
+    _remove_action_caches_handlers()
+    invalidate_action_caches()
+
     bpy.utils.unregister_class(ExportActionData)
+    bpy.utils.unregister_class(ImportActionData)
     bpy.utils.unregister_class(SetDummyUserToAllActions)
     bpy.utils.unregister_class(AddStartEndFramesToAllAnimationCurves)
+    bpy.utils.unregister_class(FilterBoneSubtreeAnimation)
+    bpy.utils.unregister_class(ApplyRotationOffsets)
+    bpy.utils.unregister_class(GenerateRotationOffsets)
     bpy.utils.unregister_class(CreateAPoseAction)
 
 
@@ -0,0 +1,105 @@
+# Worker side of the headless batch setup (see Tools/batch_setup.py).
+#
+# It runs inside Blender, on the .blend file opened from the command line:
+# all the MBLab characters of the file are set up, the result is saved, and a JSON report is written.
+#
+# Usage:
+#   blender -b Character.blend --python-expr "import addon_utils; addon_utils.enable('yallah');\
+#       import yallah.batch_setup; yallah.batch_setup.main()" -- --output Out.blend --report Out.json
+
+import bpy
+
+import json
+import sys
+import time
+import traceback
+
+from typing import List
+
+from . mblab_tools import character_prefix
+from . mblab_tools import is_mblab_body
+from . mblab_tools import setup_characters
+from . setup_trace import SetupTrace
+
+
+def find_mblab_characters() -> List[bpy.types.Object]:
+    """All the MBLab body meshes of the current file that can be set up and were not set up already."""
+
+    out = []
+    for obj in bpy.data.objects:
+        if obj.type != 'MESH':
+            continue
+        if not is_mblab_body(mesh_obj=obj):
+            continue
+        if obj.parent is None or obj.parent.type != 'ARMATURE':
+            continue
+        if character_prefix(mesh_obj=obj) is None:
+            continue
+        if obj.yallah_setup_done:
+            continue
+        out.append(obj)
+
+    return out
+
+
+def setup_current_file(output_filename: str) -> dict:
+    """Set up all the MBLab characters of the current file and save it.
+    :return: The report for the file.
+    """
+
+    start = time.perf_counter()
+
+    characters = find_mblab_characters()
+    report = {
+        "file": bpy.data.filepath,
+        "output": output_filename,
+        "characters": [],
+    }
+
+    if len(characters) > 0:
+        if bpy.context.object is not None and bpy.context.object.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+        # All the characters of the file in one pass: caches are shared, and bones are created per armature.
+        trace = SetupTrace(name=bpy.data.filepath)
+        report["characters"] = setup_characters(mesh_objs=characters, trace=trace)
+        print(trace.summary())
+
+    if len(characters) == 0:
+        report["status"] = "skipped"
+    elif all(c["status"] == "ok" for c in report["characters"]):
+        report["status"] = "ok"
+    else:
+        report["status"] = "error"
+
+    if report["status"] == "ok":
+        save_start = time.perf_counter()
+        bpy.ops.wm.save_as_mainfile(filepath=output_filename)
+        report["save_seconds"] = time.perf_counter() - save_start
+
+    report["seconds"] = time.perf_counter() - start
+
+    return report
+
+
+def main() -> None:
+    """Entry point when running inside Blender. Arguments are passed after '--'."""
+    import argparse
+
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+
+    parser = argparse.ArgumentParser(prog="yallah.batch_setup",
+                                     description="Setup all the MBLab characters of the open .blend file.")
+    parser.add_argument("--output", required=True, help="The .blend file to save after the setup")
+    parser.add_argument("--report", required=True, help="The JSON report file to write")
+    args = parser.parse_args(argv)
+
+    try:
+        report = setup_current_file(output_filename=args.output)
+    except Exception as e:
+        report = {"file": bpy.data.filepath, "output": args.output, "status": "error",
+                  "error": str(e), "traceback": traceback.format_exc()}
+
+    with open(args.report, "w") as report_file:
+        json.dump(obj=report, fp=report_file, indent=2)
+
+    print("YALLAH batch setup: '{}' -> {}".format(bpy.data.filepath, report["status"]))
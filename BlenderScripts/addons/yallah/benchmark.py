@@ -0,0 +1,429 @@
+# Performance benchmarks of the YALLAH operators, on synthetic MBLab-like fixtures (see Tools/benchmark.py).
+#
+# It runs inside Blender, in background mode, on an empty scene:
+# for each benchmark a fresh fixture is built, then only the operator call is timed.
+#
+# Usage:
+#   blender -b --factory-startup --python-expr "import addon_utils; addon_utils.enable('yallah');\
+#       import yallah.benchmark; yallah.benchmark.main()" -- --output bench.json --vertices 20000 --keys 80
+
+import bpy
+
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import traceback
+
+import numpy as np
+
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from . import YALLAH_FEATURES_DIR
+from . import YALLAH_VERSION
+from . mblab_tools import L_HAND_NAME
+from . mblab_tools import R_HAND_NAME
+from . shape_keys_db import load_shape_keys_db
+from . vertex_groups_io import save_vertex_groups_file
+
+FIXTURE_PREFIX = "Bench"
+
+# The files of the shape-key features: their source keys are created on the fixture mesh.
+SHAPE_KEYS_FILES = [os.path.join(YALLAH_FEATURES_DIR, "MaryTTS/PhonemesMBLab1_6.json"),
+                    os.path.join(YALLAH_FEATURES_DIR, "FacialExpressions/FacialExpressionsMBLab1_6.json")]
+
+FINGER_NAMES = ["thumb", "index", "middle", "ring", "pinky"]
+
+# The EyeGaze feature picks the eyes by vertex index (up to ~7200 on the female mesh).
+MIN_SETUP_VERTICES = 8000
+
+
+class BenchmarkParams:
+    """The size of the fixtures."""
+
+    def __init__(self, n_vertices: int = 20000, n_keys: int = 80, n_vertex_groups: int = 20, n_actions: int = 10,
+                 n_keyframes: int = 100, n_phalanges: int = 3, repeats: int = 3, seed: int = 0):
+        self.n_vertices = n_vertices
+        self.n_keys = n_keys
+        self.n_vertex_groups = n_vertex_groups
+        self.n_actions = n_actions
+        self.n_keyframes = n_keyframes
+        self.n_phalanges = n_phalanges
+        self.repeats = repeats
+        self.seed = seed
+
+    def to_dict(self) -> dict:
+        return dict(self.__dict__)
+
+
+#
+# FIXTURES
+#
+def clear_scene() -> None:
+    """Remove the objects, meshes, armatures, and actions of the previous fixture.
+    (Reloading the factory settings would disable the add-on.)"""
+
+    if bpy.context.object is not None and bpy.context.object.mode != 'OBJECT':
+        bpy.ops.object.mode_set(mode='OBJECT')
+
+    # Shape keys are removed with their mesh.
+    for collection in [bpy.data.objects, bpy.data.meshes, bpy.data.armatures, bpy.data.actions]:
+        for datablock in list(collection):
+            collection.remove(datablock)
+
+
+def expression_key_names(n_keys: int) -> List[str]:
+    """The names of the `Expressions_*` source keys: those used by the features files,
+    padded with synthetic ones up to n_keys."""
+
+    names = set()
+    for filename in SHAPE_KEYS_FILES:
+        names.update(load_shape_keys_db(filename).source_names)
+    names = sorted(names)
+
+    names += ["Expressions_bench{:03d}_max".format(i) for i in range(max(0, n_keys - len(names)))]
+    return names
+
+
+def create_mesh_fixture(params: BenchmarkParams, rng: np.random.Generator) -> bpy.types.Object:
+    """A female MBLab-named grid mesh, with a Basis and the `Expressions_*` shape keys, and some vertex groups."""
+
+    side = int(np.ceil(np.sqrt(params.n_vertices)))
+    n_vertices = side * side
+    xs, zs = np.meshgrid(np.linspace(-0.5, 0.5, side), np.linspace(0.0, 1.8, side))
+    co = np.stack((xs.ravel(), np.zeros(n_vertices), zs.ravel()), axis=1).astype(np.float32)
+
+    # Quads of the grid
+    v = np.arange(n_vertices).reshape(side, side)
+    quads = np.stack((v[:-1, :-1].ravel(), v[:-1, 1:].ravel(), v[1:, 1:].ravel(), v[1:, :-1].ravel()), axis=1)
+
+    mesh = bpy.data.meshes.new("MBLab_human_female_bench")
+    mesh.vertices.add(n_vertices)
+    mesh.vertices.foreach_set("co", co.ravel())
+    mesh.loops.add(quads.size)
+    mesh.loops.foreach_set("vertex_index", quads.ravel().astype(np.int32))
+    mesh.polygons.add(len(quads))
+    mesh.polygons.foreach_set("loop_start", np.arange(0, quads.size, 4, dtype=np.int32))
+    mesh.polygons.foreach_set("loop_total", np.full(len(quads), 4, dtype=np.int32))
+    mesh.update(calc_edges=True)
+    mesh.validate()
+
+    mesh_obj = bpy.data.objects.new(FIXTURE_PREFIX + "_body", mesh)
+    bpy.context.scene.collection.objects.link(mesh_obj)
+
+    #
+    # Shape keys: each one moves a random patch of ~5% of the vertices.
+    mesh_obj.shape_key_add(name="Basis", from_mix=False)
+    for key_name in expression_key_names(n_keys=params.n_keys):
+        kb = mesh_obj.shape_key_add(name=key_name, from_mix=False)
+        key_co = co.copy()
+        moved = rng.choice(n_vertices, size=max(1, n_vertices // 20), replace=False)
+        key_co[moved] += rng.normal(scale=0.005, size=(len(moved), 3)).astype(np.float32)
+        kb.data.foreach_set("co", key_co.ravel())
+
+    #
+    # Vertex groups, with random weights.
+    for i in range(params.n_vertex_groups):
+        vg = mesh_obj.vertex_groups.new(name="bench_group{:02d}".format(i))
+        indices = np.sort(rng.choice(n_vertices, size=max(1, n_vertices // 10), replace=False))
+        weights = np.round(rng.uniform(size=len(indices)), 2)
+        for w in np.unique(weights):
+            vg.add(indices[weights == w].tolist(), weight=float(w), type='REPLACE')
+
+    return mesh_obj
+
+
+def create_armature_fixture(params: BenchmarkParams) -> bpy.types.Object:
+    """An armature with a root-spine-neck-head chain and two hands with 5 fingers of n_phalanges bones each."""
+
+    arm = bpy.data.armatures.new(FIXTURE_PREFIX + "_skeleton")
+    arm_obj = bpy.data.objects.new(FIXTURE_PREFIX, arm)
+    bpy.context.scene.collection.objects.link(arm_obj)
+
+    bpy.context.view_layer.objects.active = arm_obj
+    bpy.ops.object.mode_set(mode='EDIT')
+
+    def new_bone(name: str, head, tail, parent: Optional[bpy.types.EditBone]) -> bpy.types.EditBone:
+        b = arm.edit_bones.new(name)
+        b.head = head
+        b.tail = tail
+        b.parent = parent
+        return b
+
+    root = new_bone("root", (0, 0, 0.9), (0, 0, 1.0), None)
+    spine = new_bone("spine01", (0, 0, 1.0), (0, 0, 1.4), root)
+    neck = new_bone("neck", (0, 0, 1.4), (0, 0, 1.55), spine)
+    new_bone("head", (0, 0, 1.55), (0, 0, 1.75), neck)
+
+    for hand_name, side in [(L_HAND_NAME, 1), (R_HAND_NAME, -1)]:
+        hand = new_bone(hand_name, (side * 0.6, 0, 1.4), (side * 0.7, 0, 1.4), spine)
+        for f, finger in enumerate(FINGER_NAMES):
+            parent = hand
+            for p in range(params.n_phalanges):
+                x = side * (0.7 + 0.02 * p)
+                y = 0.02 * (f - 2)
+                parent = new_bone("{}{:02d}_{}".format(finger, p + 1, hand_name[-1]),
+                                  (x, y, 1.4), (x + side * 0.02, y, 1.4), parent)
+
+    bpy.ops.object.mode_set(mode='OBJECT')
+
+    return arm_obj
+
+
+def attach_mesh_to_armature(mesh_obj: bpy.types.Object, arm_obj: bpy.types.Object) -> None:
+    mesh_obj.parent = arm_obj
+    md = mesh_obj.modifiers.new(name=FIXTURE_PREFIX + "_armature", type='ARMATURE')
+    md.object = arm_obj
+    # A modifier to be removed by the RealTimeRequirements feature
+    mesh_obj.modifiers.new(name=FIXTURE_PREFIX + "_subdivision", type='SUBSURF')
+
+
+def create_action_fixtures(arm_obj: bpy.types.Object, params: BenchmarkParams,
+                           rng: np.random.Generator) -> List[bpy.types.Action]:
+    """Actions with location and rotation_quaternion curves for all the bones.
+    Curves start and end at random frames, so that they don't cover the whole action range."""
+
+    actions = []
+    for a in range(params.n_actions):
+        action = bpy.data.actions.new("bench_action{:02d}".format(a))
+        action.use_fake_user = True
+        for pbone in arm_obj.pose.bones:
+            data_path_prefix = 'pose.bones["{}"].'.format(pbone.name)
+            for prop, n_channels in [("location", 3), ("rotation_quaternion", 4)]:
+                for index in range(n_channels):
+                    fc = action.fcurves.new(data_path_prefix + prop, index=index, action_group=pbone.name)
+                    start = int(rng.integers(1, 10))
+                    frames = np.arange(start, start + params.n_keyframes, dtype=np.float32)
+                    values = rng.normal(scale=0.1, size=params.n_keyframes).astype(np.float32)
+                    fc.keyframe_points.add(params.n_keyframes)
+                    fc.keyframe_points.foreach_set("co", np.stack((frames, values), axis=1).ravel())
+                    fc.update()
+        actions.append(action)
+
+    if arm_obj.animation_data is None:
+        arm_obj.animation_data_create()
+    arm_obj.animation_data.action = actions[0]
+
+    return actions
+
+
+class Fixture:
+    """A synthetic MBLab character: mesh, armature and actions."""
+
+    def __init__(self, params: BenchmarkParams, with_actions: bool = False):
+        rng = np.random.default_rng(params.seed)
+        clear_scene()
+        self.mesh_obj = create_mesh_fixture(params=params, rng=rng)
+        self.arm_obj = create_armature_fixture(params=params)
+        attach_mesh_to_armature(mesh_obj=self.mesh_obj, arm_obj=self.arm_obj)
+        self.actions = create_action_fixtures(arm_obj=self.arm_obj, params=params, rng=rng) if with_actions else []
+
+    def activate(self, obj: bpy.types.Object) -> None:
+        if bpy.context.object is not None and bpy.context.object.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+        for o in bpy.context.view_layer.objects:
+            o.select_set(False)
+        obj.select_set(True)
+        bpy.context.view_layer.objects.active = obj
+
+
+#
+# BENCHMARKS
+# Each benchmark takes the params and a working directory, builds its fixture,
+# and returns the function to time (invoked once per fixture).
+#
+def check_finished(res: set) -> None:
+    if 'FINISHED' not in res:
+        raise Exception("Operator returned {}".format(res))
+
+
+def bench_create_shape_keys(params: BenchmarkParams, work_dir: str) -> Callable:
+    fixture = Fixture(params=params)
+    fixture.activate(fixture.mesh_obj)
+    # Parse the file out of the timing: the cache is warm in a real session.
+    load_shape_keys_db(SHAPE_KEYS_FILES[1])
+    return lambda: check_finished(bpy.ops.object.create_shape_keys(shape_keys_filename=SHAPE_KEYS_FILES[1]))
+
+
+def bench_load_vertex_groups(params: BenchmarkParams, work_dir: str) -> Callable:
+    fixture = Fixture(params=params)
+    fixture.activate(fixture.mesh_obj)
+
+    rng = np.random.default_rng(params.seed)
+    n_vertices = len(fixture.mesh_obj.data.vertices)
+    groups = {}
+    for i in range(params.n_vertex_groups):
+        indices = np.sort(rng.choice(n_vertices, size=max(1, n_vertices // 10), replace=False))
+        groups["bench_load{:02d}".format(i)] = (indices, np.round(rng.uniform(size=len(indices)), 2))
+    filename = os.path.join(work_dir, "load_vertex_groups.json")
+    save_vertex_groups_file(filename, groups)
+
+    return lambda: check_finished(bpy.ops.object.load_vertex_groups(vertex_groups_filename=filename,
+                                                                    replace_existing=True))
+
+
+def bench_save_vertex_groups(params: BenchmarkParams, work_dir: str) -> Callable:
+    fixture = Fixture(params=params)
+    fixture.activate(fixture.mesh_obj)
+    filename = os.path.join(work_dir, "save_vertex_group.json")
+    return lambda: check_finished(bpy.ops.object.save_vertex_group(vertex_group_filename=filename))
+
+
+def bench_save_all_vertex_groups(params: BenchmarkParams, work_dir: str) -> Callable:
+    fixture = Fixture(params=params)
+    fixture.activate(fixture.mesh_obj)
+    filename = os.path.join(work_dir, "save_all_vertex_groups.json")
+    return lambda: check_finished(bpy.ops.object.save_all_vertex_groups(vertex_groups_filename=filename))
+
+
+def bench_add_start_end_frames(params: BenchmarkParams, work_dir: str) -> Callable:
+    fixture = Fixture(params=params, with_actions=True)
+    fixture.activate(fixture.arm_obj)
+    return lambda: check_finished(bpy.ops.yallah.add_start_end_frames_to_all_actions())
+
+
+def bench_remove_finger_animation(params: BenchmarkParams, work_dir: str) -> Callable:
+    fixture = Fixture(params=params, with_actions=True)
+    fixture.activate(fixture.arm_obj)
+    return lambda: check_finished(bpy.ops.mblab_tools.remove_finger_animation())
+
+
+def bench_export_action_data(params: BenchmarkParams, work_dir: str) -> Callable:
+    fixture = Fixture(params=params, with_actions=True)
+    fixture.activate(fixture.arm_obj)
+    filename = os.path.join(work_dir, "export_action_data.json")
+    return lambda: check_finished(bpy.ops.yallah.export_action_data(filename=filename))
+
+
+def bench_export_all_actions_npz(params: BenchmarkParams, work_dir: str) -> Callable:
+    Fixture(params=params, with_actions=True)
+    filename = os.path.join(work_dir, "export_action_data.npz")
+    return lambda: check_finished(bpy.ops.yallah.export_action_data(filename=filename, all_actions=True))
+
+
+def bench_import_action_data_npz(params: BenchmarkParams, work_dir: str) -> Callable:
+    Fixture(params=params, with_actions=True)
+    filename = os.path.join(work_dir, "import_action_data.npz")
+    check_finished(bpy.ops.yallah.export_action_data(filename=filename, all_actions=True))
+    return lambda: check_finished(bpy.ops.yallah.import_action_data(filename=filename))
+
+
+def bench_full_setup(params: BenchmarkParams, work_dir: str) -> Callable:
+    if params.n_vertices < MIN_SETUP_VERTICES:
+        raise Exception("The full setup needs at least {} vertices".format(MIN_SETUP_VERTICES))
+
+    fixture = Fixture(params=params)
+    fixture.activate(fixture.mesh_obj)
+    return lambda: check_finished(bpy.ops.mbast_tools.setup_mblab_character())
+
+
+BENCHMARKS = {
+    "CreateShapeKeys": bench_create_shape_keys,
+    "LoadVertexGroups": bench_load_vertex_groups,
+    "SaveVertexGroups": bench_save_vertex_groups,
+    "SaveAllVertexGroups": bench_save_all_vertex_groups,
+    "AddStartEndFramesToAllAnimationCurves": bench_add_start_end_frames,
+    "RemoveAnimationFromFingers": bench_remove_finger_animation,
+    "ExportActionData": bench_export_action_data,
+    "ExportActionDataAllNPZ": bench_export_all_actions_npz,
+    "ImportActionDataAllNPZ": bench_import_action_data_npz,
+    "SetupMBLabCharacter": bench_full_setup,
+}  # type: Dict[str, Callable[[BenchmarkParams, str], Callable]]
+
+
+def run_benchmark(name: str, params: BenchmarkParams, work_dir: str) -> dict:
+    """Run a benchmark params.repeats times, each on a fresh fixture.
+    :return: The timings, as dict with keys "seconds" (all the runs), "min", "median", or "error".
+    """
+
+    out = {"seconds": []}
+    try:
+        for _ in range(params.repeats):
+            fn = BENCHMARKS[name](params, work_dir)
+            start = time.perf_counter()
+            fn()
+            out["seconds"].append(time.perf_counter() - start)
+    except Exception as e:
+        out["error"] = str(e)
+        out["traceback"] = traceback.format_exc()
+
+    if len(out["seconds"]) > 0:
+        out["min"] = float(np.min(out["seconds"]))
+        out["median"] = float(np.median(out["seconds"]))
+
+    return out
+
+
+def addon_ready_seconds() -> Optional[float]:
+    """The time-to-ready of the add-on, measured when it was enabled in this process."""
+    import yallah
+    return yallah.YALLAH_READY_SECONDS
+
+
+def run_benchmarks(names: List[str], params: BenchmarkParams) -> dict:
+    results = {
+        "yallah_version": YALLAH_VERSION,
+        "addon_ready_seconds": addon_ready_seconds(),
+        "blender_version": bpy.app.version_string,
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "params": params.to_dict(),
+        "benchmarks": {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix="yallah_bench") as work_dir:
+        for name in names:
+            print("Benchmark '{}'...".format(name))
+            res = run_benchmark(name=name, params=params, work_dir=work_dir)
+            results["benchmarks"][name] = res
+            if "error" in res:
+                print("  error: {}".format(res["error"]))
+            else:
+                print("  min {:.4f}s, median {:.4f}s".format(res["min"], res["median"]))
+
+    return results
+
+
+def main() -> None:
+    """Entry point when running inside Blender. Arguments are passed after '--'."""
+    import argparse
+
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+
+    defaults = BenchmarkParams()
+    parser = argparse.ArgumentParser(prog="yallah.benchmark", description="Benchmark the YALLAH operators.")
+    parser.add_argument("--output", required=True, help="The JSON file with the results")
+    parser.add_argument("--benchmarks", default=",".join(BENCHMARKS.keys()),
+                        help="Comma-separated list of the benchmarks to run")
+    parser.add_argument("--vertices", type=int, default=defaults.n_vertices)
+    parser.add_argument("--keys", type=int, default=defaults.n_keys, help="Number of `Expressions_*` shape keys")
+    parser.add_argument("--vertex-groups", type=int, default=defaults.n_vertex_groups)
+    parser.add_argument("--actions", type=int, default=defaults.n_actions)
+    parser.add_argument("--keyframes", type=int, default=defaults.n_keyframes, help="Keyframes per F-curve")
+    parser.add_argument("--phalanges", type=int, default=defaults.n_phalanges, help="Bones per finger")
+    parser.add_argument("--repeats", type=int, default=defaults.repeats)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--label", default="", help="A free label stored in the results (e.g., the commit)")
+    args = parser.parse_args(argv)
+
+    names = [n.strip() for n in args.benchmarks.split(",") if n.strip() != ""]
+    for name in names:
+        if name not in BENCHMARKS:
+            parser.error("Unknown benchmark '{}'. Available: {}".format(name, list(BENCHMARKS.keys())))
+
+    params = BenchmarkParams(n_vertices=args.vertices, n_keys=args.keys, n_vertex_groups=args.vertex_groups,
+                             n_actions=args.actions, n_keyframes=args.keyframes, n_phalanges=args.phalanges,
+                             repeats=args.repeats, seed=args.seed)
+
+    results = run_benchmarks(names=names, params=params)
+    results["label"] = args.label
+
+    with open(args.output, "w") as out_file:
+        json.dump(obj=results, fp=out_file, indent=2)
+
+    print("YALLAH benchmarks written to '{}'".format(args.output))
@@ -8,46 +8,48 @@
 # - Create a fresh new MBLab character
 # - Be sure you are in object mode
 # - Select the mesh (child of the armature)
-# - Run the script
+# - Run the setup
 #
-# The script will not create bones  if they are already there.
+# The feature will not create bones  if they are already there.
 # Prevents messing up in case of accidental re-run ;-)
 
 
 import bpy
 from mathutils import Vector
 
+FEATURE_NAME = "Camera"
+FEATURE_ORDER = 40
+FEATURE_DEPENDS = []
+FEATURE_VERSION = 1
 
-# Check if the selected object os a MESH
-mesh_obj = bpy.context.active_object
-assert mesh_obj.type == 'MESH'
-
-arm_obj = mesh_obj.parent
-assert arm_obj.type == 'ARMATURE'
-
-arm = arm_obj.data
-assert isinstance(arm, bpy.types.Armature)
-
-bpy.ops.object.mode_set(mode='OBJECT')
-#bpy.context.scene.objects.active = arm_obj
-bpy.context.view_layer.objects.active = arm_obj
-
-# Create the bone
-bpy.ops.object.mode_set(mode='EDIT')  # switches to armature-edit
-if 'head_top' not in arm.edit_bones:
-    # add single bone (Shift-A)
-    head_top = arm.edit_bones.new('head_top')
-    # set bone.parent to 'neck'
-    head_top.parent = arm.edit_bones['head']
-    # set bone.head to the eye center
-    head_top.head = Vector(arm.edit_bones['head'].tail)
-    head_top.tail = Vector(head_top.head) + Vector((0,0, 0.01))
-
-bpy.ops.object.mode_set(mode='OBJECT')
+HEAD_TOP_NAME = 'head_top'
 
 
+def edit_bones(mesh_obj: bpy.types.Object, arm_obj: bpy.types.Object) -> None:
+    # Invoked in armature EDIT mode
+    assert mesh_obj.type == 'MESH'
+    assert arm_obj.type == 'ARMATURE'
 
+    arm = arm_obj.data
+    assert isinstance(arm, bpy.types.Armature)
 
+    # Create the bone
+    if HEAD_TOP_NAME not in arm.edit_bones:
+        # add single bone (Shift-A)
+        head_top = arm.edit_bones.new(HEAD_TOP_NAME)
+        # set bone.parent to 'neck'
+        head_top.parent = arm.edit_bones['head']
+        # set bone.head to the eye center
+        head_top.head = Vector(arm.edit_bones['head'].tail)
+        head_top.tail = Vector(head_top.head) + Vector((0,0, 0.01))
 
 
+def cleanup(mesh_obj: bpy.types.Object, arm_obj: bpy.types.Object) -> None:
+    arm = arm_obj.data
 
+    bpy.context.view_layer.objects.active = arm_obj
+    bpy.ops.object.mode_set(mode='EDIT')
+    if HEAD_TOP_NAME in arm.edit_bones:
+        arm.edit_bones.remove(arm.edit_bones[HEAD_TOP_NAME])
+    bpy.ops.object.mode_set(mode='OBJECT')
+    bpy.context.view_layer.objects.active = mesh_obj
@@ -8,22 +8,28 @@
 # - Create a fresh new MBLab character
 # - Be sure you are in object mode
 # - Select the mesh (child of the armature)
-# - Run the script
+# - Run the setup
 #
-# The script will not create bones or vertex groups if they are already there.
+# The feature will not create bones or vertex groups if they are already there.
 # Prevents messing up in case of accidental re-run ;-)
 #
-# TODO:
-# - vertex selection is messy. Requires many edit mode switches.
-#   Alternative solution, to investigate:
-#   https://blender.stackexchange.com/questions/23113/select-vertices-of-mesh-in-python
+# The eye vertices are found from the (cached) mesh topology, in object mode.
+# The eye bones are created in edit_bones(), within the armature edit session shared with the other features.
 
 import bpy
 from mathutils import Vector
 
-from typing import List
+import numpy as np
+
+from typing import Dict
 
 from yallah import mblab_tools
+from yallah import mesh_topology
+
+FEATURE_NAME = "EyeGaze"
+FEATURE_ORDER = 30
+FEATURE_DEPENDS = []
+FEATURE_VERSION = 1
 
 EYE_NAME_R = 'eye_R'
 EYE_NAME_L = 'eye_L'
@@ -52,92 +58,70 @@ FEMALE_RIGHT_EYE_INDICES = [6941, 6670]
 MALE_LEFT_EYE_INDICES = [1214, 943]
 MALE_RIGHT_EYE_INDICES = [7166, 6895]
 
+def compute_center(mesh: bpy.types.Mesh, vertex_indices: np.ndarray) -> Vector:
+    """The average position of the given vertices."""
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
 
-# Check if the selected object os a MESH
-mesh_obj = bpy.context.active_object
-assert mesh_obj.type == 'MESH'
+    return Vector(co.reshape(-1, 3)[vertex_indices].astype(np.float64).mean(axis=0))
 
-arm_obj = mesh_obj.parent
-assert arm_obj.type == 'ARMATURE'
 
-arm = arm_obj.data
-assert isinstance(arm, bpy.types.Armature)
+def eye_vertices_indices(mesh_obj: bpy.types.Object) -> Dict[str, np.ndarray]:
+    """The indices of the vertices of each eye, by eye name."""
 
+    if mblab_tools.is_female(mesh_obj=mesh_obj):
+        leye_indices = FEMALE_LEFT_EYE_INDICES
+        reye_indices = FEMALE_RIGHT_EYE_INDICES
+    elif mblab_tools.is_male(mesh_obj=mesh_obj):
+        leye_indices = MALE_LEFT_EYE_INDICES
+        reye_indices = MALE_RIGHT_EYE_INDICES
+    else:
+        raise Exception("Mesh type for object '{}' is not supported.".format(mesh_obj.name))
 
-def compute_center(vertices: List[bpy.types.MeshVertex]) -> Vector:
-    # TODO -- Weird!!! I need to re-import the Vector here, otherwise it is unknown!
-    from mathutils import Vector
+    # Seam edges are left out of the vertex graph. The MBLab eyes are separate islands anyway.
+    topology = mesh_topology.get_mesh_topology(mesh=mesh_obj.data, delimit_seams=True)
 
-    n_vertices = len(vertices)
-    accu = Vector((0, 0, 0))
-    for v in vertices:
-        accu += v.co  # Accumulates the sum
+    return {eye_name: topology.linked_vertices(seed_indices=eye_vertex_ids)
+            for eye_name, eye_vertex_ids in zip([EYE_NAME_L, EYE_NAME_R], [leye_indices, reye_indices])}
 
-    return accu / n_vertices  # really compute the average
 
+def setup(mesh_obj: bpy.types.Object, arm_obj: bpy.types.Object) -> None:
+    # Check if the selected object os a MESH
+    assert mesh_obj.type == 'MESH'
+    assert arm_obj.type == 'ARMATURE'
 
-if mblab_tools.is_female(mesh_obj=mesh_obj):
-    leye_indices = FEMALE_LEFT_EYE_INDICES
-    reye_indices = FEMALE_RIGHT_EYE_INDICES
-elif mblab_tools.is_male(mesh_obj=mesh_obj):
-    leye_indices = MALE_LEFT_EYE_INDICES
-    reye_indices = MALE_RIGHT_EYE_INDICES
-else:
-    raise Exception("Mesh type for object '{}' is not supported.".format(mesh_obj.name))
+    for eye_name, eye_vertices in eye_vertices_indices(mesh_obj=mesh_obj).items():
+        print("Working on eye {}, {} vertices...".format(eye_name, len(eye_vertices)))
 
+        # Create a vertex group (if not there, yet)
+        if eye_name not in mesh_obj.vertex_groups:
+            vertex_group = mesh_obj.vertex_groups.new(name=eye_name)
+            # Assign vertices to this group
+            vertex_group.add(eye_vertices.tolist(), weight=1.0, type='REPLACE')
 
-# For each of the two eyes: select the vertices and create a bone for them.
-for eye_name, eye_vertex_ids in zip([EYE_NAME_L, EYE_NAME_R],
-                                    [leye_indices, reye_indices]):
+    # Leave nothing selected.
+    mesh = mesh_obj.data
+    for elements in [mesh.vertices, mesh.edges, mesh.polygons]:
+        elements.foreach_set("select", np.zeros(len(elements), dtype=bool))
 
-    print("Working on eye {}, vertex ids {}...".format(eye_name, eye_vertex_ids))
 
-    # Select the MESH
-    bpy.ops.object.mode_set(mode='OBJECT')
-    #bpy.context.scene.objects.active = mesh_obj
-    #dkw change blender v2.8
-    bpy.context.view_layer.objects.active = mesh_obj
+def edit_bones(mesh_obj: bpy.types.Object, arm_obj: bpy.types.Object) -> None:
+    # Invoked in armature EDIT mode
+    arm = arm_obj.data
+    assert isinstance(arm, bpy.types.Armature)
 
-    # Deselect all vertices
-    bpy.ops.object.mode_set(mode='EDIT')
-    bpy.ops.mesh.select_all(action='DESELECT')
-    bpy.ops.object.mode_set(mode='OBJECT')
+    if all(eye_name in arm.edit_bones for eye_name in [EYE_NAME_L, EYE_NAME_R]):
+        return
 
-    # Select a vertex pertaining to the eye.
-    #
-    # We have to select/unselect vertices in OBJECT mode!!!
-    # "The mesh object in python reflects the state of the mesh as it was, the last time it was in object-mode."
-    # See: https://blenderartists.org/forum/showthread.php?207542-Selecting-a-face-through-the-API&highlight=ow%20do%20I%20select/deselect%20vertices/edges/faces%20with%20python
-    for vtx_id in eye_vertex_ids:
-        mesh_obj.data.vertices[vtx_id].select = True
+    # The mesh topology is cached: no need to carry the eye vertices over from setup()
+    for eye_name, eye_vertices in eye_vertices_indices(mesh_obj=mesh_obj).items():
+        if eye_name in arm.edit_bones:
+            continue
 
-    # Select all vertices of the eye
-    bpy.ops.object.mode_set(mode='EDIT')
-    bpy.ops.mesh.select_linked()
-    bpy.ops.object.mode_set(mode='OBJECT')
+        # Computer the center of the eyes
+        eye_center = compute_center(mesh=mesh_obj.data, vertex_indices=eye_vertices)
+        print("eye {} center: {}".format(eye_name, eye_center))
 
-    # Create a vertex group (if not there, yet)
-    bpy.ops.object.mode_set(mode='EDIT')
-    if not eye_name in mesh_obj.vertex_groups:
-        bpy.ops.object.vertex_group_add()
-        vertex_group = mesh_obj.vertex_groups.active
-        # Name it
-        vertex_group.name = eye_name
-        # Assign vertices to this group
-        bpy.ops.object.vertex_group_assign()
-
-    # Computer the center of the eyes
-    eye_center = compute_center([v for v in mesh_obj.data.vertices if v.select])
-    print("eye {} center: {}".format(eye_name, eye_center))
-
-    # Select ARMATURE
-    bpy.ops.object.mode_set(mode='OBJECT')
-    #bpy.context.scene.objects.active = arm_obj
-    #Dkw v2.8 change
-    bpy.context.view_layer.objects.active = arm_obj
-    # Create the bone
-    bpy.ops.object.mode_set(mode='EDIT')  # switches to armature-edit
-    if eye_name not in arm.edit_bones:
         # add single bone (Shift-A)
         eye_bone = arm.edit_bones.new(eye_name)
         # set bone.parent to 'neck'
@@ -148,12 +132,18 @@ for eye_name, eye_vertex_ids in zip([EYE_NAME_L, EYE_NAME_R],
         # shift the bone.tail.y a bit forward, to the direction of gaze
         eye_bone.tail.y -= 0.025
 
-# We are in edit mode. The last eye is still selected. Deselect it.
-bpy.ops.object.mode_set(mode='OBJECT')
-#bpy.context.scene.objects.active = mesh_obj
-#Dkw Blender 2.8 change
-bpy.context.view_layer.objects.active = mesh_obj
-bpy.ops.object.mode_set(mode='EDIT')  # switches to mesh-edit
-bpy.ops.mesh.select_all(action='DESELECT')
-# Go back to Object mode.
-bpy.ops.object.mode_set(mode='OBJECT')
+
+def cleanup(mesh_obj: bpy.types.Object, arm_obj: bpy.types.Object) -> None:
+    arm = arm_obj.data
+
+    for eye_name in [EYE_NAME_L, EYE_NAME_R]:
+        if eye_name in mesh_obj.vertex_groups:
+            mesh_obj.vertex_groups.remove(mesh_obj.vertex_groups[eye_name])
+
+    bpy.context.view_layer.objects.active = arm_obj
+    bpy.ops.object.mode_set(mode='EDIT')
+    for eye_name in [EYE_NAME_L, EYE_NAME_R]:
+        if eye_name in arm.edit_bones:
+            arm.edit_bones.remove(arm.edit_bones[eye_name])
+    bpy.ops.object.mode_set(mode='OBJECT')
+    bpy.context.view_layer.objects.active = mesh_obj
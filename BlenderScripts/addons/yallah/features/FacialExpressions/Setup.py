@@ -4,6 +4,20 @@ import os
 
 from yallah import YALLAH_FEATURES_DIR
 
-print("Creating the Facial expressions (Shape Keys starting with 'fe_')")
-fe_file = os.path.join(YALLAH_FEATURES_DIR, "FacialExpressions/FacialExpressionsMBLab1_6.json")
-bpy.ops.object.create_shape_keys(shape_keys_filename=fe_file)
+FEATURE_NAME = "FacialExpressions"
+FEATURE_ORDER = 20
+FEATURE_DEPENDS = []
+FEATURE_VERSION = 1
+
+FE_FILE = os.path.join(YALLAH_FEATURES_DIR, "FacialExpressions/FacialExpressionsMBLab1_6.json")
+FEATURE_DATA_FILES = [FE_FILE]
+
+
+def setup(mesh_obj: bpy.types.Object, arm_obj: bpy.types.Object) -> None:
+    print("Creating the Facial expressions (Shape Keys starting with 'fe_')")
+    bpy.ops.object.create_shape_keys(shape_keys_filename=FE_FILE)
+
+
+def cleanup(mesh_obj: bpy.types.Object, arm_obj: bpy.types.Object) -> None:
+    # Remove by prefix: the keys of an older expressions file might have different names.
+    bpy.ops.object.remove_shape_keys(name_patterns="fe_*")
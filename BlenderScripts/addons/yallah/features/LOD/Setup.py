@@ -0,0 +1,252 @@
+#
+# Generate lighter levels of detail (LODs) of a set up character, for the WebGL and mobile targets.
+#
+# Usage:
+# - Setup the character
+# - Run the setup with features="LOD" (this feature is not part of the default setup)
+#
+# Each LOD is a decimated copy of the body, parented to the same armature, with:
+# - the vertex groups (hence, the armature weights), interpolated by the decimation, with the same names and order;
+# - the ShapeKeys animated at runtime (shape_key_utils.RUNTIME_SHAPE_KEY_PATTERNS: phoneme_*, fe_*, and the
+#   eye blink and gaze keys), transferred from the body surface with barycentric interpolation.
+#
+# Objects are named after the Unity convention (<name>_LOD0, <name>_LOD1, ...),
+# so that the Unity importer builds an LOD Group automatically. Hence, the body itself is renamed <prefix>_body_LOD0.
+# The vertex budget and the error (distance between the body and the LOD surfaces) are stored as custom properties
+# of each LOD object.
+
+import bpy
+from mathutils.bvhtree import BVHTree
+
+import fnmatch
+import re
+
+import numpy as np
+
+from typing import List
+from typing import Tuple
+
+from yallah.shape_key_utils import RUNTIME_SHAPE_KEY_PATTERNS
+
+FEATURE_NAME = "LOD"
+FEATURE_ORDER = 95
+# The LOD ShapeKeys are copies of the ones created by MaryTTS and FacialExpressions:
+# the LODs must be generated again when those features change.
+FEATURE_DEPENDS = ["RealTimeRequirements", "MaryTTS", "FacialExpressions"]
+FEATURE_VERSION = 1
+FEATURE_DEFAULT = False
+
+# The vertex budget of each LOD, relative to the number of vertices of the body (LOD0).
+LOD_VERTEX_RATIOS = [0.5, 0.25, 0.12]
+
+# The ShapeKeys transferred onto the LODs: the same used at runtime by the YALLAH Unity scripts on the body.
+LOD_SHAPE_KEY_PATTERNS = RUNTIME_SHAPE_KEY_PATTERNS
+
+# The maximum number of decimations with a corrected ratio, to get within the vertex budget
+LOD_MAX_BUDGET_PASSES = 5
+
+LOD0_SUFFIX = "_LOD0"
+
+
+def read_coords(vertices, n: int) -> np.ndarray:
+    """The coordinates of n vertices (or shape key points), as (n, 3) array."""
+    co = np.empty(n * 3, dtype=np.float32)
+    vertices.foreach_get("co", co)
+    return co.reshape(n, 3).astype(np.float64)
+
+
+def read_triangles(mesh: bpy.types.Mesh) -> np.ndarray:
+    """The (n_triangles, 3) vertex indices of the triangulated mesh."""
+    mesh.calc_loop_triangles()
+    tris = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+    mesh.loop_triangles.foreach_get("vertices", tris)
+    return tris.reshape(-1, 3)
+
+
+def nearest_on_surface(co: np.ndarray, tris: np.ndarray, points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """For each point, the nearest triangle of the surface (co, tris) and the distance to it."""
+
+    bvh = BVHTree.FromPolygons(co.tolist(), tris.tolist())
+    tri_indices = np.empty(len(points), dtype=np.int32)
+    distances = np.empty(len(points), dtype=np.float64)
+    for i, p in enumerate(points):
+        _, _, tri_indices[i], distances[i] = bvh.find_nearest(p)
+
+    return tri_indices, distances
+
+
+def barycentric_weights(a: np.ndarray, b: np.ndarray, c: np.ndarray, p: np.ndarray) -> np.ndarray:
+    """The (n, 3) barycentric coordinates of the points p (projected) on the triangles (a, b, c)."""
+
+    v0, v1, v2 = b - a, c - a, p - a
+    d00 = np.einsum('ij,ij->i', v0, v0)
+    d01 = np.einsum('ij,ij->i', v0, v1)
+    d11 = np.einsum('ij,ij->i', v1, v1)
+    d20 = np.einsum('ij,ij->i', v2, v0)
+    d21 = np.einsum('ij,ij->i', v2, v1)
+    denom = d00 * d11 - d01 * d01
+    degenerate = np.abs(denom) < 1e-20
+    denom[degenerate] = 1.0
+
+    v = (d11 * d20 - d01 * d21) / denom
+    w = (d00 * d21 - d01 * d20) / denom
+    v[degenerate] = 0.0
+    w[degenerate] = 0.0
+    weights = np.clip(np.stack((1.0 - v - w, v, w), axis=1), 0.0, 1.0)
+
+    return weights / weights.sum(axis=1, keepdims=True)
+
+
+def decimated_mesh(mesh_obj: bpy.types.Object, ratio: float, name: str) -> bpy.types.Mesh:
+    """A new mesh with the body decimated to the given ratio. Vertex groups are kept, ShapeKeys are not."""
+
+    mesh_copy = mesh_obj.data.copy()
+    temp_obj = bpy.data.objects.new(name + "_decimate", mesh_copy)
+    bpy.context.scene.collection.objects.link(temp_obj)
+    try:
+        if mesh_copy.shape_keys is not None:
+            temp_obj.shape_key_clear()
+
+        md = temp_obj.modifiers.new(name="LOD_decimate", type='DECIMATE')
+        md.decimate_type = 'COLLAPSE'
+        md.ratio = ratio
+        md.use_symmetry = True
+        md.symmetry_axis = 'X'
+
+        depsgraph = bpy.context.evaluated_depsgraph_get()
+        depsgraph.update()
+        temp_eval = temp_obj.evaluated_get(depsgraph)
+        lod_mesh = bpy.data.meshes.new_from_object(temp_eval, preserve_all_data_layers=True, depsgraph=depsgraph)
+        lod_mesh.name = name
+    finally:
+        bpy.data.objects.remove(temp_obj)
+        bpy.data.meshes.remove(mesh_copy)
+
+    return lod_mesh
+
+
+def transfer_shape_keys(mesh_obj: bpy.types.Object, lod_obj: bpy.types.Object, key_names: List[str],
+                        tri_indices: np.ndarray, src_tris: np.ndarray, bary: np.ndarray) -> None:
+    """Create the ShapeKeys on the LOD, interpolating the deltas of the body at the nearest surface points."""
+
+    mesh = mesh_obj.data  # type: bpy.types.Mesh
+    lod_mesh = lod_obj.data  # type: bpy.types.Mesh
+    n_src = len(mesh.vertices)
+    n_lod = len(lod_mesh.vertices)
+
+    key_blocks = mesh.shape_keys.key_blocks
+    basis = read_coords(mesh.shape_keys.reference_key.data, n_src)
+    lod_basis = read_coords(lod_mesh.vertices, n_lod)
+
+    corners = src_tris[tri_indices]  # (n_lod, 3) source vertex indices
+
+    lod_obj.shape_key_add(name=mesh.shape_keys.reference_key.name, from_mix=False)
+    for key_name in key_names:
+        kb = key_blocks[key_name]
+        deltas = read_coords(kb.data, n_src) - basis
+        lod_deltas = np.einsum('ij,ijk->ik', bary, deltas[corners])
+
+        lod_kb = lod_obj.shape_key_add(name=key_name, from_mix=False)
+        lod_kb.data.foreach_set("co", (lod_basis + lod_deltas).astype(np.float32).ravel())
+        lod_kb.slider_min = kb.slider_min
+        lod_kb.slider_max = kb.slider_max
+
+    lod_mesh.update()
+
+
+def lod_name(mesh_obj: bpy.types.Object, level: int) -> str:
+    base_name = mesh_obj.name[:-len(LOD0_SUFFIX)] if mesh_obj.name.endswith(LOD0_SUFFIX) else mesh_obj.name
+    return "{}_LOD{}".format(base_name, level)
+
+
+def setup(mesh_obj: bpy.types.Object, arm_obj: bpy.types.Object) -> None:
+    assert mesh_obj.type == 'MESH'
+    assert arm_obj.type == 'ARMATURE'
+
+    mesh = mesh_obj.data  # type: bpy.types.Mesh
+    n_vertices = len(mesh.vertices)
+
+    key_names = []
+    if mesh.shape_keys is not None:
+        key_names = [kb.name for kb in mesh.shape_keys.key_blocks
+                     if any(fnmatch.fnmatchcase(kb.name, p) for p in LOD_SHAPE_KEY_PATTERNS)]
+
+    # Body surface, for the transfer and the error
+    src_co = read_coords(mesh.shape_keys.reference_key.data if mesh.shape_keys is not None else mesh.vertices,
+                         n_vertices)
+    src_tris = read_triangles(mesh)
+
+    # The body becomes the LOD0
+    if not mesh_obj.name.endswith(LOD0_SUFFIX):
+        mesh_obj.name = lod_name(mesh_obj, 0)
+
+    for level, ratio in enumerate(LOD_VERTEX_RATIOS, start=1):
+        name = lod_name(mesh_obj, level)
+        vertex_budget = int(n_vertices * ratio)
+        # The decimation ratio applies to the faces: while the vertices exceed the budget, decimate again, corrected.
+        lod_ratio = ratio
+        lod_mesh = decimated_mesh(mesh_obj=mesh_obj, ratio=lod_ratio, name=name)
+        n_passes = 1
+        while len(lod_mesh.vertices) > vertex_budget and n_passes < LOD_MAX_BUDGET_PASSES:
+            lod_ratio = lod_ratio * vertex_budget / len(lod_mesh.vertices)
+            bpy.data.meshes.remove(lod_mesh)
+            lod_mesh = decimated_mesh(mesh_obj=mesh_obj, ratio=lod_ratio, name=name)
+            n_passes += 1
+        if len(lod_mesh.vertices) > vertex_budget:
+            print("WARNING: LOD{} '{}' has {} vertices, over the budget of {}, after {} decimations".format(
+                level, name, len(lod_mesh.vertices), vertex_budget, n_passes))
+        lod_obj = bpy.data.objects.new(name, lod_mesh)
+        for collection in mesh_obj.users_collection:
+            collection.objects.link(lod_obj)
+        lod_obj.parent = arm_obj
+        lod_obj.matrix_parent_inverse = mesh_obj.matrix_parent_inverse.copy()
+        lod_obj.matrix_basis = mesh_obj.matrix_basis.copy()
+        # The weights are copied with the mesh, but in 2.93 the group names belong to the object: same index order.
+        for vg in mesh_obj.vertex_groups:
+            lod_obj.vertex_groups.new(name=vg.name)
+        for md in mesh_obj.modifiers:
+            if md.type == 'ARMATURE':
+                lod_md = lod_obj.modifiers.new(name=md.name, type='ARMATURE')
+                lod_md.object = md.object
+                lod_md.use_vertex_groups = md.use_vertex_groups
+                lod_md.use_bone_envelopes = md.use_bone_envelopes
+
+        n_lod = len(lod_mesh.vertices)
+        lod_co = read_coords(lod_mesh.vertices, n_lod)
+        lod_tris = read_triangles(lod_mesh)
+
+        # LOD -> body: the nearest body triangles drive the ShapeKeys transfer
+        tri_indices, lod_to_body = nearest_on_surface(co=src_co, tris=src_tris, points=lod_co)
+        corners = src_tris[tri_indices]
+        bary = barycentric_weights(src_co[corners[:, 0]], src_co[corners[:, 1]], src_co[corners[:, 2]], lod_co)
+
+        if len(key_names) > 0:
+            transfer_shape_keys(mesh_obj=mesh_obj, lod_obj=lod_obj, key_names=key_names,
+                                tri_indices=tri_indices, src_tris=src_tris, bary=bary)
+
+        # body -> LOD: with the above, the symmetric (Hausdorff) distance
+        _, body_to_lod = nearest_on_surface(co=lod_co, tris=lod_tris, points=src_co)
+        max_error = float(max(lod_to_body.max(initial=0.0), body_to_lod.max(initial=0.0)))
+        mean_error = float((lod_to_body.sum() + body_to_lod.sum()) / (len(lod_to_body) + len(body_to_lod)))
+
+        lod_obj["yallah_lod_level"] = level
+        lod_obj["yallah_lod_vertex_budget"] = vertex_budget
+        lod_obj["yallah_lod_within_budget"] = n_lod <= vertex_budget
+        lod_obj["yallah_lod_max_error"] = max_error
+        lod_obj["yallah_lod_mean_error"] = mean_error
+
+        print("LOD{} '{}': {} vertices (budget {}), {} ShapeKeys, error max {:.5f} mean {:.5f}".format(
+            level, name, n_lod, vertex_budget, len(key_names), max_error, mean_error))
+
+
+def cleanup(mesh_obj: bpy.types.Object, arm_obj: bpy.types.Object) -> None:
+    lod_re = re.compile("^" + re.escape(lod_name(mesh_obj, 0)[:-1]) + "[1-9][0-9]*$")
+    for obj in list(arm_obj.children):
+        if obj.type == 'MESH' and lod_re.match(obj.name):
+            lod_mesh = obj.data
+            bpy.data.objects.remove(obj)
+            if lod_mesh.users == 0:
+                bpy.data.meshes.remove(lod_mesh)
+
+    if mesh_obj.name.endswith(LOD0_SUFFIX):
+        mesh_obj.name = mesh_obj.name[:-len(LOD0_SUFFIX)]
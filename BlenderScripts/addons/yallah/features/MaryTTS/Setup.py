@@ -4,6 +4,20 @@ import os
 
 from yallah import YALLAH_FEATURES_DIR
 
-print("Creating phonemes for the MaryTTS speech synthesis (ShapeKeys starting with 'phoneme_'")
-phonemes_file = os.path.join(YALLAH_FEATURES_DIR, "MaryTTS/PhonemesMBLab1_6.json")
-bpy.ops.object.create_shape_keys(shape_keys_filename=phonemes_file)
+FEATURE_NAME = "MaryTTS"
+FEATURE_ORDER = 10
+FEATURE_DEPENDS = []
+FEATURE_VERSION = 1
+
+PHONEMES_FILE = os.path.join(YALLAH_FEATURES_DIR, "MaryTTS/PhonemesMBLab1_6.json")
+FEATURE_DATA_FILES = [PHONEMES_FILE]
+
+
+def setup(mesh_obj: bpy.types.Object, arm_obj: bpy.types.Object) -> None:
+    print("Creating phonemes for the MaryTTS speech synthesis (ShapeKeys starting with 'phoneme_'")
+    bpy.ops.object.create_shape_keys(shape_keys_filename=PHONEMES_FILE)
+
+
+def cleanup(mesh_obj: bpy.types.Object, arm_obj: bpy.types.Object) -> None:
+    # Remove by prefix: the keys of an older phonemes file might have different names.
+    bpy.ops.object.remove_shape_keys(name_patterns="phoneme_*")
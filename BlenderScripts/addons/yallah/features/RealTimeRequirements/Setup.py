@@ -1,17 +1,21 @@
 import bpy
 
-obj = bpy.context.active_object
-assert obj is not None
-assert obj.type == 'MESH'
-mesh_obj = obj
+FEATURE_NAME = "RealTimeRequirements"
+FEATURE_ORDER = 90
+FEATURE_DEPENDS = []
+FEATURE_VERSION = 1
 
-# We need to remove all the modifiers (except the armature),
-# otherwise the blendshapes will not be visible in Unity
-modifiers_to_remove = []
-for md in mesh_obj.modifiers:
-    # print("md name: " + md.name)
-    if not md.name.endswith("_armature"):
-        modifiers_to_remove.append(md)
-for md in modifiers_to_remove:
-    print("Removing modifier '" + md.name + "'")
-    mesh_obj.modifiers.remove(md)
+
+def setup(mesh_obj: bpy.types.Object, arm_obj: bpy.types.Object) -> None:
+    assert mesh_obj.type == 'MESH'
+
+    # We need to remove all the modifiers (except the armature),
+    # otherwise the blendshapes will not be visible in Unity
+    modifiers_to_remove = []
+    for md in mesh_obj.modifiers:
+        # print("md name: " + md.name)
+        if not md.name.endswith("_armature"):
+            modifiers_to_remove.append(md)
+    for md in modifiers_to_remove:
+        print("Removing modifier '" + md.name + "'")
+        mesh_obj.modifiers.remove(md)
@@ -7,33 +7,36 @@ from yallah import YALLAH_FEATURES_DIR
 
 #
 # Test Feature. Used to check working directories and relative paths.
-print("Feature Test: main body")
-
-cwd = os.getcwd()
-print("Feature Test: cwd='{}'".format(cwd))
-print("Feature Test: features_dir='{}'".format(YALLAH_FEATURES_DIR))
+FEATURE_NAME = "Test"
+FEATURE_ORDER = 0
+FEATURE_DEPENDS = []
+FEATURE_VERSION = 1
 
 DATA_FILENAME = os.path.join(YALLAH_FEATURES_DIR, "Test/DataTest.json")
-
-mesh_obj = bpy.context.active_object
-assert mesh_obj.type == 'MESH'
-
-arm_obj = mesh_obj.parent
-assert arm_obj.type == 'ARMATURE'
+FEATURE_DATA_FILES = [DATA_FILENAME]
 
 
 def test_method():
     print("Feature Test: this is a test method")
 
 
-test_method()
+def setup(mesh_obj: bpy.types.Object, arm_obj: bpy.types.Object) -> None:
+    print("Feature Test: main body")
+
+    cwd = os.getcwd()
+    print("Feature Test: cwd='{}'".format(cwd))
+    print("Feature Test: features_dir='{}'".format(YALLAH_FEATURES_DIR))
 
-print("Loading data...")
-with open(DATA_FILENAME, "r") as json_file:
-    data = json.load(json_file)
-    print(data)
+    assert mesh_obj.type == 'MESH'
+    assert arm_obj.type == 'ARMATURE'
+
+    test_method()
+
+    print("Loading data...")
+    with open(DATA_FILENAME, "r") as json_file:
+        data = json.load(json_file)
+        print(data)
 
 
 if __name__ == "__main__":
     print("Feature Test: this is a __main__ code")
-
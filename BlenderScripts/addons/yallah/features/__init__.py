@@ -0,0 +1,223 @@
+# Registry of the YALLAH features applied by the SetupMBLabCharacter operator.
+#
+# Each built-in feature is a sub-package with a Setup.py module declaring:
+#   FEATURE_NAME: str  -- unique name of the feature
+#   FEATURE_ORDER: int  -- features are applied by increasing order, after their dependencies
+#   FEATURE_DEPENDS: List[str]  -- names of the features that must be applied before this one
+#   FEATURE_VERSION: int  -- (optional) to increase when the code changes the result of the setup
+#   FEATURE_DATA_FILES: List[str]  -- (optional) the data files that the feature reads
+#   FEATURE_DEFAULT: bool  -- (optional) if False, the feature is applied only when explicitly selected
+#   def setup(mesh_obj, arm_obj) -> None  -- (optional) the entry function.
+#       It is invoked in OBJECT mode, with the mesh active.
+#   def edit_bones(mesh_obj, arm_obj) -> None  -- (optional) creates or edits the armature bones.
+#       It is invoked in EDIT mode of the armature, after the setup() of all the features. When many characters share
+#       the same armature, their edit_bones() are invoked in the same edit session.
+#   def cleanup(mesh_obj, arm_obj) -> None  -- (optional) removes what setup() created, before applying it again.
+#
+# Version and data files contents make the fingerprint of a feature. It is stored on the character at setup time,
+# so that a new setup on the same character re-applies only the features whose fingerprint changed.
+#
+# Other add-ons can plug their own features, without editing YALLAH, with:
+#   from yallah.features import register_feature
+#   register_feature(name="MyFeature", setup=my_setup_function, order=60, depends=["EyeGaze"])
+#
+# The built-in feature modules are imported only when the registry is first queried (or modified),
+# so that enabling the add-on doesn't pay for them.
+
+import hashlib
+import importlib
+import os
+
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+# The sub-packages with the built-in features.
+BUILTIN_FEATURES = ["Test", "MaryTTS", "FacialExpressions", "EyeGaze", "Camera", "RealTimeRequirements", "LOD"]
+
+
+class Feature:
+    """A setup step applied to an MBLab character."""
+
+    def __init__(self, name: str, setup: Optional[Callable], order: int, depends: List[str],
+                 module_name: Optional[str], version: int = 1, data_files: Optional[List[str]] = None,
+                 cleanup: Optional[Callable] = None, edit_bones: Optional[Callable] = None, default: bool = True):
+        self.name = name
+        self.setup = setup
+        self.edit_bones = edit_bones
+        self.order = order
+        self.depends = depends
+        # The module defining the feature. None for features registered with a plain function.
+        self.module_name = module_name
+        self.version = version
+        self.data_files = data_files if data_files is not None else []
+        self.cleanup = cleanup
+        # Whether the feature is part of the default setup
+        self.default = default
+
+    def fingerprint(self) -> str:
+        """A hash of the feature name, version, and the contents of its data files."""
+
+        h = hashlib.sha1()
+        h.update("{}:{}".format(self.name, self.version).encode("utf-8"))
+        for data_file in self.data_files:
+            h.update(_file_digest(data_file))
+        return h.hexdigest()
+
+    def __repr__(self):
+        return "Feature({}, order={}, depends={})".format(self.name, self.order, self.depends)
+
+
+# All the registered features, by name.
+_FEATURES = {}  # type: Dict[str, Feature]
+
+# True when the built-in features were requested, but their modules are not imported yet.
+_BUILTINS_PENDING = False
+
+# The digests of the data files, by path, with the modification time they were computed at.
+_FILE_DIGESTS = {}  # type: Dict[str, Tuple[float, bytes]]
+
+
+def _file_digest(filename: str) -> bytes:
+    """The digest of a file contents. The file is read again only if its modification time changed."""
+
+    mtime = os.path.getmtime(filename)
+    cached = _FILE_DIGESTS.get(filename)
+    if cached is None or cached[0] != mtime:
+        with open(filename, "rb") as in_file:
+            cached = mtime, hashlib.sha1(in_file.read()).digest()
+        _FILE_DIGESTS[filename] = cached
+
+    return cached[1]
+
+
+def register_feature(name: str, setup: Optional[Callable], order: int = 100, depends: Optional[List[str]] = None,
+                     module_name: Optional[str] = None, version: int = 1, data_files: Optional[List[str]] = None,
+                     cleanup: Optional[Callable] = None, edit_bones: Optional[Callable] = None,
+                     default: bool = True) -> Feature:
+    """Register (or replace) a feature."""
+
+    _import_pending_builtins()
+
+    if setup is None and edit_bones is None:
+        raise Exception("Feature '{}' must have at least a setup or an edit_bones function".format(name))
+
+    feature = Feature(name=name, setup=setup, order=order, depends=list(depends) if depends is not None else [],
+                      module_name=module_name, version=version,
+                      data_files=list(data_files) if data_files is not None else [], cleanup=cleanup,
+                      edit_bones=edit_bones, default=default)
+    _FEATURES[name] = feature
+    return feature
+
+
+def unregister_feature(name: str) -> None:
+    _import_pending_builtins()
+    del _FEATURES[name]
+
+
+def register_feature_module(module_name: str) -> Feature:
+    """Import a feature module and register it from its FEATURE_* declarations and setup()/edit_bones() functions."""
+
+    module = importlib.import_module(module_name)
+    return register_feature(name=module.FEATURE_NAME, setup=getattr(module, "setup", None),
+                            order=module.FEATURE_ORDER,
+                            depends=getattr(module, "FEATURE_DEPENDS", []), module_name=module_name,
+                            version=getattr(module, "FEATURE_VERSION", 1),
+                            data_files=getattr(module, "FEATURE_DATA_FILES", []),
+                            cleanup=getattr(module, "cleanup", None),
+                            edit_bones=getattr(module, "edit_bones", None),
+                            default=getattr(module, "FEATURE_DEFAULT", True))
+
+
+def register_builtin_features(lazy: bool = False) -> None:
+    """Register the built-in features.
+    :param lazy: If True, the feature modules are imported at the first use of the registry.
+    """
+
+    global _BUILTINS_PENDING
+
+    _BUILTINS_PENDING = True
+    if not lazy:
+        _import_pending_builtins()
+
+
+def _import_pending_builtins() -> None:
+    global _BUILTINS_PENDING
+
+    if not _BUILTINS_PENDING:
+        return
+
+    _BUILTINS_PENDING = False
+    for feature_dir in BUILTIN_FEATURES:
+        register_feature_module("{}.{}.Setup".format(__name__, feature_dir))
+
+
+def registered_features() -> List[Feature]:
+    _import_pending_builtins()
+    return list(_FEATURES.values())
+
+
+def resolve_features(selected: Optional[List[str]] = None, skipped: Optional[List[str]] = None) -> List[Feature]:
+    """The features to apply, in application order.
+
+    :param selected: The names of the features to apply. Their dependencies are added automatically.
+     If None, all the default registered features are applied.
+    :param skipped: The names of the features not to apply. It is an error to skip a dependency of an applied feature.
+    :return: The features, sorted so that each one comes after its dependencies, and then by order.
+    """
+
+    _import_pending_builtins()
+
+    skipped = set(skipped) if skipped is not None else set()
+
+    for name in list(selected or []) + list(skipped):
+        if name not in _FEATURES:
+            raise Exception("Unknown feature '{}'. Registered features: {}".format(name, list(_FEATURES.keys())))
+
+    # Collect the features to apply, with their dependencies.
+    to_visit = list(selected) if selected is not None else [f.name for f in _FEATURES.values() if f.default]
+    to_visit = [name for name in to_visit if name not in skipped]
+    names = set()
+    while len(to_visit) > 0:
+        name = to_visit.pop()
+        if name in names:
+            continue
+        if name not in _FEATURES:
+            raise Exception("Unknown feature '{}', required as dependency".format(name))
+        if name in skipped:
+            raise Exception("Feature '{}' can not be skipped: other features depend on it".format(name))
+        names.add(name)
+        to_visit.extend(_FEATURES[name].depends)
+
+    # Topological sort, picking at each step the ready feature with the lowest order.
+    out = []  # type: List[Feature]
+    done = set()
+    while len(out) < len(names):
+        ready = [_FEATURES[n] for n in names if n not in done and all(d in done for d in _FEATURES[n].depends)]
+        if len(ready) == 0:
+            raise Exception("Circular dependencies among features {}".format(sorted(names - done)))
+        next_feature = min(ready, key=lambda f: (f.order, f.name))
+        out.append(next_feature)
+        done.add(next_feature.name)
+
+    return out
+
+
+def outdated_features(features: List[Feature], fingerprints: Dict[str, str]) -> List[Feature]:
+    """Select, keeping the order, the features that must be applied again on a character.
+
+    :param features: The features, in application order (see resolve_features()).
+    :param fingerprints: The fingerprints stored on the character when the features were applied.
+    :return: The features whose fingerprint changed, and the features depending on them.
+    """
+
+    outdated_names = set()
+    out = []
+    for feature in features:
+        if fingerprints.get(feature.name) != feature.fingerprint() or any(d in outdated_names for d in feature.depends):
+            outdated_names.add(feature.name)
+            out.append(feature)
+
+    return out
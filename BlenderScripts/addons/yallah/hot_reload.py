@@ -0,0 +1,249 @@
+import bpy
+
+import ast
+import importlib
+import os
+import sys
+import time
+
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+
+# Incremental reload of the yallah package, for development (see BlenderScenes/Scripts/ReloadYallahModule.py).
+#
+# The file modification times of the loaded yallah modules are tracked between calls.
+# At each call, only the modules whose file changed are reloaded, together with the modules importing them
+# at module level (imports inside functions are resolved at call time, so they don't need a reload).
+# The reloaded modules defining register()/unregister() (app handlers, bpy.types properties, panels) have their
+# unregister() called before the reload, and the register() of their new version after it. When the package itself
+# is reloaded, its own functions are used, since they (un)register the submodules too.
+# The other bpy classes (operators, panels) defined in the reloaded modules are unregistered before the reload,
+# and their new version registered after it.
+#
+# This module is never reloaded by itself: it holds the state between calls. Restart Blender after editing it.
+
+PACKAGE_NAME = __name__.rsplit(".", 1)[0]
+
+# The modification times of the module files, at the last (re)load. None until the first call.
+_MTIMES = None  # type: Optional[Dict[str, float]]
+
+# The base classes of the classes that register with bpy.utils.register_class
+BPY_CLASS_TYPES = (bpy.types.Operator, bpy.types.Panel, bpy.types.Menu, bpy.types.UIList, bpy.types.PropertyGroup)
+
+
+def package_modules() -> Dict[str, str]:
+    """The loaded modules of the package, as {module_name: filename}. This module is left out."""
+
+    out = {}
+    for name, module in list(sys.modules.items()):
+        if module is None or name == __name__:
+            continue
+        if name != PACKAGE_NAME and not name.startswith(PACKAGE_NAME + "."):
+            continue
+        filename = getattr(module, "__file__", None)
+        if filename is not None and os.path.exists(filename):
+            out[name] = filename
+
+    return out
+
+
+def file_mtimes(modules: Dict[str, str]) -> Dict[str, float]:
+    return {name: os.path.getmtime(filename) for name, filename in modules.items()}
+
+
+def module_level_imports(name: str, filename: str, known: Set[str]) -> Set[str]:
+    """The modules among known that the module imports at module level (also within top-level if/try blocks)."""
+
+    with open(filename, "r", encoding="utf-8") as in_file:
+        tree = ast.parse(in_file.read(), filename=filename)
+
+    module = sys.modules[name]
+    package = module.__package__ or ""
+
+    # Walk the module body, without entering functions and classes
+    statements = list(tree.body)
+    imports = []
+    while len(statements) > 0:
+        stmt = statements.pop()
+        if isinstance(stmt, (ast.Import, ast.ImportFrom)):
+            imports.append(stmt)
+        elif isinstance(stmt, (ast.If, ast.Try, ast.With)):
+            for field in ["body", "orelse", "finalbody", "handlers"]:
+                statements.extend(getattr(stmt, field, []))
+        elif isinstance(stmt, ast.ExceptHandler):
+            statements.extend(stmt.body)
+
+    out = set()
+    for stmt in imports:
+        if isinstance(stmt, ast.Import):
+            targets = [alias.name for alias in stmt.names]
+        else:
+            if stmt.level > 0:
+                base_parts = package.split(".")
+                base = ".".join(base_parts[:len(base_parts) - (stmt.level - 1)])
+                target = base + "." + stmt.module if stmt.module is not None else base
+            else:
+                target = stmt.module
+            # `from pkg import submodule` depends on the submodule as well
+            targets = [target] + [target + "." + alias.name for alias in stmt.names]
+
+        out.update(t for t in targets if t in known and t != name)
+
+    return out
+
+
+def import_graph(modules: Dict[str, str]) -> Dict[str, Set[str]]:
+    """For each module, the package modules it imports at module level."""
+
+    known = set(modules.keys())
+    return {name: module_level_imports(name=name, filename=filename, known=known) for name, filename in modules.items()}
+
+
+def modules_to_reload(changed: Set[str], graph: Dict[str, Set[str]]) -> List[str]:
+    """The changed modules and their dependents, sorted so that each module comes after its dependencies."""
+
+    # Transitive dependents
+    dependents = {name: set() for name in graph}
+    for name, deps in graph.items():
+        for dep in deps:
+            dependents[dep].add(name)
+
+    to_reload = set()
+    to_visit = list(changed)
+    while len(to_visit) > 0:
+        name = to_visit.pop()
+        if name in to_reload:
+            continue
+        to_reload.add(name)
+        to_visit.extend(dependents[name])
+
+    # Topological sort. Cycles are broken by module depth (packages before their submodules).
+    out = []
+    done = set()
+    while len(out) < len(to_reload):
+        ready = [n for n in to_reload if n not in done and all(d in done or d not in to_reload for d in graph[n])]
+        if len(ready) == 0:
+            ready = [n for n in to_reload if n not in done]
+        next_name = min(ready, key=lambda n: (n.count("."), n))
+        out.append(next_name)
+        done.add(next_name)
+
+    return out
+
+
+def registered_bpy_classes(module_names: List[str]) -> List[type]:
+    """The registered bpy classes defined in the given modules, in definition order."""
+
+    out = []
+    for name in module_names:
+        for obj in list(vars(sys.modules[name]).values()):
+            if isinstance(obj, type) and issubclass(obj, BPY_CLASS_TYPES) and obj.__module__ == name:
+                if getattr(obj, "is_registered", False):
+                    out.append(obj)
+
+    return out
+
+
+def modules_with_register_functions(module_names: List[str]) -> List[str]:
+    """The modules whose register()/unregister() must be called around the reload.
+    If the package is among them, only the package: its functions call the ones of the submodules."""
+
+    out = [name for name in module_names
+           if callable(getattr(sys.modules[name], "register", None))
+           and callable(getattr(sys.modules[name], "unregister", None))]
+
+    if PACKAGE_NAME in out:
+        return [PACKAGE_NAME]
+
+    return out
+
+
+def reload_yallah(verbose: bool = True) -> List[str]:
+    """Reload the changed yallah modules and their dependents, and re-register them and their bpy classes.
+    The first call reloads all the modules, since the files could have changed since Blender started.
+
+    :return: The names of the reloaded modules.
+    """
+
+    global _MTIMES
+
+    if PACKAGE_NAME not in sys.modules:
+        importlib.import_module(PACKAGE_NAME)
+
+    start = time.perf_counter()
+
+    modules = package_modules()
+    mtimes = file_mtimes(modules)
+    first_call = _MTIMES is None
+    if first_call:
+        changed = set(modules.keys())
+    else:
+        changed = {name for name, mtime in mtimes.items() if _MTIMES.get(name) != mtime}
+
+    if len(changed) == 0:
+        if verbose:
+            print("{}: no module changed".format(PACKAGE_NAME))
+        _MTIMES = mtimes
+        return []
+
+    graph = import_graph(modules)
+    reload_order = modules_to_reload(changed=changed, graph=graph)
+
+    #
+    # Unregister the modules to reload. A failing unregister() means that the module was not registered.
+    unregistered_modules = []
+    for name in reversed(modules_with_register_functions(module_names=reload_order)):
+        try:
+            sys.modules[name].unregister()
+            unregistered_modules.insert(0, name)
+        except Exception as e:
+            print("Module {} not unregistered ({}): not registered again".format(name, e))
+
+    # And the classes left registered
+    old_classes = registered_bpy_classes(module_names=reload_order)
+    for cls in reversed(old_classes):
+        bpy.utils.unregister_class(cls)
+
+    #
+    # Reload
+    for name in reload_order:
+        importlib.reload(sys.modules[name])
+
+    #
+    # Register the new versions of the classes
+    for cls in old_classes:
+        new_cls = getattr(sys.modules[cls.__module__], cls.__name__, None)
+        if new_cls is None:
+            print("Class {}.{} disappeared: not registered again".format(cls.__module__, cls.__name__))
+            continue
+        bpy.utils.register_class(new_cls)
+
+    for name in unregistered_modules:
+        sys.modules[name].register()
+
+    #
+    # The features registry points to the setup functions of the old modules.
+    features_name = PACKAGE_NAME + ".features"
+    if features_name in reload_order:
+        # The registry itself was reset
+        sys.modules[features_name].register_builtin_features(lazy=True)
+    elif features_name in sys.modules:
+        features = sys.modules[features_name]
+        for feature in features.registered_features():
+            if feature.module_name in reload_order:
+                features.register_feature_module(feature.module_name)
+
+    # Modules imported for the first time by the reloaded ones are tracked from now on.
+    _MTIMES = file_mtimes(package_modules())
+
+    if verbose:
+        print("{}: reloaded {} modules, {} modules and {} classes re-registered, in {:.1f} ms (changed: {})".format(
+            PACKAGE_NAME, len(reload_order), len(unregistered_modules), len(old_classes),
+            (time.perf_counter() - start) * 1000,
+            "all" if first_call else ", ".join(sorted(changed))))
+        for name in reload_order:
+            print("  " + name)
+
+    return reload_order
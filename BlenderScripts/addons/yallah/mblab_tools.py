@@ -2,8 +2,13 @@ import bpy
 
 import os
 
+from typing import Dict
 from typing import List
 from typing import Optional
+from typing import Tuple
+
+from . import features
+from . setup_trace import SetupTrace
 
 # This is a set of tools to procedurally edit characters generated by MB-Lab.
 # All operators are under name space "object.mbast_tools" (the original MBLab operators are under mbast)
@@ -33,14 +38,25 @@ def is_mblab_body(mesh_obj: bpy.types.Object) -> bool:
     return mesh.name.startswith('MBLab_')
 
 
+def mblab_phenotype(mesh_obj: bpy.types.Object) -> Optional[str]:
+    """'female' or 'male' for the supported MBLab characters, else None. One mesh name check, for the UI redraws."""
+    mesh_name = mesh_obj.data.name  # type: str
+    if mesh_name.startswith('MBLab_human_female'):
+        return 'female'
+    elif mesh_name.startswith('MBLab_human_male'):
+        return 'male'
+    return None
+
+
 def character_prefix(mesh_obj: bpy.types.Object) -> Optional[str]:
     """Get the prefix that has been used to create the character.
     :param mesh_obj: The MESH object, as created and named by MBLab.
+     After the LOD feature, the body is the first level of detail, named '<prefix>_body_LOD0'.
     """
 
     import re
 
-    patt = re.compile("^(.+)_body$")
+    patt = re.compile("^(.+)_body(_LOD0)?$")
     res = patt.match(mesh_obj.name)
     if res:
         name = res.group(1)
@@ -49,6 +65,283 @@ def character_prefix(mesh_obj: bpy.types.Object) -> Optional[str]:
         return None
 
 
+def get_feature_fingerprints(mesh_obj: bpy.types.Object) -> Dict[str, str]:
+    """The fingerprints of the features applied on the character, as {feature_name: fingerprint}."""
+    import json
+
+    if mesh_obj.yallah_feature_fingerprints == "":
+        return {}
+    return json.loads(mesh_obj.yallah_feature_fingerprints)
+
+
+def set_feature_fingerprints(mesh_obj: bpy.types.Object, fingerprints: Dict[str, str]) -> None:
+    import json
+
+    mesh_obj.yallah_feature_fingerprints = json.dumps(fingerprints, sort_keys=True)
+
+
+def character_setup_features(mesh_obj: bpy.types.Object, selected: Optional[List[str]] = None,
+                             skipped: Optional[List[str]] = None) -> List[features.Feature]:
+    """The features to apply (see features.resolve_features()) on an already set up character.
+    With selected None, they include the non-default features (e.g., LOD) already applied on the character,
+    i.e., having a stored fingerprint, unless they or their dependencies are skipped."""
+
+    if selected is None:
+        skipped_names = set(skipped or [])
+        registered = {f.name: f for f in features.registered_features()}
+        names = [f.name for f in registered.values() if f.default]
+        for name in get_feature_fingerprints(mesh_obj=mesh_obj).keys():
+            feature = registered.get(name)
+            if feature is None or feature.default or name in skipped_names:
+                continue
+            if any(d in skipped_names for d in feature.depends):
+                continue
+            names.append(name)
+        selected = [name for name in names if name not in skipped_names]
+
+    return features.resolve_features(selected=selected, skipped=skipped)
+
+
+def outdated_setup_features(mesh_obj: bpy.types.Object) -> Tuple[List[str], Optional[str]]:
+    """The names of the features whose inputs changed since the character was set up.
+    It imports the feature modules and reads their data files: don't call it at each UI redraw.
+
+    :return: The outdated feature names, and the error that prevented the check (e.g., a missing data file), or None.
+    """
+
+    try:
+        outdated = features.outdated_features(features=character_setup_features(mesh_obj=mesh_obj),
+                                              fingerprints=get_feature_fingerprints(mesh_obj=mesh_obj))
+    except OSError as e:
+        return [], "Can not check the features: {}".format(e)
+
+    return [f.name for f in outdated], None
+
+
+# The results of outdated_setup_features(), by object name, with the fingerprints property they were computed for.
+# Filled by CheckSetupUpdates and read by the panel, which must not resolve the features at each redraw.
+_SETUP_UPDATES_CACHE = {}  # type: Dict[str, Tuple[str, List[str], Optional[str]]]
+
+
+def check_setup_updates(mesh_obj: bpy.types.Object) -> Tuple[List[str], Optional[str]]:
+    """Compute outdated_setup_features() and cache the result for cached_setup_updates()."""
+    outdated, error = outdated_setup_features(mesh_obj=mesh_obj)
+    _SETUP_UPDATES_CACHE[mesh_obj.name_full] = mesh_obj.yallah_feature_fingerprints, outdated, error
+    return outdated, error
+
+
+def cached_setup_updates(mesh_obj: bpy.types.Object) -> Optional[Tuple[List[str], Optional[str]]]:
+    """The last result of check_setup_updates(), or None if never checked or if the fingerprints changed since."""
+    cached = _SETUP_UPDATES_CACHE.get(mesh_obj.name_full)
+    if cached is None or cached[0] != mesh_obj.yallah_feature_fingerprints:
+        return None
+    return cached[1], cached[2]
+
+
+def split_names(names: str) -> List[str]:
+    """Split a comma-separated list of names, as used in the operators string properties."""
+    return [n.strip() for n in names.split(",") if n.strip() != ""]
+
+
+def character_setup_error(mesh_obj: bpy.types.Object) -> Optional[str]:
+    """Check whether a MESH object can be set up.
+    :return: The error message, or None if the character can be set up.
+    """
+
+    arm_obj = mesh_obj.parent
+    if arm_obj is None:
+        return "Character Mesh must have a parent Armature"
+
+    if arm_obj.type != 'ARMATURE':
+        return "Character Mesh parent object {} must be Armature".format(arm_obj.name)
+
+    if character_prefix(mesh_obj=mesh_obj) is None:
+        return "Character not properly named (should be, for example: 'Anna_body')." \
+               " Please, use the MBLab prefix during finalization."
+
+    return None
+
+
+def setup_characters(mesh_objs: List[bpy.types.Object], selected: Optional[List[str]] = None,
+                     skipped: Optional[List[str]] = None, force_update: bool = False,
+                     trace: Optional[SetupTrace] = None) -> List[dict]:
+    """Setup (or update) many MBLab characters in one pass.
+
+    The features are applied character by character, in OBJECT mode.
+    Then, the bones of all the characters sharing an armature are created in a single armature edit session.
+    Finally, the fingerprints are stored, and the A-Pose is created for the armatures of the new characters.
+    Parsed data (shape keys databases, mesh topologies) are cached, hence shared among the characters.
+
+    On an already set up character, only the features whose fingerprint changed are re-applied
+    (all of them with force_update), after being cleaned up.
+
+    :param mesh_objs: The character MESH objects.
+    :param selected: The features to apply (see features.resolve_features()). None for all.
+    :param skipped: The features not to apply.
+    :param force_update: Re-apply the features to set up characters even if their fingerprint didn't change.
+    :param trace: The trace where to record the stages. One trace thread per character.
+    :return: One result per character, as dict with keys "mesh", "status" ('ok', 'error', or 'up-to-date'),
+     "features" (the names of the applied features), "seconds", and "error" (the message, in case of error).
+    """
+
+    import time
+    import traceback
+
+    setup_features = features.resolve_features(selected=selected, skipped=skipped)
+    if trace is None:
+        trace = SetupTrace(name=", ".join(m.name for m in mesh_objs))
+
+    # A job for each character that needs some work.
+    class Job:
+        def __init__(self, tid: int, mesh_obj: bpy.types.Object, job_features: List[features.Feature], result: dict):
+            self.tid = tid
+            self.mesh_obj = mesh_obj
+            self.arm_obj = mesh_obj.parent
+            self.features = job_features
+            self.update = mesh_obj.yallah_setup_done
+            self.result = result
+
+        def fail(self, e: Exception) -> None:
+            print("Setup of '{}' failed: {}".format(self.mesh_obj.name, e))
+            traceback.print_exc()
+            self.result["status"] = "error"
+            self.result["error"] = str(e)
+
+    results = []
+    jobs = []  # type: List[Job]
+    for tid, mesh_obj in enumerate(mesh_objs):
+        result = {"mesh": mesh_obj.name, "status": "ok", "features": [], "seconds": 0.0}
+        results.append(result)
+
+        error = character_setup_error(mesh_obj=mesh_obj)
+        if error is not None:
+            result["status"] = "error"
+            result["error"] = error
+            continue
+
+        job_features = setup_features
+        if mesh_obj.yallah_setup_done:
+            job_features = character_setup_features(mesh_obj=mesh_obj, selected=selected, skipped=skipped)
+            if not force_update:
+                job_features = features.outdated_features(features=job_features,
+                                                          fingerprints=get_feature_fingerprints(mesh_obj=mesh_obj))
+            if len(job_features) == 0:
+                result["status"] = "up-to-date"
+                continue
+
+        result["features"] = [f.name for f in job_features]
+        jobs.append(Job(tid=tid, mesh_obj=mesh_obj, job_features=job_features, result=result))
+
+    if len(jobs) == 0:
+        return results
+
+    with trace.recording(), trace.stage("Setup", mesh_obj=jobs[0].mesh_obj, arm_obj=jobs[0].arm_obj,
+                                        character=", ".join(job.mesh_obj.name for job in jobs)):
+        #
+        # VIEW MODE TO REAL-TIME RENDERING
+        # (There is no screen when running in background mode)
+        #
+        if bpy.context.screen is not None:
+            for area in bpy.context.screen.areas:
+                if area.type == 'VIEW_3D':
+                    for space in area.spaces:
+                        if space.type == 'VIEW_3D':
+                            space.shading.type = 'SOLID'
+
+        #
+        # APPLY THE FEATURES
+        # (Test, MaryTTS visemes, Facial Expressions, EyeGaze groups, RealTimeRequirements, ...)
+        #
+        for job in jobs:
+            start = time.perf_counter()
+            try:
+                for feature in job.features:
+                    with trace.stage(feature.name, mesh_obj=job.mesh_obj, arm_obj=job.arm_obj, tid=job.tid):
+                        if job.update and feature.cleanup is not None:
+                            print("Cleaning up feature '{}' on '{}'".format(feature.name, job.mesh_obj.name))
+                            SetupMBLabCharacter.clear_selection(mesh_obj=job.mesh_obj)
+                            feature.cleanup(mesh_obj=job.mesh_obj, arm_obj=job.arm_obj)
+                        if feature.setup is not None:
+                            print("Applying feature '{}' on '{}'".format(feature.name, job.mesh_obj.name))
+                            SetupMBLabCharacter.clear_selection(mesh_obj=job.mesh_obj)
+                            feature.setup(mesh_obj=job.mesh_obj, arm_obj=job.arm_obj)
+            except Exception as e:
+                job.fail(e)
+            job.result["seconds"] += time.perf_counter() - start
+
+        #
+        # CREATE THE BONES (EyeGaze, Camera, ...), WITH ONE EDIT SESSION PER ARMATURE
+        #
+        ok_jobs = [job for job in jobs if job.result["status"] == "ok"]
+        armatures = []  # type: List[bpy.types.Object]
+        for job in ok_jobs:
+            if job.arm_obj not in armatures:
+                armatures.append(job.arm_obj)
+
+        for arm_obj in armatures:
+            arm_jobs = [job for job in ok_jobs
+                        if job.arm_obj == arm_obj and any(f.edit_bones is not None for f in job.features)]
+            if len(arm_jobs) == 0:
+                continue
+
+            SetupMBLabCharacter.clear_selection(mesh_obj=arm_jobs[0].mesh_obj)
+            bpy.context.view_layer.objects.active = arm_obj
+            bpy.ops.object.mode_set(mode='EDIT')  # switches to armature-edit
+            try:
+                for job in arm_jobs:
+                    start = time.perf_counter()
+                    try:
+                        for feature in job.features:
+                            if feature.edit_bones is None:
+                                continue
+                            with trace.stage(feature.name + " bones", mesh_obj=job.mesh_obj, arm_obj=arm_obj,
+                                             tid=job.tid):
+                                feature.edit_bones(mesh_obj=job.mesh_obj, arm_obj=arm_obj)
+                    except Exception as e:
+                        job.fail(e)
+                    job.result["seconds"] += time.perf_counter() - start
+            finally:
+                bpy.ops.object.mode_set(mode='OBJECT')
+
+        #
+        # STORE THE FINGERPRINTS, CREATE A REFERENCE A-Pose, AND MARK THE SETUP AS DONE
+        # The A-Pose has object transform and all bones reset to identity.
+        #
+        apose_armatures = []  # type: List[bpy.types.Object]
+        for job in jobs:
+            if job.result["status"] != "ok":
+                continue
+
+            start = time.perf_counter()
+            try:
+                if not job.update and job.arm_obj not in apose_armatures:
+                    with trace.stage("A-Pose", mesh_obj=job.mesh_obj, arm_obj=job.arm_obj, tid=job.tid):
+                        SetupMBLabCharacter.clear_selection(mesh_obj=job.mesh_obj)
+                        bpy.context.view_layer.objects.active = job.arm_obj
+                        bpy.ops.yallah.create_apose_action()
+                    apose_armatures.append(job.arm_obj)
+
+                # Written only when all the stages succeeded
+                fingerprints = get_feature_fingerprints(mesh_obj=job.mesh_obj)
+                for feature in job.features:
+                    fingerprints[feature.name] = feature.fingerprint()
+                set_feature_fingerprints(mesh_obj=job.mesh_obj, fingerprints=fingerprints)
+
+                job.mesh_obj.yallah_setup_done = True
+            except Exception as e:
+                job.fail(e)
+            job.result["seconds"] += time.perf_counter() - start
+
+        #
+        # Leave all the processed characters selected, the first one active.
+        #
+        SetupMBLabCharacter.clear_selection(mesh_obj=jobs[0].mesh_obj)
+        for job in jobs[1:]:
+            job.mesh_obj.select_set(True)
+
+    return results
+
+
 #
 #
 #
@@ -58,6 +351,26 @@ class SetupMBLabCharacter(bpy.types.Operator):
     bl_label = "MBLab Tools - Setup MBLab Character"
     bl_options = {'REGISTER', 'INTERNAL', 'UNDO'}
 
+    features: bpy.props.StringProperty(name="Features",
+                                       description="Comma-separated list of the features to apply"
+                                                   " (dependencies are added automatically). If empty, all features",
+                                       default="")
+
+    skip_features: bpy.props.StringProperty(name="Skip Features",
+                                            description="Comma-separated list of the features not to apply",
+                                            default="")
+
+    trace_filename: bpy.props.StringProperty(name="Trace File",
+                                             description="If set, the timings of the setup stages are saved"
+                                                         " in this file, in Chrome trace (JSON) format",
+                                             subtype="FILE_PATH",
+                                             default="")
+
+    force_update: bpy.props.BoolProperty(name="Force Update",
+                                         description="On an already set up character, apply the features again"
+                                                     " even if their fingerprint didn't change",
+                                         default=False)
+
     #
     # DEFINITIONS: SUPPORT FUNCTIONS
     @staticmethod
@@ -86,92 +399,108 @@ class SetupMBLabCharacter(bpy.types.Operator):
         return False
 
     def execute(self, context):
-        from yallah import YALLAH_FEATURES_DIR
-
         mesh_obj = bpy.context.active_object
         assert mesh_obj.type == 'MESH'
 
-        arm_obj = mesh_obj.parent
-        if arm_obj is None:
-            self.report({'ERROR'}, "Character Mesh must have a parent Armature")
+        error = character_setup_error(mesh_obj=mesh_obj)
+        if error is not None:
+            self.report({'ERROR'}, error)
             return {'CANCELLED'}
 
-        if arm_obj.type != 'ARMATURE':
-            self.report({'ERROR'}, "Character Mesh parent object {} must be Armature".format(arm_obj.name))
+        trace = SetupTrace(name=mesh_obj.name)
+        try:
+            result, = setup_characters(mesh_objs=[mesh_obj], selected=split_names(self.features) or None,
+                                       skipped=split_names(self.skip_features), force_update=self.force_update,
+                                       trace=trace)
+        except Exception as e:
+            self.report({'ERROR'}, str(e))
             return {'CANCELLED'}
 
-        assert arm_obj.type == 'ARMATURE'
+        if result["status"] == "up-to-date":
+            self.report({'INFO'}, "Character {} is up to date.".format(mesh_obj.name))
+            return {'FINISHED'}
+
+        print(trace.summary())
+        if self.trace_filename != "":
+            trace.save(bpy.path.abspath(self.trace_filename))
 
-        char_name = character_prefix(mesh_obj=mesh_obj)
-        if char_name is None:
-            self.report({'ERROR'}, "Character not properly named (should be, for example: 'Anna_body')."
-                                   " Please, use the MBLab prefix during finalization.")
+        if result["status"] == "error":
+            self.report({'ERROR'}, "Setup of {} failed: {}".format(mesh_obj.name, result["error"]))
             return {'CANCELLED'}
 
-        #
-        # A TEST TO CHECK FOR WORKING DIRECTORIES AND PATHS
-        # This is harmless and can be used as template to develop new functionalities
-        #
-        filepath = os.path.join(YALLAH_FEATURES_DIR, "Test/Setup.py")
-        exec(compile(open(filepath).read(), filepath, 'exec'))
+        return {'FINISHED'}
 
-        #
-        # VIEW MODE TO REAL-TIME RENDERING
-        #
-        for area in bpy.context.screen.areas:
-            if area.type == 'VIEW_3D':
-                for space in area.spaces:
-                    if space.type == 'VIEW_3D':
-                        space.shading.type = 'SOLID'
 
-        #
-        # CREATE THE VISEMES FOR TTS
-        #
-        filepath = os.path.join(YALLAH_FEATURES_DIR, "MaryTTS/Setup.py")
-        exec(compile(open(filepath).read(), filepath, 'exec'))
+class SetupMBLabCharacters(bpy.types.Operator):
+    """Setup all the selected MB-Lab characters (or all those not set up yet) in one pass."""
+    bl_idname = "mbast_tools.setup_mblab_characters"
+    bl_label = "MBLab Tools - Setup MBLab Characters"
+    bl_options = {'REGISTER', 'INTERNAL', 'UNDO'}
 
-        #
-        # CREATE THE Facial Expressions(FE)
-        #
-        filepath = os.path.join(YALLAH_FEATURES_DIR, "FacialExpressions/Setup.py")
-        exec(compile(open(filepath).read(), filepath, 'exec'))
+    only_selected: bpy.props.BoolProperty(name="Only Selected",
+                                          description="If True, setup (or update) the selected MBLab characters."
+                                                      " Otherwise, all the MBLab characters of the scene"
+                                                      " not set up yet",
+                                          default=True)
 
-        #
-        # CREATE THE BONES NEEDED FOR EYEGAZE CONTROL
-        #
-        filepath = os.path.join(YALLAH_FEATURES_DIR, "EyeGaze/Setup.py")
-        exec(compile(open(filepath).read(), filepath, 'exec'))
+    features: bpy.props.StringProperty(name="Features",
+                                       description="Comma-separated list of the features to apply"
+                                                   " (dependencies are added automatically). If empty, all features",
+                                       default="")
 
-        SetupMBLabCharacter.clear_selection(mesh_obj=mesh_obj)
+    skip_features: bpy.props.StringProperty(name="Skip Features",
+                                            description="Comma-separated list of the features not to apply",
+                                            default="")
 
-        #
-        # CREATE THE BONES NEEDED FOR DYNAMIC CAMERA FRAMING
-        #
-        filepath = os.path.join(YALLAH_FEATURES_DIR, "Camera/Setup.py")
-        exec(compile(open(filepath).read(), filepath, 'exec'))
+    trace_filename: bpy.props.StringProperty(name="Trace File",
+                                             description="If set, the timings of the setup stages are saved"
+                                                         " in this file, in Chrome trace (JSON) format",
+                                             subtype="FILE_PATH",
+                                             default="")
 
-        SetupMBLabCharacter.clear_selection(mesh_obj=mesh_obj)
+    force_update: bpy.props.BoolProperty(name="Force Update",
+                                         description="On already set up characters, apply the features again"
+                                                     " even if their fingerprint didn't change",
+                                         default=False)
 
-        #
-        # FIX MATERIALS AND REMOVE THE SURFACE SUBDIVISION MODIFIER
-        #
-        filepath = os.path.join(YALLAH_FEATURES_DIR, "RealTimeRequirements/Setup.py")
-        exec(compile(open(filepath).read(), filepath, 'exec'))
+    @classmethod
+    def poll(cls, context):
+        return context.mode == 'OBJECT'
 
-        SetupMBLabCharacter.clear_selection(mesh_obj=mesh_obj)
+    def execute(self, context):
+        if self.only_selected:
+            mesh_objs = [obj for obj in context.selected_objects if obj.type == 'MESH' and is_mblab_body(mesh_obj=obj)]
+        else:
+            mesh_objs = [obj for obj in context.scene.objects
+                         if obj.type == 'MESH' and is_mblab_body(mesh_obj=obj) and not obj.yallah_setup_done]
+
+        if len(mesh_objs) == 0:
+            self.report({'WARNING'}, "No MBLab characters to setup.")
+            return {'CANCELLED'}
 
-        #
-        # CREATE A REFERENCE A-Pose, with object transform and all bones reset to identity.
-        #
-        bpy.context.view_layer.objects.active = arm_obj
-        bpy.ops.yallah.create_apose_action()
+        trace = SetupTrace(name="{} characters".format(len(mesh_objs)))
+        try:
+            results = setup_characters(mesh_objs=mesh_objs, selected=split_names(self.features) or None,
+                                       skipped=split_names(self.skip_features), force_update=self.force_update,
+                                       trace=trace)
+        except Exception as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
 
-        SetupMBLabCharacter.clear_selection(mesh_obj=mesh_obj)
+        print(trace.summary())
+        if self.trace_filename != "":
+            trace.save(bpy.path.abspath(self.trace_filename))
 
-        #
-        # MARK THE SETUP AS DONE
-        #
-        mesh_obj.yallah_setup_done = True
+        for result in results:
+            print("{:<32} {:<10} {:7.2f}s {}".format(result["mesh"], result["status"], result["seconds"],
+                                                     result.get("error", ", ".join(result["features"]))))
+            if result["status"] == "error":
+                self.report({'WARNING'}, "Setup of {} failed: {}".format(result["mesh"], result["error"]))
+
+        n_ok = sum(1 for r in results if r["status"] == "ok")
+        n_up_to_date = sum(1 for r in results if r["status"] == "up-to-date")
+        n_error = sum(1 for r in results if r["status"] == "error")
+        self.report({'INFO'}, "Characters: {} set up, {} up to date, {} failed.".format(n_ok, n_up_to_date, n_error))
 
         return {'FINISHED'}
 
@@ -193,6 +522,27 @@ def list_bones_recursive(b: bpy.types.PoseBone, include_root: bool = True) -> Li
     return out
 
 
+class CheckSetupUpdates(bpy.types.Operator):
+    """Check which features of the set up character changed (code version or data files) since its setup."""
+    bl_idname = "mblab_tools.check_setup_updates"
+    bl_label = "MBLab Tools - Check for setup updates"
+
+    @classmethod
+    def poll(cls, context):
+        obj = context.active_object
+        return obj is not None and obj.type == 'MESH' and obj.yallah_setup_done
+
+    def execute(self, context):
+        outdated, error = check_setup_updates(mesh_obj=context.active_object)
+        if error is not None:
+            self.report({'ERROR'}, error)
+            return {'CANCELLED'}
+
+        self.report({'INFO'}, "Outdated features: " + (", ".join(outdated) if len(outdated) > 0 else "none"))
+
+        return {'FINISHED'}
+
+
 class RemoveAnimationFromFingers(bpy.types.Operator):
     """Remove all animation curves from the hands of a MBLab character"""
     bl_idname = "mblab_tools.remove_finger_animation"
@@ -217,7 +567,7 @@ class RemoveAnimationFromFingers(bpy.types.Operator):
         return False
 
     def execute(self, context):
-        import re
+        from .anim_utils import remove_bone_curves
 
         # Active Armature
         arm_obj = context.active_object  # type: bpy.types.Object
@@ -248,25 +598,7 @@ class RemoveAnimationFromFingers(bpy.types.Operator):
 
         #
         # Really remove the animation curves
-        # All the bone names in a quick-access set.
-        bone_name_set = set(bone_names)
-        curves_to_remove = []  # type: List[bpy.types.FCurve]
-        # Prepare a regular expression to extract the name of the bone from the data_path
-        bone_match_re = re.compile('^pose\.bones\["(.+)"\]\..*')
-        for fcurve in act.fcurves:  # type: bpy.types.FCurve
-            # print("Curve "+fcurve.data_path)
-
-            match_res = bone_match_re.match(fcurve.data_path)
-            if match_res is not None:
-                data_path_bone = match_res.group(1)
-                # print("Matched Bone: " + data_path_bone)
-
-                if data_path_bone in bone_name_set:
-                    curves_to_remove.append(fcurve)
-
-        for fc in curves_to_remove:
-            # print("Removing" + fc.data_path)
-            act.fcurves.remove(fc)
+        remove_bone_curves(action=act, bone_names=set(bone_names))
 
         print("Number of curves after removal: {}".format(len(act.fcurves)))
 
@@ -298,35 +630,39 @@ class SetRelaxedPoseToFingers(bpy.types.Operator):
 
     def execute(self, context):
 
-        import json
-        from mathutils import Quaternion
-
         from yallah import YALLAH_DATA_DIR
+        from .action_data_io import load_action_file
+        from .anim_utils import invalidate_action_caches
 
         arm = context.active_object  # type: bpy.types.Object
         assert arm.type == 'ARMATURE'
+        act = arm.animation_data.action
 
-        with open(os.path.join(YALLAH_DATA_DIR, RELAXED_FINGER_ANIM), 'r') as relaxed_finger_anim_file:
-            relaxed_finger_anim = json.load(fp=relaxed_finger_anim_file)
-
-        if type(relaxed_finger_anim) != dict:
-            self.report({'ERROR'}, "File '{}' should contain a dictionary at top level".format(RELAXED_FINGER_ANIM))
+        try:
+            relaxed_finger_anim = load_action_file(os.path.join(YALLAH_DATA_DIR, RELAXED_FINGER_ANIM),
+                                                   single_action_name="relaxed_fingers")
+        except Exception as e:
+            self.report({'ERROR'}, str(e))
             return {'CANCELLED'}
 
-        for data_path in relaxed_finger_anim.keys():  # type: str
-            if data_path.endswith('rotation_quaternion'):
-                quat = arm.path_resolve(data_path)  # type: Quaternion
-                data_path_indices = relaxed_finger_anim[data_path]
-                # For each of the 4 quaternion components, set its value in the current pose.
-                for idx in range(4):
-                    data = data_path_indices[str(idx)]
-                    kf0 = data[0]
-                    # t = kf0[0]  # this is the timestamp
-                    v = kf0[1]  # this is the value of the quaternion element
-                    # Really set the value for the quaternion
-                    quat[idx] = v
-
-                arm.keyframe_insert(data_path=data_path, frame=1, group="fingers")
+        co = relaxed_finger_anim["co"]
+        for data_path, array_index, _, start, _ in relaxed_finger_anim.curves(0):
+            if not data_path.endswith('rotation_quaternion'):
+                continue
+
+            # t = co[start][0]  # this is the timestamp
+            v = float(co[start][1])  # this is the value of the quaternion element
+            # Really set the value for the quaternion, in the current pose
+            arm.path_resolve(data_path)[array_index] = v
+
+            # Insert the keyframe without recalculating the curve, which is updated once at the end.
+            fc = act.fcurves.find(data_path, index=array_index)
+            if fc is None:
+                fc = act.fcurves.new(data_path, index=array_index, action_group="fingers")
+            fc.keyframe_points.insert(frame=1, value=v, options={'FAST'})
+            fc.update()
+
+        invalidate_action_caches(act)
 
         return {'FINISHED'}
 
@@ -380,7 +716,18 @@ def register():
                                description="When true, the character has already undergone the YALLAH Setup process",
                                default=False)
 
+    # The fingerprints of the applied features, as JSON dictionary {feature_name: fingerprint}.
+    bpy.types.Object.yallah_feature_fingerprints =\
+        bpy.props.StringProperty(name="yallah_feature_fingerprints",
+                                 description="The fingerprints of the YALLAH features applied to the character",
+                                 default="")
+
+    # The feature modules are imported at the first setup (or check for updates)
+    features.register_builtin_features(lazy=True)
+
     bpy.utils.register_class(SetupMBLabCharacter)
+    bpy.utils.register_class(SetupMBLabCharacters)
+    bpy.utils.register_class(CheckSetupUpdates)
     bpy.utils.register_class(RemoveAnimationFromFingers)
     bpy.utils.register_class(SetRelaxedPoseToFingers)
     bpy.utils.register_class(ResetCharacterPose)
@@ -388,11 +735,16 @@ def register():
 
 def unregister():
     bpy.utils.unregister_class(SetupMBLabCharacter)
+    bpy.utils.unregister_class(SetupMBLabCharacters)
+    bpy.utils.unregister_class(CheckSetupUpdates)
     bpy.utils.unregister_class(RemoveAnimationFromFingers)
     bpy.utils.unregister_class(SetRelaxedPoseToFingers)
     bpy.utils.unregister_class(ResetCharacterPose)
 
     del bpy.types.Object.yallah_setup_done
+    del bpy.types.Object.yallah_feature_fingerprints
+
+    _SETUP_UPDATES_CACHE.clear()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,192 @@
+import bpy
+
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+from typing import Dict
+from typing import List
+
+# Topology facts (vertex adjacency, connected islands) of the MBLab base meshes.
+# They depend only on the edges of the mesh, which are the same for all the characters finalized from the same base.
+# Hence, they are computed once, kept in memory, and persisted in a cache directory, keyed by a hash of the topology.
+
+# The launch scripts point TEMP to the BlenderTemp directory.
+YALLAH_CACHE_DIR = os.environ.get("YALLAH_CACHE_DIR", os.path.join(tempfile.gettempdir(), "yallah_cache"))
+
+
+class MeshTopology:
+    """Vertex adjacency (CSR) and connected islands of a mesh.
+
+    * The neighbours of vertex v are adjacency[adjacency_offsets[v]:adjacency_offsets[v+1]]
+    * island_labels[v] is the island of vertex v. Islands are numbered from 0 to n_islands-1.
+    * The vertices of island i are island_vertices_order[island_offsets[i]:island_offsets[i+1]]
+    """
+
+    def __init__(self, topology_hash: str, adjacency_offsets: np.ndarray, adjacency: np.ndarray,
+                 island_labels: np.ndarray, island_offsets: np.ndarray, island_vertices_order: np.ndarray):
+        self.topology_hash = topology_hash
+        self.adjacency_offsets = adjacency_offsets
+        self.adjacency = adjacency
+        self.island_labels = island_labels
+        self.island_offsets = island_offsets
+        self.island_vertices_order = island_vertices_order
+
+    @property
+    def n_vertices(self) -> int:
+        return len(self.island_labels)
+
+    @property
+    def n_islands(self) -> int:
+        return len(self.island_offsets) - 1
+
+    def neighbours(self, vertex_index: int) -> np.ndarray:
+        return self.adjacency[self.adjacency_offsets[vertex_index]:self.adjacency_offsets[vertex_index + 1]]
+
+    def island_of(self, vertex_index: int) -> int:
+        return int(self.island_labels[vertex_index])
+
+    def island_vertices(self, island: int) -> np.ndarray:
+        return self.island_vertices_order[self.island_offsets[island]:self.island_offsets[island + 1]]
+
+    def linked_vertices(self, seed_indices: List[int]) -> np.ndarray:
+        """The sorted indices of all the vertices in the islands of the seeds.
+        Like bpy.ops.mesh.select_linked(delimit=set()): islands are made of vertices linked by edges."""
+        islands = np.unique(self.island_labels[seed_indices])
+        return np.sort(np.concatenate([self.island_vertices(i) for i in islands]))
+
+    def island_bounding_boxes(self, mesh: bpy.types.Mesh) -> np.ndarray:
+        """The bounding boxes of the islands, for the current vertex coordinates of the mesh.
+        Coordinates change among characters, so they are not cached.
+
+        :return: An array of shape (n_islands, 2, 3), with the min and max corners of each island.
+        """
+
+        co = np.empty(self.n_vertices * 3, dtype=np.float32)
+        mesh.vertices.foreach_get("co", co)
+        co = co.reshape(-1, 3)[self.island_vertices_order]
+
+        starts = self.island_offsets[:-1]
+        return np.stack((np.minimum.reduceat(co, starts, axis=0), np.maximum.reduceat(co, starts, axis=0)), axis=1)
+
+    def save(self, filename: str) -> None:
+        np.savez(filename, adjacency_offsets=self.adjacency_offsets, adjacency=self.adjacency,
+                 island_labels=self.island_labels, island_offsets=self.island_offsets,
+                 island_vertices_order=self.island_vertices_order)
+
+    @staticmethod
+    def load(filename: str, topology_hash: str) -> 'MeshTopology':
+        with np.load(filename) as npz:
+            return MeshTopology(topology_hash=topology_hash, adjacency_offsets=npz["adjacency_offsets"],
+                                adjacency=npz["adjacency"], island_labels=npz["island_labels"],
+                                island_offsets=npz["island_offsets"],
+                                island_vertices_order=npz["island_vertices_order"])
+
+    @staticmethod
+    def build(topology_hash: str, n_vertices: int, edges: np.ndarray) -> 'MeshTopology':
+        """Build the topology from the (n_edges, 2) array of edge vertex indices."""
+
+        #
+        # CSR adjacency: each edge is stored in both directions, sorted by source vertex.
+        src = np.concatenate((edges[:, 0], edges[:, 1]))
+        dst = np.concatenate((edges[:, 1], edges[:, 0]))
+        order = np.argsort(src, kind='stable')
+        adjacency = dst[order].astype(np.int32)
+        adjacency_offsets = np.zeros(n_vertices + 1, dtype=np.int32)
+        np.cumsum(np.bincount(src, minlength=n_vertices), out=adjacency_offsets[1:])
+
+        #
+        # Islands: propagate the minimum vertex index over the edges, with pointer jumping, until stable.
+        labels = np.arange(n_vertices, dtype=np.int32)
+        e0, e1 = edges[:, 0], edges[:, 1]
+        while True:
+            edge_min = np.minimum(labels[e0], labels[e1])
+            new_labels = labels.copy()
+            np.minimum.at(new_labels, e0, edge_min)
+            np.minimum.at(new_labels, e1, edge_min)
+            new_labels = new_labels[new_labels]
+            if np.array_equal(new_labels, labels):
+                break
+            labels = new_labels
+
+        # Renumber the islands as 0..n_islands-1
+        _, island_labels = np.unique(labels, return_inverse=True)
+        island_labels = island_labels.astype(np.int32)
+        island_vertices_order = np.argsort(island_labels, kind='stable').astype(np.int32)
+        island_offsets = np.zeros(island_labels.max(initial=-1) + 2, dtype=np.int32)
+        np.cumsum(np.bincount(island_labels), out=island_offsets[1:])
+
+        return MeshTopology(topology_hash=topology_hash, adjacency_offsets=adjacency_offsets, adjacency=adjacency,
+                            island_labels=island_labels, island_offsets=island_offsets,
+                            island_vertices_order=island_vertices_order)
+
+
+# The topologies already built or loaded in this session, by hash.
+_TOPOLOGY_CACHE = {}  # type: Dict[str, MeshTopology]
+
+
+def read_mesh_edges(mesh: bpy.types.Mesh, delimit_seams: bool = False) -> np.ndarray:
+    """The (n_edges, 2) array of edge vertex indices. With delimit_seams, seam edges are left out."""
+
+    n_edges = len(mesh.edges)
+    edges = np.empty(n_edges * 2, dtype=np.int32)
+    mesh.edges.foreach_get("vertices", edges)
+    edges = edges.reshape(n_edges, 2)
+
+    if delimit_seams:
+        seams = np.empty(n_edges, dtype=bool)
+        mesh.edges.foreach_get("use_seam", seams)
+        edges = edges[~seams]
+
+    return edges
+
+
+def topology_hash(n_vertices: int, edges: np.ndarray) -> str:
+    h = hashlib.sha1()
+    h.update(np.int64(n_vertices).tobytes())
+    h.update(np.ascontiguousarray(edges, dtype=np.int32).tobytes())
+    return h.hexdigest()
+
+
+def get_mesh_topology(mesh: bpy.types.Mesh, delimit_seams: bool = False) -> MeshTopology:
+    """Get the topology of a mesh: from memory, from the cache directory, or building it.
+
+    :param mesh: The mesh.
+    :param delimit_seams: If True, seam edges are left out of the vertex graph.
+     This is not the same as the seam delimit of bpy.ops.mesh.select_linked(), which walks faces across
+     non-seam edges: here, the vertices on a seam still link both sides through their other edges.
+    """
+
+    n_vertices = len(mesh.vertices)
+    edges = read_mesh_edges(mesh=mesh, delimit_seams=delimit_seams)
+    t_hash = topology_hash(n_vertices=n_vertices, edges=edges)
+
+    topology = _TOPOLOGY_CACHE.get(t_hash)
+    if topology is not None:
+        return topology
+
+    cache_filename = os.path.join(YALLAH_CACHE_DIR, "topology-{}.npz".format(t_hash))
+    if os.path.exists(cache_filename):
+        try:
+            topology = MeshTopology.load(cache_filename, topology_hash=t_hash)
+        except Exception as e:
+            print("Could not load topology cache '{}': {}".format(cache_filename, e))
+
+    if topology is None:
+        topology = MeshTopology.build(topology_hash=t_hash, n_vertices=n_vertices, edges=edges)
+        try:
+            os.makedirs(YALLAH_CACHE_DIR, exist_ok=True)
+            topology.save(cache_filename)
+        except OSError as e:
+            print("Could not save topology cache '{}': {}".format(cache_filename, e))
+
+    _TOPOLOGY_CACHE[t_hash] = topology
+
+    return topology
+
+
+def clear_mesh_topology_cache() -> None:
+    """Clear the in-memory cache. Files in the cache directory are left untouched."""
+    _TOPOLOGY_CACHE.clear()
@@ -0,0 +1,344 @@
+# Rotation offsets of the bones, to match animations (e.g., downloaded from Mixamo) with a YALLAH skeleton.
+#
+# An offsets database maps a bone name to the quaternion (w, x, y, z) to pre-multiply to its rotation,
+# in bone local space. Offsets are applied to all the keyframes of the rotation_quaternion curves of the bone,
+# as batched quaternion products.
+#
+# Originally developed as the script BlenderScenes/Scripts/OffsetMixamoAnimationCurves.py (Blender 2.79).
+#
+# The built-in databases were tuned by hand. For a new animation source, generate a database from the rest poses
+# of the source and target armatures (GenerateRotationOffsets), then apply it (ApplyRotationOffsets offsets_filename).
+
+import bpy
+
+import math
+
+import numpy as np
+
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from .anim_utils import FCurveIndex
+from .anim_utils import invalidate_action_caches
+
+QUATERNION_CHANNELS = 4
+
+# The maximum angle (degrees) between the arms and the horizontal plane, for a rest pose to be a T-pose.
+T_POSE_MAX_ARM_ELEVATION = 15.0
+
+AXES = {"X": (1.0, 0.0, 0.0), "Y": (0.0, 1.0, 0.0), "Z": (0.0, 0.0, 1.0)}
+
+# The offsets needed to align the bones with the reference skeleton downloaded from Mixamo,
+# as sequences of (axis, degrees) rotations, multiplied left to right (i.e., the rightmost is applied first).
+# Hence, when manually looking for the rotation value, first adjust bones closer to the root.
+OFFSETS_TPOSE = {
+    "thigh_L": [("Z", 1.8)],
+    # upperarm_L x +4.80 deg, upperarm_L z +3.80 deg
+    # Order: Z * Y * X
+    "upperarm_L": [("Z", 3.80), ("X", 4.80)],
+    "lowerarm_L": [("Z", -3.80), ("X", -14.50)],
+
+    "thigh_R": [("Z", -1.8)],
+    "upperarm_R": [("Z", -3.80), ("X", 4.80)],
+    "lowerarm_R": [("Z", 3.80), ("X", -14.50)],
+}  # type: Dict[str, List[Tuple[str, float]]]
+
+OFFSETS_APOSE = {
+    "thigh_L": [("Z", -6.30)],
+    "clavicle_L": [("Z", 6.0)],
+    "upperarm_L": [("Z", 24.0), ("X", 6.0)],
+    "lowerarm_L": [("Z", -3.80), ("X", -14.50)],
+
+    "thigh_R": [("Z", 6.30)],
+    "clavicle_R": [("Z", -6.0)],
+    "upperarm_R": [("Z", -24.0), ("X", 6.0)],
+    "lowerarm_R": [("Z", 3.80), ("X", -14.50)],
+}  # type: Dict[str, List[Tuple[str, float]]]
+
+
+#
+# Quaternion math, on (..., 4) arrays of (w, x, y, z)
+#
+
+def quat_from_axis_angle(axis: Tuple[float, float, float], angle: float) -> np.ndarray:
+    half = angle / 2
+    return np.concatenate(([math.cos(half)], np.asarray(axis, dtype=np.float64) * math.sin(half)))
+
+
+def quat_multiply(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """The Hamilton products a * b, broadcasting over the leading dimensions."""
+
+    aw, ax, ay, az = np.moveaxis(np.asarray(a, dtype=np.float64), -1, 0)
+    bw, bx, by, bz = np.moveaxis(np.asarray(b, dtype=np.float64), -1, 0)
+
+    return np.stack((aw * bw - ax * bx - ay * by - az * bz,
+                     aw * bx + ax * bw + ay * bz - az * by,
+                     aw * by - ax * bz + ay * bw + az * bx,
+                     aw * bz + ax * by - ay * bx + az * bw), axis=-1)
+
+
+def quat_from_matrices(m: np.ndarray) -> np.ndarray:
+    """The (n, 4) quaternions of the (n, 3, 3) rotation matrices, with w >= 0."""
+
+    m = np.asarray(m, dtype=np.float64)
+    trace = m[:, 0, 0] + m[:, 1, 1] + m[:, 2, 2]
+
+    # For each matrix, compute the quaternion from the largest of w, x, y, z, for numerical stability
+    candidates = np.stack((trace, m[:, 0, 0], m[:, 1, 1], m[:, 2, 2]), axis=1)
+    case = np.argmax(candidates, axis=1)
+
+    q = np.empty((len(m), 4), dtype=np.float64)
+
+    c = case == 0
+    r = np.sqrt(1.0 + trace[c]) * 2
+    q[c] = np.stack((r / 4, (m[c, 2, 1] - m[c, 1, 2]) / r, (m[c, 0, 2] - m[c, 2, 0]) / r,
+                     (m[c, 1, 0] - m[c, 0, 1]) / r), axis=1)
+
+    c = case == 1
+    r = np.sqrt(1.0 + m[c, 0, 0] - m[c, 1, 1] - m[c, 2, 2]) * 2
+    q[c] = np.stack(((m[c, 2, 1] - m[c, 1, 2]) / r, r / 4, (m[c, 0, 1] + m[c, 1, 0]) / r,
+                     (m[c, 0, 2] + m[c, 2, 0]) / r), axis=1)
+
+    c = case == 2
+    r = np.sqrt(1.0 + m[c, 1, 1] - m[c, 0, 0] - m[c, 2, 2]) * 2
+    q[c] = np.stack(((m[c, 0, 2] - m[c, 2, 0]) / r, (m[c, 0, 1] + m[c, 1, 0]) / r, r / 4,
+                     (m[c, 1, 2] + m[c, 2, 1]) / r), axis=1)
+
+    c = case == 3
+    r = np.sqrt(1.0 + m[c, 2, 2] - m[c, 0, 0] - m[c, 1, 1]) * 2
+    q[c] = np.stack(((m[c, 1, 0] - m[c, 0, 1]) / r, (m[c, 0, 2] + m[c, 2, 0]) / r, (m[c, 1, 2] + m[c, 2, 1]) / r,
+                     r / 4), axis=1)
+
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+    q[q[:, 0] < 0] *= -1
+
+    return q
+
+
+def quat_angles(q: np.ndarray) -> np.ndarray:
+    """The rotation angles (radians) of the (n, 4) unit quaternions."""
+    return 2 * np.arccos(np.clip(np.abs(q[:, 0]), 0.0, 1.0))
+
+
+def offsets_from_rotations(rotations: Dict[str, List[Tuple[str, float]]]) -> Dict[str, np.ndarray]:
+    """Compose the (axis, degrees) sequences into one quaternion per bone."""
+
+    out = {}
+    for bone_name, sequence in rotations.items():
+        q = np.array([1.0, 0.0, 0.0, 0.0])
+        for axis, degrees in sequence:
+            q = quat_multiply(q, quat_from_axis_angle(AXES[axis], math.radians(degrees)))
+        out[bone_name] = q
+
+    return out
+
+
+def is_t_pose(arm_obj: bpy.types.Object) -> bool:
+    """
+    @param arm_obj: The object of type ARMATURE
+    @return: True if the armature was finalized in T-position, false otherwise (A-position)
+    """
+
+    #
+    # The test checks the elevation of the arm (from the upper arm head to the lower arm tail) over the horizontal.
+    # Being an angle, it doesn't depend on the size of the character.
+    # female, A-pose: ~30 degrees
+    # female, T-pose: ~2 degrees
+    #
+    shoulder_pos = arm_obj.pose.bones['upperarm_L'].bone.head_local
+    wrist_pos = arm_obj.pose.bones['lowerarm_L'].bone.tail_local
+
+    arm_vector = shoulder_pos - wrist_pos
+    elevation = math.degrees(math.asin(min(1.0, abs(arm_vector.z) / arm_vector.length)))
+
+    return elevation < T_POSE_MAX_ARM_ELEVATION
+
+
+def builtin_offsets(arm_obj: bpy.types.Object) -> Dict[str, np.ndarray]:
+    """The offsets database for the rest pose (T or A) of the armature."""
+    return offsets_from_rotations(OFFSETS_TPOSE if is_t_pose(arm_obj) else OFFSETS_APOSE)
+
+
+#
+# Keyframes reading and writing
+#
+
+def read_keyframe_co(fc: bpy.types.FCurve) -> np.ndarray:
+    """The (n, 2) times and values of the keyframes of a curve."""
+    co = np.empty(len(fc.keyframe_points) * 2, dtype=np.float32)
+    fc.keyframe_points.foreach_get("co", co)
+    return co.reshape(-1, 2)
+
+
+def read_quaternion_channels(channels: List[bpy.types.FCurve]) -> Tuple[np.ndarray, np.ndarray, bool]:
+    """Read the 4 curves of a rotation_quaternion in bulk.
+    If the keyframes of the channels are not aligned, all the channels are sampled at the union of their times.
+
+    :return: The (n,) times, the (n, 4) quaternions, and whether the channels were resampled.
+    """
+
+    cos = [read_keyframe_co(fc) for fc in channels]
+
+    aligned = all(len(co) == len(cos[0]) and np.array_equal(co[:, 0], cos[0][:, 0]) for co in cos[1:])
+    if aligned:
+        return cos[0][:, 0].astype(np.float64), np.stack([co[:, 1] for co in cos], axis=1).astype(np.float64), False
+
+    times = np.unique(np.concatenate([co[:, 0] for co in cos]))
+    quats = np.empty((len(times), QUATERNION_CHANNELS), dtype=np.float64)
+    for c, (fc, co) in enumerate(zip(channels, cos)):
+        # Keep the exact values where the channel has a keyframe, evaluate the curve elsewhere
+        positions = np.searchsorted(co[:, 0], times)
+        has_key = (positions < len(co)) & (co[np.minimum(positions, len(co) - 1), 0] == times)
+        quats[has_key, c] = co[positions[has_key], 1]
+        quats[~has_key, c] = [fc.evaluate(t) for t in times[~has_key]]
+
+    return times.astype(np.float64), quats, True
+
+
+def write_quaternion_channels(channels: List[bpy.types.FCurve], times: np.ndarray, quats: np.ndarray) -> None:
+    """Write the quaternions into the 4 curves, with one foreach_set and one update() per curve.
+    Curves with fewer keyframes than times (because of the resampling) get the missing ones appended."""
+
+    for c, fc in enumerate(channels):
+        kfps = fc.keyframe_points
+        n_missing = len(times) - len(kfps)
+        if n_missing > 0:
+            kfps.add(n_missing)
+
+        co = np.stack((times, quats[:, c]), axis=1).astype(np.float32).ravel()
+        kfps.foreach_set("co", co)
+        if n_missing > 0:
+            # The keyframes moved: start the handles on the points and let update() compute them
+            kfps.foreach_set("handle_left", co)
+            kfps.foreach_set("handle_right", co)
+
+        fc.update()
+
+
+def apply_rotation_offsets(action: bpy.types.Action, offsets: Dict[str, np.ndarray],
+                           index: Optional[FCurveIndex] = None) -> Tuple[int, int, List[str]]:
+    """Pre-multiply the offsets to the rotation_quaternion keyframes of the bones in the action.
+
+    :param index: The F-Curve index of the action, if already built in this operator call.
+    :return: The number of offset bones, of resampled bones, and the warnings (e.g., bones with missing channels).
+    """
+    if index is None:
+        index = FCurveIndex(action)
+
+    n_bones = 0
+    n_resampled = 0
+    warnings = []
+    for bone_name, offset in offsets.items():
+        channels = index.find_channels(bone_name, "rotation_quaternion", QUATERNION_CHANNELS)
+        if all(fc is None for fc in channels):
+            continue
+        if any(fc is None for fc in channels):
+            warnings.append("Action '{}', bone '{}': missing rotation_quaternion channels {}. Skipped.".format(
+                action.name, bone_name, [c for c, fc in enumerate(channels) if fc is None]))
+            continue
+
+        times, quats, resampled = read_quaternion_channels(channels)
+        write_quaternion_channels(channels, times, quat_multiply(offset, quats))
+
+        n_bones += 1
+        n_resampled += int(resampled)
+
+    invalidate_action_caches(action)
+
+    return n_bones, n_resampled, warnings
+
+
+#
+# Offsets database generation
+#
+# The pose of a bone is applied on top of its rest rotation relative to the parent (parent.matrix_local^-1 @
+# bone.matrix_local, or the object rotation @ bone.matrix_local for the root bones). For a bone to have the same
+# orientation on the target as on the source, given that their parents do, the target rotation must be:
+#   q_target = R_target^-1 @ R_source @ q_source
+# where R are the relative rest rotations. Hence, the offset is R_target^-1 @ R_source.
+# This assumes that the mapped bones have the same axes conventions (e.g., Y along the bone) in both skeletons.
+#
+
+def relative_rest_rotations(arm_obj: bpy.types.Object) -> Tuple[List[str], np.ndarray]:
+    """The rest rotation of each bone relative to its parent (to the world for the root bones).
+
+    :return: The bone names and the (n, 3, 3) rotation matrices, in the order of armature.bones.
+    """
+
+    bones = arm_obj.data.bones
+    n = len(bones)
+    names = [b.name for b in bones]
+    name_indices = {name: i for i, name in enumerate(names)}
+    parents = np.array([name_indices[b.parent.name] if b.parent is not None else -1 for b in bones], dtype=np.int64)
+
+    # Matrices are read column-major
+    buf = np.empty(n * 16, dtype=np.float32)
+    bones.foreach_get("matrix_local", buf)
+    local = buf.reshape(n, 4, 4).transpose(0, 2, 1)[:, :3, :3].astype(np.float64)
+    local /= np.linalg.norm(local, axis=1, keepdims=True)
+
+    object_rotation = np.array(arm_obj.matrix_world.to_3x3().normalized(), dtype=np.float64)
+
+    # relative = parent^T @ local: for the root bones, the "parent" is the inverse (transposed) object rotation
+    parent_rotations = np.where((parents >= 0)[:, None, None], local[np.maximum(parents, 0)], object_rotation.T)
+    relative = np.einsum('nji,njk->nik', parent_rotations, local)
+
+    return names, relative
+
+
+def generate_offsets(source_obj: bpy.types.Object, target_obj: bpy.types.Object,
+                     bone_map: Optional[Dict[str, str]] = None,
+                     min_angle: float = 0.0) -> Dict[str, np.ndarray]:
+    """Compute the offsets to apply to the animations of the source skeleton, to play them on the target one.
+
+    :param bone_map: {target_bone: source_bone}. If None, the bones with the same name in both armatures.
+    :param min_angle: Offsets smaller than this angle (degrees) are left out of the database.
+    :return: The offsets database, by target bone name.
+    """
+
+    source_names, source_rest = relative_rest_rotations(source_obj)
+    target_names, target_rest = relative_rest_rotations(target_obj)
+    source_indices = {name: i for i, name in enumerate(source_names)}
+    target_indices = {name: i for i, name in enumerate(target_names)}
+
+    if bone_map is None:
+        bone_map = {name: name for name in target_names if name in source_indices}
+
+    missing = [name for name in bone_map.keys() if name not in target_indices] + \
+              [name for name in bone_map.values() if name not in source_indices]
+    if len(missing) > 0:
+        raise Exception("Bones of the map not found in the armatures: {}".format(missing))
+
+    mapped_targets = list(bone_map.keys())
+    t_idx = np.array([target_indices[name] for name in mapped_targets], dtype=np.int64)
+    s_idx = np.array([source_indices[bone_map[name]] for name in mapped_targets], dtype=np.int64)
+
+    offsets = quat_from_matrices(np.einsum('nji,njk->nik', target_rest[t_idx], source_rest[s_idx]))
+    keep = quat_angles(offsets) >= math.radians(min_angle)
+
+    return {name: offsets[i] for i, name in enumerate(mapped_targets) if keep[i]}
+
+
+def save_offsets(filename: str, offsets: Dict[str, np.ndarray]) -> None:
+    """Write an offsets database as json {bone_name: [w, x, y, z], ...}, readable by offsets_for_armature()."""
+
+    import json
+
+    with open(filename, "w") as out_file:
+        json.dump(obj={name: [float(v) for v in q] for name, q in offsets.items()}, fp=out_file, indent=2)
+
+
+def offsets_for_armature(arm_obj: bpy.types.Object, filename: Optional[str] = None) -> Dict[str, np.ndarray]:
+    """The offsets of a database file, or the built-in ones if filename is None or empty."""
+
+    if filename is None or filename == "":
+        return builtin_offsets(arm_obj)
+
+    import json
+
+    with open(filename, "r") as in_file:
+        in_dict = json.load(fp=in_file)
+
+    return {bone_name: np.asarray(q, dtype=np.float64) for bone_name, q in in_dict.items()}
@@ -0,0 +1,134 @@
+import bpy
+
+import json
+import os
+import platform
+import time
+
+from contextlib import contextmanager
+from typing import Dict
+from typing import Optional
+
+# Structured trace of the SetupMBLabCharacter stages, saved in the Chrome trace event format
+# (it can be opened with chrome://tracing or https://ui.perfetto.dev, or diffed as plain JSON).
+# For each stage it records the wall time, the bpy.ops invocations (and in particular object.mode_set),
+# and the counts of the mesh and armature data before and after the stage.
+
+
+def object_counts(mesh_obj: bpy.types.Object, arm_obj: Optional[bpy.types.Object]) -> Dict[str, int]:
+    """The sizes of the character data, to spot what a stage added or removed."""
+
+    mesh = mesh_obj.data  # type: bpy.types.Mesh
+    out = {
+        "vertices": len(mesh.vertices),
+        "edges": len(mesh.edges),
+        "polygons": len(mesh.polygons),
+        "key_blocks": len(mesh.shape_keys.key_blocks) if mesh.shape_keys is not None else 0,
+        "vertex_groups": len(mesh_obj.vertex_groups),
+        "modifiers": len(mesh_obj.modifiers),
+    }
+    if arm_obj is not None:
+        out["bones"] = len(arm_obj.data.bones)
+
+    return out
+
+
+class SetupTrace:
+    """Collects the trace events of a setup. Use as:
+
+        trace = SetupTrace(name="Anna_body")
+        with trace.recording():
+            with trace.stage("MaryTTS", mesh_obj, arm_obj):
+                ...
+        trace.save("trace.json")
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.events = []
+        # Number of invocations per operator idname, since the beginning of the recording.
+        self.op_counts = {}  # type: Dict[str, int]
+        self._t0 = time.perf_counter()
+
+    def _now_us(self) -> float:
+        return (time.perf_counter() - self._t0) * 1e6
+
+    @contextmanager
+    def recording(self):
+        """Count all the bpy.ops invocations while active, by wrapping the operator call of the bpy.ops wrapper class."""
+
+        op_class = type(bpy.ops.object.mode_set)
+        original_call = op_class.__call__
+        op_counts = self.op_counts
+
+        def counting_call(op, *args, **kwargs):
+            idname = "{}.{}".format(getattr(op, "_module", "?"), getattr(op, "_func", "?"))
+            op_counts[idname] = op_counts.get(idname, 0) + 1
+            return original_call(op, *args, **kwargs)
+
+        op_class.__call__ = counting_call
+        try:
+            yield self
+        finally:
+            op_class.__call__ = original_call
+
+    @contextmanager
+    def stage(self, name: str, mesh_obj: bpy.types.Object, arm_obj: Optional[bpy.types.Object], tid: int = 0,
+              character: Optional[str] = None):
+        """Record one stage as a complete ('X') trace event.
+        tid is the trace thread, used to show the stages of different characters on separate lines.
+        character is the name shown for the stage (default: the mesh name), e.g., for stages spanning many characters.
+        """
+
+        counts_before = object_counts(mesh_obj=mesh_obj, arm_obj=arm_obj)
+        ops_before = dict(self.op_counts)
+        start_us = self._now_us()
+        try:
+            yield
+        finally:
+            dur_us = self._now_us() - start_us
+            ops = {k: v - ops_before.get(k, 0) for k, v in self.op_counts.items() if v != ops_before.get(k, 0)}
+            self.events.append({
+                "name": name,
+                "cat": "setup",
+                "ph": "X",
+                "ts": start_us,
+                "dur": dur_us,
+                "pid": os.getpid(),
+                "tid": tid,
+                "args": {
+                    "character": character if character is not None else mesh_obj.name,
+                    "n_ops": sum(ops.values()),
+                    "n_mode_set": ops.get("object.mode_set", 0),
+                    "ops": ops,
+                    "before": counts_before,
+                    "after": object_counts(mesh_obj=mesh_obj, arm_obj=arm_obj),
+                },
+            })
+
+    def to_dict(self) -> dict:
+        from yallah import YALLAH_VERSION
+
+        return {
+            "traceEvents": self.events,
+            "displayTimeUnit": "ms",
+            "otherData": {
+                "name": self.name,
+                "yallah_version": YALLAH_VERSION,
+                "blender_version": bpy.app.version_string,
+                "machine": platform.machine(),
+                "platform": platform.platform(),
+                "python": platform.python_version(),
+            },
+        }
+
+    def summary(self) -> str:
+        lines = ["Setup trace '{}':".format(self.name)]
+        for ev in self.events:
+            lines.append("  {:<24} {:<24} {:9.1f} ms  ops: {:4d}  mode_set: {:3d}".format(
+                ev["args"]["character"], ev["name"], ev["dur"] / 1000, ev["args"]["n_ops"], ev["args"]["n_mode_set"]))
+        return "\n".join(lines)
+
+    def save(self, filename: str) -> None:
+        with open(filename, "w") as out_file:
+            json.dump(obj=self.to_dict(), fp=out_file, indent=2)
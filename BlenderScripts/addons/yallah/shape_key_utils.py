@@ -1,12 +1,9 @@
 import bpy
 
-import json
+from typing import List
+from typing import Optional
 
 
-#
-#
-# ShapeKeys Generation
-
 class CreateShapeKeys(bpy.types.Operator):
     """Create new Shape Keys, using existing ones, as described in an external json file."""
     bl_idname = "object.create_shape_keys"
@@ -16,6 +13,11 @@ class CreateShapeKeys(bpy.types.Operator):
                                                   description="The json file with the description of the new ShapeKeys",
                                                   subtype="FILE_PATH")
 
+    use_vectorized: bpy.props.BoolProperty(name="Vectorized",
+                                           description="Compute all the new ShapeKeys at once with NumPy,"
+                                                       " instead of mixing them one-by-one",
+                                           default=True)
+
     @classmethod
     def poll(cls, context):
         obj = context.active_object
@@ -31,31 +33,42 @@ class CreateShapeKeys(bpy.types.Operator):
         # Check for the existence of all the required shapekeys
         obj = context.active_object
         mesh = obj.data
-        key_block_names = [kb.name for kb in mesh.shape_keys.key_blocks]
 
-        with open(self.shape_keys_filename, 'r') as keyshapes_file:
-            keyshapes_db = json.load(keyshapes_file)
+        from . shape_keys_db import can_mix_vectorized
+        from . shape_keys_db import load_shape_keys_db
+        from . shape_keys_db import mix_shape_keys
 
-        for viseme, db_entry in keyshapes_db.items():
-            for shape_key_name, weight in db_entry.items():
-                if shape_key_name not in key_block_names:
-                    self.report({'ERROR'}, "Object doesn't have a key_block named '{}'.".format(shape_key_name))
-                    return {'CANCELLED'}
+        db = load_shape_keys_db(self.shape_keys_filename)
+        keyshapes_db = db.entries
 
-        #
-        # Build the new visemes, one-by-one
-        for vis in keyshapes_db:
-            # First, reset the face shape
-            for kb in mesh.shape_keys.key_blocks:
-                kb.value = 0.0
-            # Set the values
-            viseme_spec_dict = keyshapes_db[vis]
-            for expression_name in viseme_spec_dict:
-                expression_val = viseme_spec_dict[expression_name]
-                mesh.shape_keys.key_blocks[expression_name].value = expression_val
-
-            # bpy.ops.object.shape_key_add(from_mix=True)
-            sk = obj.shape_key_add(name=vis, from_mix=True)
+        if db.resolve(mesh=mesh) is None:
+            self.report({'ERROR'}, "Object doesn't have a key_block named '{}'.".format(db.missing_key_blocks(mesh)[0]))
+            return {'CANCELLED'}
+
+        if self.use_vectorized and can_mix_vectorized(mesh=mesh, db=db):
+            #
+            # Build all the new visemes at once, without going through the Blender mix.
+            mixed_coords = mix_shape_keys(mesh=mesh, db=db)
+            for vis, coords in mixed_coords.items():
+                sk = obj.shape_key_add(name=vis, from_mix=False)
+                sk.data.foreach_set("co", coords)
+            mesh.update()
+
+        else:
+            #
+            # Build the new visemes, one-by-one
+            for vis in keyshapes_db:
+                # First, reset the face shape
+                for kb in mesh.shape_keys.key_blocks:
+                    kb.value = 0.0
+                # Set the values
+                viseme_spec_dict = keyshapes_db[vis]
+                for expression_name in viseme_spec_dict:
+                    expression_val = viseme_spec_dict[expression_name]
+                    mesh.shape_keys.key_blocks[expression_name].value = expression_val
+
+                # bpy.ops.object.shape_key_add(from_mix=True)
+                sk = obj.shape_key_add(name=vis, from_mix=True)
 
         # Reset back to 0. Just handy for further work.
         for kb in mesh.shape_keys.key_blocks:
@@ -64,8 +77,214 @@ class CreateShapeKeys(bpy.types.Operator):
         return {'FINISHED'}
 
 
+#
+#
+# ShapeKeys Removal
+
+# The key block properties restored after rebuilding the key stack. Slider limits before the value, to avoid clamping.
+KEY_BLOCK_PROPERTIES = ["slider_min", "slider_max", "value", "mute", "lock_shape", "vertex_group", "interpolation"]
+
+# The properties of the ShapeKeys datablock, of its animation data, and of its NLA tracks and strips,
+# restored after rebuilding the key stack.
+# Strip action range and scale/repeat before the other ones, since they define the strip frame range.
+KEY_PROPERTIES = ["use_relative", "eval_time"]
+KEY_ANIMATION_DATA_PROPERTIES = ["action_extrapolation", "action_blend_type", "action_influence"]
+NLA_TRACK_PROPERTIES = ["mute", "lock", "is_solo"]
+NLA_STRIP_PROPERTIES = ["action_frame_start", "action_frame_end", "scale", "repeat", "blend_type", "extrapolation",
+                        "blend_in", "blend_out", "use_auto_blend", "influence", "use_animated_influence",
+                        "mute", "use_reverse", "use_sync_length"]
+
+
+def select_key_blocks(key_block_names: List[str], db_names: Optional[List[str]], patterns: List[str]) -> List[str]:
+    """Select the key blocks to remove.
+
+    :param key_block_names: The names of all the key blocks of the mesh, the reference key first.
+     The reference key is never selected.
+    :param db_names: The new key names of a ShapeKeys database. Key blocks match also with a '.NNN' suffix.
+    :param patterns: glob patterns (e.g., 'phoneme_*') matched against the full key block names.
+    :return: The names of the matching key blocks, in stack order.
+    """
+    from fnmatch import fnmatchcase
+
+    db_names = set(db_names) if db_names is not None else set()
+
+    out = []
+    for kb_name in key_block_names[1:]:
+        dotpos = kb_name.find('.')
+        kb_nodot = kb_name[:dotpos] if dotpos != -1 else kb_name
+        if kb_nodot in db_names or any(fnmatchcase(kb_name, patt) for patt in patterns):
+            out.append(kb_name)
+
+    return out
+
+
+def _id_property_value(value):
+    """A copy of a custom property value that survives the deletion of its datablock."""
+
+    if hasattr(value, "to_dict"):
+        return value.to_dict()
+    elif hasattr(value, "to_list"):
+        return value.to_list()
+
+    return value
+
+
+def save_key_datablock(key: bpy.types.Key) -> dict:
+    """Save the name, properties, custom properties, and animation (action and NLA tracks) of a ShapeKeys datablock.
+    Drivers are not saved."""
+
+    saved = {prop: getattr(key, prop) for prop in KEY_PROPERTIES}
+    saved["name"] = key.name
+    saved["custom_properties"] = {k: _id_property_value(key[k]) for k in key.keys()}
+
+    anim_data = key.animation_data
+    if anim_data is not None:
+        saved["animation_data"] = {prop: getattr(anim_data, prop) for prop in KEY_ANIMATION_DATA_PROPERTIES}
+        saved["animation_data"]["action"] = anim_data.action
+        saved["animation_data"]["nla_tracks"] = [
+            {
+                "name": track.name,
+                "properties": {prop: getattr(track, prop) for prop in NLA_TRACK_PROPERTIES},
+                "strips": [{"name": strip.name, "frame_start": strip.frame_start, "action": strip.action,
+                            "properties": {prop: getattr(strip, prop) for prop in NLA_STRIP_PROPERTIES}}
+                           for strip in track.strips if strip.action is not None],
+            }
+            for track in anim_data.nla_tracks
+        ]
+
+    return saved
+
+
+def restore_key_datablock(key: bpy.types.Key, saved: dict) -> None:
+    """Restore on a (new) ShapeKeys datablock what was saved by save_key_datablock()."""
+
+    key.name = saved["name"]
+    for prop in KEY_PROPERTIES:
+        setattr(key, prop, saved[prop])
+    for k, v in saved["custom_properties"].items():
+        key[k] = v
+
+    saved_anim_data = saved.get("animation_data")
+    if saved_anim_data is None:
+        return
+
+    anim_data = key.animation_data_create()
+    anim_data.action = saved_anim_data["action"]
+    for prop in KEY_ANIMATION_DATA_PROPERTIES:
+        setattr(anim_data, prop, saved_anim_data[prop])
+
+    prev_track = None
+    for saved_track in saved_anim_data["nla_tracks"]:
+        track = anim_data.nla_tracks.new(prev=prev_track)
+        track.name = saved_track["name"]
+        for saved_strip in saved_track["strips"]:
+            strip = track.strips.new(name=saved_strip["name"], start=int(saved_strip["frame_start"]),
+                                     action=saved_strip["action"])
+            strip.frame_start = saved_strip["frame_start"]
+            for prop in NLA_STRIP_PROPERTIES:
+                setattr(strip, prop, saved_strip["properties"][prop])
+        # Locked and solo tracks only after adding the strips
+        for prop in NLA_TRACK_PROPERTIES:
+            setattr(track, prop, saved_track["properties"][prop])
+        prev_track = track
+
+
+def can_rebuild_key_stack(key: bpy.types.Key) -> bool:
+    """Tells whether remove_key_blocks_bulk() can replace the ShapeKeys datablock with a new one.
+    Only a Key used by its mesh alone, without drivers, and not referenced by other datablocks
+    (e.g., driver variables of other objects, or ID custom properties): those references can not be moved
+    to the new Key. References held by Python scripts can not be detected."""
+
+    if key.users != 1:
+        return False
+
+    anim_data = key.animation_data
+    if anim_data is not None and len(anim_data.drivers) > 0:
+        return False
+
+    referencing = bpy.data.user_map(subset={key})[key]
+    return all(id_data == key.user or id_data == key for id_data in referencing)
+
+
+def remove_key_blocks(obj: bpy.types.Object, names: List[str], use_bulk: bool = True) -> int:
+    """Remove key blocks: with remove_key_blocks_bulk() if use_bulk and the key stack can be rebuilt
+    (see can_rebuild_key_stack()), else one-by-one, in place, with Object.shape_key_remove().
+
+    :return: the number of removed key blocks.
+    """
+
+    key = obj.data.shape_keys
+    reference_name = key.reference_key.name
+    names = [name for name in names if name != reference_name and name in key.key_blocks]
+
+    if use_bulk and can_rebuild_key_stack(key=key):
+        return remove_key_blocks_bulk(obj=obj, names=names)
+
+    for name in names:
+        obj.shape_key_remove(key.key_blocks[name])
+
+    return len(names)
+
+
+def remove_key_blocks_bulk(obj: bpy.types.Object, names: List[str]) -> int:
+    """Remove many key blocks at once: the surviving key blocks are saved,
+    the whole key stack is cleared, and then rebuilt once with the survivors only.
+    The reference key is never removed. Key blocks relative to a removed one become relative to the reference,
+    as with Object.shape_key_remove().
+    The ShapeKeys datablock is a new one: use it only when can_rebuild_key_stack() is True. The name,
+    custom properties, evaluation time, action and NLA tracks of the old one are restored on it
+    (see save_key_datablock()). Other Key properties are not.
+
+    :return: the number of removed key blocks.
+    """
+
+    from . shape_keys_db import read_key_block_coords
+
+    mesh = obj.data  # type: bpy.types.Mesh
+    key = mesh.shape_keys
+    reference_name = key.reference_key.name
+    n_vertices = len(mesh.vertices)
+    names = set(names)
+
+    survivors = [kb for kb in key.key_blocks if kb.name not in names or kb.name == reference_name]
+    n_removed = len(key.key_blocks) - len(survivors)
+    if n_removed == 0:
+        return 0
+
+    saved = []
+    for kb in survivors:
+        entry = {prop: getattr(kb, prop) for prop in KEY_BLOCK_PROPERTIES}
+        entry["name"] = kb.name
+        entry["relative_key"] = kb.relative_key.name
+        entry["co"] = read_key_block_coords(key_block=kb, n_vertices=n_vertices)
+        saved.append(entry)
+
+    saved_key = save_key_datablock(key=key)
+
+    obj.shape_key_clear()
+
+    for entry in saved:
+        kb = obj.shape_key_add(name=entry["name"], from_mix=False)
+        kb.data.foreach_set("co", entry["co"])
+
+    key = mesh.shape_keys
+    key_blocks = key.key_blocks
+    for entry in saved:
+        kb = key_blocks[entry["name"]]
+        for prop in KEY_BLOCK_PROPERTIES:
+            setattr(kb, prop, entry[prop])
+        relative_name = entry["relative_key"]
+        kb.relative_key = key_blocks[relative_name] if relative_name in key_blocks else key.reference_key
+
+    restore_key_datablock(key=key, saved=saved_key)
+
+    mesh.update()
+
+    return n_removed
+
+
 class RemoveShapeKeys(bpy.types.Operator):
-    """Remove the shape keys listed as keys of the provided shapekeys database."""
+    """Remove the shape keys listed as keys of the provided shapekeys database, or matching name patterns."""
     bl_idname = "object.remove_shape_keys"
     bl_label = "Remove ShapeKeys from File"
 
@@ -73,6 +292,17 @@ class RemoveShapeKeys(bpy.types.Operator):
                                                   description="The json file with the description of the new ShapeKeys",
                                                   subtype="FILE_PATH")
 
+    name_patterns: bpy.props.StringProperty(name="Name Patterns",
+                                            description="Comma-separated glob patterns of the ShapeKeys to remove"
+                                                        " (e.g., 'phoneme_*, fe_*')",
+                                            default="")
+
+    use_bulk: bpy.props.BoolProperty(name="Bulk",
+                                     description="Rebuild the key stack once with the surviving ShapeKeys,"
+                                                 " instead of removing them one-by-one."
+                                                 " Only for ShapeKeys not referenced by other datablocks",
+                                     default=True)
+
     @classmethod
     def poll(cls, context):
         obj = context.active_object
@@ -84,22 +314,29 @@ class RemoveShapeKeys(bpy.types.Operator):
         return False
 
     def execute(self, context):
-        with open(self.shape_keys_filename, 'r') as keyshapes_file:
-            keyshapes_db = json.load(keyshapes_file)
+        db_names = None
+        if self.shape_keys_filename != "":
+            from . shape_keys_db import load_shape_keys_db
+            db_names = load_shape_keys_db(self.shape_keys_filename).new_key_names
+
+        patterns = [p.strip() for p in self.name_patterns.split(",") if p.strip() != ""]
+
+        if db_names is None and len(patterns) == 0:
+            self.report({'ERROR'}, "Specify a ShapeKeys file or some name patterns.")
+            return {'CANCELLED'}
 
-        #
-        # Check for the existence of all the required shapekeys
         obj = context.active_object
         assert isinstance(obj, bpy.types.Object)
         mesh = obj.data
         assert isinstance(mesh, bpy.types.Mesh)
+
+        if mesh.shape_keys is None:
+            return {'FINISHED'}
+
         key_block_names = [kb.name for kb in mesh.shape_keys.key_blocks]
+        to_remove = select_key_blocks(key_block_names=key_block_names, db_names=db_names, patterns=patterns)
 
-        for kb in key_block_names:
-            dotpos = kb.find('.')
-            kb_nodot = kb[:dotpos] if dotpos != -1 else kb
-            if kb_nodot in keyshapes_db.keys():
-                obj.shape_key_remove(mesh.shape_keys.key_blocks[kb])
+        remove_key_blocks(obj=obj, names=to_remove, use_bulk=self.use_bulk)
 
         return {'FINISHED'}
 
@@ -318,6 +555,234 @@ class UndriveShapeKeys(bpy.types.Operator):
         return {'FINISHED'}
 
 
+# Use:
+# Select the mesh, enter Object mode and invoke:
+# bpy.ops.object.bake_shape_key_control_bones(all_actions=True)
+class BakeShapeKeyControlBones(bpy.types.Operator):
+    """Bake the animation of the shape key control bones into F-Curves of the shape keys, and remove the drivers."""
+    bl_idname = "object.bake_shape_key_control_bones"
+    bl_label = "Bake Shape Key Control Bones into ShapeKey Actions"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    # The name of the baked action is the armature action name followed by this suffix.
+    BAKED_ACTION_SUFFIX = "-ShapeKeys"
+
+    action_names: bpy.props.StringProperty(name="Action Names",
+                                           description="Comma-separated list of the armature actions to bake."
+                                                       " If empty, the active action of the parent armature",
+                                           default="")
+
+    all_actions: bpy.props.BoolProperty(name="All Actions",
+                                        description="Bake all the actions animating at least one control bone",
+                                        default=False)
+
+    remove_drivers: bpy.props.BoolProperty(name="Remove Drivers",
+                                           description="Remove the control bone drivers of the baked shape keys",
+                                           default=True)
+
+    @classmethod
+    def poll(cls, context):
+        obj = context.active_object
+        if obj is not None:
+            if obj.type == 'MESH':
+                if context.mode == 'OBJECT':
+                    if obj.data.shape_keys is not None:
+                        return True
+
+        return False
+
+    def execute(self, context):
+        from . anim_utils import copy_fcurve_keyframes
+
+        mesh_obj = context.active_object
+        mesh = mesh_obj.data
+
+        parent_arm = mesh_obj.parent
+        if parent_arm is None:
+            self.report({'ERROR'}, "Object doesn't have a parent armature.")
+            return {'CANCELLED'}
+
+        # The control bone curve path of each shape key.
+        # The drivers read the bone LOC_Y in local space, which is the value of the location[1] channel.
+        control_paths = {'pose.bones["shapekey-{}"].location'.format(kb.name): kb.name
+                         for kb in mesh.shape_keys.key_blocks}
+
+        if self.all_actions:
+            actions = [act for act in bpy.data.actions
+                       if any(fc.data_path in control_paths for fc in act.fcurves)]
+        elif self.action_names != "":
+            actions = []
+            for name in [n.strip() for n in self.action_names.split(",") if n.strip() != ""]:
+                if name not in bpy.data.actions:
+                    self.report({'ERROR'}, "No action named '{}'".format(name))
+                    return {'CANCELLED'}
+                actions.append(bpy.data.actions[name])
+        else:
+            if parent_arm.animation_data is None or parent_arm.animation_data.action is None:
+                self.report({'ERROR'}, "Parent armature {} has no active action.".format(parent_arm.name))
+                return {'CANCELLED'}
+            actions = [parent_arm.animation_data.action]
+
+        baked_shape_keys = set()
+        baked_actions = []
+        for act in actions:
+            baked_name = act.name + BakeShapeKeyControlBones.BAKED_ACTION_SUFFIX
+            if baked_name in bpy.data.actions:
+                bpy.data.actions.remove(bpy.data.actions[baked_name])
+            baked_act = bpy.data.actions.new(baked_name)
+            baked_act.id_root = 'KEY'
+
+            for fc in act.fcurves:  # type: bpy.types.FCurve
+                if fc.array_index != 1 or fc.data_path not in control_paths:
+                    continue
+                sk = control_paths[fc.data_path]
+                baked_fc = baked_act.fcurves.new(data_path='key_blocks["{}"].value'.format(sk), action_group="ShapeKeys")
+                copy_fcurve_keyframes(src=fc, dst=baked_fc)
+                baked_shape_keys.add(sk)
+
+            baked_actions.append(baked_act)
+            print("Baked action '{}' into '{}' ({} curves)".format(act.name, baked_act.name, len(baked_act.fcurves)))
+
+        if self.remove_drivers:
+            for sk in baked_shape_keys:
+                mesh.shape_keys.key_blocks[sk].driver_remove('value')
+
+        # The baked version of the armature active action becomes the active ShapeKeys action.
+        if parent_arm.animation_data is not None and parent_arm.animation_data.action in actions:
+            if mesh.shape_keys.animation_data is None:
+                mesh.shape_keys.animation_data_create()
+            active_idx = actions.index(parent_arm.animation_data.action)
+            mesh.shape_keys.animation_data.action = baked_actions[active_idx]
+
+        self.report({'INFO'}, "Baked {} actions, {} shape keys.".format(len(baked_actions), len(baked_shape_keys)))
+
+        return {'FINISHED'}
+
+
+#
+#
+# ShapeKeys Export Preparation
+
+# The ShapeKeys animated at runtime by the YALLAH Unity scripts:
+# MaryTTS visemes, FacialExpressionsController, EyeBlinker, and EyeHeadGazeLogic.
+RUNTIME_SHAPE_KEY_PATTERNS = ["phoneme_*", "fe_*",
+                              "Expressions_eyeClosedL_max", "Expressions_eyeClosedR_max",
+                              "Expressions_eyesHoriz_min", "Expressions_eyesHoriz_max",
+                              "Expressions_eyesVert_min", "Expressions_eyesVert_max"]
+
+# Estimated bytes of one vertex of an FBX blend shape: index (int32), position and normal deltas (3 doubles each).
+# The FBX exporter writes only the vertices with a non-zero delta.
+FBX_BYTES_PER_SHAPE_VERTEX = 4 + 3 * 8 + 3 * 8
+
+
+def animated_key_block_names(key: bpy.types.Key) -> List[str]:
+    """The names of the key blocks targeted by the drivers or by the action of a ShapeKeys datablock."""
+    import re
+
+    if key.animation_data is None:
+        return []
+
+    fcurves = list(key.animation_data.drivers)
+    if key.animation_data.action is not None:
+        fcurves += list(key.animation_data.action.fcurves)
+
+    key_block_re = re.compile(r'^key_blocks\["(.+)"\]\.')
+    out = []
+    for fc in fcurves:
+        match = key_block_re.match(fc.data_path)
+        if match is not None:
+            out.append(match.group(1))
+
+    return out
+
+
+class PrepareShapeKeysForExport(bpy.types.Operator):
+    """Prepare the ShapeKeys of the selected meshes for the export: remove the source ShapeKeys not used at runtime,
+    and set to zero the negligible vertex deltas, so that the exported blend shapes are sparse."""
+    bl_idname = "object.prepare_shape_keys_for_export"
+    bl_label = "Prepare ShapeKeys for Export"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    runtime_patterns: bpy.props.StringProperty(name="Runtime Patterns",
+                                               description="Comma-separated glob patterns of the ShapeKeys"
+                                                           " animated at runtime. They are never removed",
+                                               default=", ".join(RUNTIME_SHAPE_KEY_PATTERNS))
+
+    source_patterns: bpy.props.StringProperty(name="Source Patterns",
+                                              description="Comma-separated glob patterns of the source ShapeKeys,"
+                                                          " removed when not used at runtime",
+                                              default="Expressions_*")
+
+    epsilon: bpy.props.FloatProperty(name="Epsilon",
+                                     description="Vertex deltas shorter than this (in object units) are set to zero."
+                                                 " 0 to skip the sparsification",
+                                     default=0.0001, min=0.0, precision=6)
+
+    @classmethod
+    def poll(cls, context):
+        if context.mode != 'OBJECT':
+            return False
+
+        return any(obj.type == 'MESH' and obj.data.shape_keys is not None for obj in context.selected_objects)
+
+    def execute(self, context):
+        from fnmatch import fnmatchcase
+
+        import numpy as np
+
+        from . shape_keys_db import read_key_block_coords
+        from . shape_keys_db import sparsify_key_blocks
+
+        runtime_patterns = [p.strip() for p in self.runtime_patterns.split(",") if p.strip() != ""]
+        source_patterns = [p.strip() for p in self.source_patterns.split(",") if p.strip() != ""]
+
+        n_removed_total = 0
+        bytes_saved = 0
+        for obj in context.selected_objects:
+            if obj.type != 'MESH' or obj.data.shape_keys is None:
+                continue
+
+            mesh = obj.data  # type: bpy.types.Mesh
+            key = mesh.shape_keys
+            n_vertices = len(mesh.vertices)
+
+            #
+            # The source keys used at runtime, directly, as relative key of a kept key, or by the animation.
+            runtime = [kb for kb in key.key_blocks if any(fnmatchcase(kb.name, p) for p in runtime_patterns)]
+            used = {kb.name for kb in runtime} | {kb.relative_key.name for kb in runtime}
+            used.update(animated_key_block_names(key=key))
+            to_remove = [kb.name for kb in key.key_blocks
+                         if kb != key.reference_key and kb.name not in used
+                         and any(fnmatchcase(kb.name, p) for p in source_patterns)]
+
+            # Estimate the size of the removed keys
+            for name in to_remove:
+                kb = key.key_blocks[name]
+                deltas = read_key_block_coords(key_block=kb, n_vertices=n_vertices) \
+                    - read_key_block_coords(key_block=kb.relative_key, n_vertices=n_vertices)
+                n_nonzero = int(np.count_nonzero(np.any(deltas.reshape(-1, 3) != 0, axis=1)))
+                bytes_saved += n_nonzero * FBX_BYTES_PER_SHAPE_VERTEX
+
+            remove_key_blocks(obj=obj, names=to_remove)
+            n_removed_total += len(to_remove)
+
+            print("'{}': removed {} unused source ShapeKeys".format(obj.name, len(to_remove)))
+
+            #
+            # Sparsify the remaining ones
+            if self.epsilon > 0 and mesh.shape_keys is not None:
+                counts = sparsify_key_blocks(mesh=mesh, epsilon=self.epsilon)
+                print("{:<40} {:>10} {:>10}".format("ShapeKey", "vertices", "zeroed"))
+                for name, (n_before, n_after) in counts.items():
+                    print("{:<40} {:>10} {:>10}".format(name, n_after, n_before - n_after))
+                    bytes_saved += (n_before - n_after) * FBX_BYTES_PER_SHAPE_VERTEX
+
+        self.report({'INFO'}, "Removed {} ShapeKeys. Estimated FBX size saved: {:.1f} kB".format(
+            n_removed_total, bytes_saved / 1024))
+
+        return {'FINISHED'}
+
+
 #
 # (UN)REGISTER
 #
@@ -328,6 +793,8 @@ def register():
     bpy.utils.register_class(RemoveShapeKeyControlBones)
     bpy.utils.register_class(DriveShapeKeys)
     bpy.utils.register_class(UndriveShapeKeys)
+    bpy.utils.register_class(BakeShapeKeyControlBones)
+    bpy.utils.register_class(PrepareShapeKeysForExport)
 
 
 def unregister():
@@ -337,6 +804,8 @@ def unregister():
     bpy.utils.unregister_class(RemoveShapeKeyControlBones)
     bpy.utils.unregister_class(DriveShapeKeys)
     bpy.utils.unregister_class(UndriveShapeKeys)
+    bpy.utils.unregister_class(BakeShapeKeyControlBones)
+    bpy.utils.unregister_class(PrepareShapeKeysForExport)
 
 
 if __name__ == "__main__":
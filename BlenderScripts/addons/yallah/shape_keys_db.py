@@ -0,0 +1,213 @@
+import bpy
+
+import json
+import os
+
+import numpy as np
+
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+# The parsed ShapeKeys json files, and the vectorized ShapeKeys computations (mixing, sparsification).
+# Kept apart from the operators in shape_key_utils, so that NumPy is imported only when a ShapeKeys operator runs.
+
+#
+#
+# ShapeKeys Database
+
+class ShapeKeysDatabase:
+    """A ShapeKeys json file, parsed once and compiled into a weights table.
+    The file maps each new ShapeKey to the weights of the existing key blocks to mix:
+    {new_key_name: {source_key_name: weight, ...}, ...}"""
+
+    def __init__(self, filename: str, mtime: float, entries: Dict[str, Dict[str, float]]):
+        self.filename = filename
+        self.mtime = mtime
+        self.entries = entries
+
+        # The rows of the weights table, one per new key, in file order.
+        self.new_key_names = list(entries.keys())  # type: List[str]
+        # The columns of the weights table, one per source key block.
+        self.source_names = sorted({name for db_entry in entries.values() for name in db_entry})  # type: List[str]
+        self.source_columns = {name: i for i, name in enumerate(self.source_names)}  # type: Dict[str, int]
+
+        self.weights = np.zeros((len(self.new_key_names), len(self.source_names)), dtype=np.float64)
+        # True where the file specifies a weight (which might be 0.0)
+        self.specified = np.zeros(self.weights.shape, dtype=bool)
+        for row, db_entry in enumerate(entries.values()):
+            for shape_key_name, weight in db_entry.items():
+                self.weights[row, self.source_columns[shape_key_name]] = weight
+                self.specified[row, self.source_columns[shape_key_name]] = True
+
+        # Cache of the source key block indices, per list of key block names of a mesh.
+        # Characters generated from the same MBLab base share the same key blocks, hence the same resolution.
+        self._resolved = {}  # type: Dict[Tuple[str, ...], Optional[np.ndarray]]
+
+    def resolve(self, mesh: bpy.types.Mesh) -> Optional[np.ndarray]:
+        """Return the key_block index of each source key (in column order), or None if some are missing."""
+
+        key_block_names = tuple(kb.name for kb in mesh.shape_keys.key_blocks)
+        if key_block_names not in self._resolved:
+            kb_indices = {name: i for i, name in enumerate(key_block_names)}
+            if all(name in kb_indices for name in self.source_names):
+                self._resolved[key_block_names] = np.array([kb_indices[name] for name in self.source_names],
+                                                           dtype=np.int32)
+            else:
+                self._resolved[key_block_names] = None
+
+        return self._resolved[key_block_names]
+
+    def missing_key_blocks(self, mesh: bpy.types.Mesh) -> List[str]:
+        """The source key names that the mesh doesn't have."""
+        key_block_names = set(kb.name for kb in mesh.shape_keys.key_blocks)
+        return [name for name in self.source_names if name not in key_block_names]
+
+
+# The parsed databases, by absolute path.
+_SHAPE_KEYS_DB_CACHE = {}  # type: Dict[str, ShapeKeysDatabase]
+
+
+def load_shape_keys_db(filename: str) -> ShapeKeysDatabase:
+    """Get the parsed database of a ShapeKeys json file.
+    The file is parsed again only if its modification time changed since the last call."""
+
+    filename = os.path.abspath(filename)
+    mtime = os.path.getmtime(filename)
+
+    db = _SHAPE_KEYS_DB_CACHE.get(filename)
+    if db is None or db.mtime != mtime:
+        with open(filename, 'r') as keyshapes_file:
+            entries = json.load(keyshapes_file)
+        db = ShapeKeysDatabase(filename=filename, mtime=mtime, entries=entries)
+        _SHAPE_KEYS_DB_CACHE[filename] = db
+
+    return db
+
+
+def clear_shape_keys_db_cache() -> None:
+    _SHAPE_KEYS_DB_CACHE.clear()
+
+
+#
+#
+# ShapeKeys Generation
+
+def read_key_block_coords(key_block: bpy.types.ShapeKey, n_vertices: int) -> np.ndarray:
+    """Read the coordinates of a key block as a flat float32 array of length n_vertices*3."""
+    coords = np.empty(n_vertices * 3, dtype=np.float32)
+    key_block.data.foreach_get("co", coords)
+    return coords
+
+
+def can_mix_vectorized(mesh: bpy.types.Mesh, db: ShapeKeysDatabase) -> bool:
+    """Tells whether mix_shape_keys() reproduces what Blender computes with from_mix=True.
+    This is the case for relative shape keys not restricted by a vertex group."""
+
+    if not mesh.shape_keys.use_relative:
+        return False
+
+    key_blocks = mesh.shape_keys.key_blocks
+    for kb_idx in db.resolve(mesh=mesh):
+        if key_blocks[kb_idx].vertex_group != "":
+            return False
+
+    return True
+
+
+def mix_shape_keys(mesh: bpy.types.Mesh, db: ShapeKeysDatabase) -> Dict[str, np.ndarray]:
+    """Compute the coordinates of all the new ShapeKeys described in the database,
+    as a single weighted product between the weights table and the deltas of the source key blocks.
+
+    :param mesh: The mesh owning the source key blocks.
+    :param db: The database, whose source keys must all be in the mesh.
+    :return: A dictionary {new_key_name: flat float32 coordinates array}, ready to be used with foreach_set("co", ...)
+    """
+
+    key_blocks = mesh.shape_keys.key_blocks
+    n_vertices = len(mesh.vertices)
+    source_kbs = [key_blocks[kb_idx] for kb_idx in db.resolve(mesh=mesh)]
+
+    # Each key block is read only once, even if it is the relative key of many others.
+    coords_cache = {}  # type: Dict[str, np.ndarray]
+
+    def coords_of(kb: bpy.types.ShapeKey) -> np.ndarray:
+        if kb.name not in coords_cache:
+            coords_cache[kb.name] = read_key_block_coords(key_block=kb, n_vertices=n_vertices)
+        return coords_cache[kb.name]
+
+    deltas = np.empty((len(source_kbs), n_vertices * 3), dtype=np.float32)
+    for i, kb in enumerate(source_kbs):
+        deltas[i] = coords_of(kb) - coords_of(kb.relative_key)
+
+    # Weights are clamped and muted keys ignored, as it happens when setting the key_block values.
+    slider_min = np.array([kb.slider_min for kb in source_kbs])
+    slider_max = np.array([kb.slider_max for kb in source_kbs])
+    active = np.array([not kb.mute for kb in source_kbs])
+    weights = np.clip(db.weights, slider_min, slider_max) * (db.specified & active)
+
+    basis = coords_of(mesh.shape_keys.reference_key).astype(np.float64)
+    mixed = basis + weights @ deltas.astype(np.float64)
+
+    return {name: mixed[row].astype(np.float32) for row, name in enumerate(db.new_key_names)}
+
+
+#
+#
+# ShapeKeys Sparsification
+
+def sparsify_key_blocks(mesh: bpy.types.Mesh, epsilon: float) -> Dict[str, Tuple[int, int]]:
+    """Set to zero the vertex deltas shorter than epsilon, in all the key blocks but the reference one.
+    Deltas are relative to the relative_key of each key block.
+    Key blocks are processed after their relative key: the vertices of a key block move together with the ones
+    zeroed in its relative key, so that chained key blocks keep their own deltas.
+
+    :return: For each key block, the number of vertices with a non-zero delta before and after.
+    """
+
+    key = mesh.shape_keys
+    n_vertices = len(mesh.vertices)
+
+    coords = {kb.name: read_key_block_coords(key_block=kb, n_vertices=n_vertices).reshape(-1, 3)
+              for kb in key.key_blocks}
+
+    # Relative key dependency order. Key blocks in a relative key cycle come last, in stack order.
+    ordered = []  # type: List[bpy.types.ShapeKey]
+    done = {key.reference_key.name}
+    pending = [kb for kb in key.key_blocks if kb != key.reference_key]
+    while len(pending) > 0:
+        ready = [kb for kb in pending if kb.relative_key.name in done]
+        if len(ready) == 0:
+            ready = pending
+        ordered.extend(ready)
+        done.update(kb.name for kb in ready)
+        pending = [kb for kb in pending if kb.name not in done]
+
+    # The displacement of the vertices of the key blocks changed so far
+    corrections = {}  # type: Dict[str, np.ndarray]
+
+    out = {}
+    for kb in ordered:
+        co = coords[kb.name]
+        relative_co = coords[kb.relative_key.name]
+        correction = corrections.get(kb.relative_key.name)
+        if correction is not None:
+            co = co + correction
+
+        lengths = np.linalg.norm(co.astype(np.float64) - relative_co, axis=1)
+        nonzero = lengths > 0
+        small = nonzero & (lengths < epsilon)
+
+        if np.any(small) or correction is not None:
+            new_co = co.copy()
+            new_co[small] = relative_co[small]
+            kb.data.foreach_set("co", new_co.ravel())
+            corrections[kb.name] = new_co - coords[kb.name]
+            coords[kb.name] = new_co
+
+        out[kb.name] = int(nonzero.sum()), int(nonzero.sum() - small.sum())
+
+    mesh.update()
+
+    return out
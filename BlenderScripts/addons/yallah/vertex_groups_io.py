@@ -0,0 +1,162 @@
+# Reading and writing of vertex group files (e.g., the Clothes masks).
+#
+# Supported formats:
+# * .json with plain lists: {"group": [idx, idx, ...], ...}  (the original format)
+# * .json with weights: {"group": {"indices": [...], "weights": [...]}, ...}
+# * .json with ranges: {"group": {"ranges": [[start, stop], ...], "weights": [...]}, ...}
+#   Ranges are half-open, like python ranges. "weights" is optional and follows the order of the expanded indices.
+# * .npz: for each group, an int32 array "<group>.ranges" of shape (n, 2) and an optional float32 "<group>.weights".
+#   Members are stored uncompressed. load_vertex_groups_file() reads all the groups at once, since
+#   LoadVertexGroups creates all of them anyway.
+#
+# This module doesn't depend on bpy, so it can be used from the command line to convert the existing masks:
+#   python vertex_groups_io.py data/ClothesMasks-F_CA01.json data/ClothesMasks-F_CA01.npz
+
+import json
+import os
+
+import numpy as np
+
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+# The indices and the (optional) weights of a vertex group
+VertexGroupData = Tuple[np.ndarray, Optional[np.ndarray]]
+
+RANGES_SUFFIX = ".ranges"
+WEIGHTS_SUFFIX = ".weights"
+
+
+def indices_to_ranges(indices: np.ndarray) -> np.ndarray:
+    """Encode a sorted array of unique indices as an (n, 2) array of half-open [start, stop) ranges."""
+
+    if len(indices) == 0:
+        return np.empty((0, 2), dtype=np.int32)
+
+    # Positions where a run of consecutive indices breaks
+    breaks = np.nonzero(np.diff(indices) != 1)[0] + 1
+    starts = np.concatenate(([indices[0]], indices[breaks]))
+    stops = np.concatenate((indices[breaks - 1], [indices[-1]])) + 1
+
+    return np.stack((starts, stops), axis=1).astype(np.int32)
+
+
+def ranges_to_indices(ranges: np.ndarray) -> np.ndarray:
+    """Expand an (n, 2) array of half-open ranges into the array of indices."""
+
+    ranges = np.asarray(ranges, dtype=np.int32).reshape(-1, 2)
+    if len(ranges) == 0:
+        return np.empty(0, dtype=np.int32)
+
+    return np.concatenate([np.arange(start, stop, dtype=np.int32) for start, stop in ranges])
+
+
+def sort_vertex_group(indices: np.ndarray, weights: Optional[np.ndarray]) -> VertexGroupData:
+    """Sort the indices (removing duplicates), keeping the weights aligned."""
+
+    indices, first_pos = np.unique(indices, return_index=True)
+    if weights is not None:
+        weights = np.asarray(weights)[first_pos]
+
+    return indices, weights
+
+
+def load_vertex_groups_file(filename: str) -> Dict[str, VertexGroupData]:
+    """Load a vertex groups file, in any of the supported formats.
+
+    :param filename: The .json or .npz file.
+    :return: A dictionary {group_name: (indices, weights)}, with all the groups of the file already read.
+     weights is None when all weights are 1.0.
+    """
+
+    out = {}  # type: Dict[str, VertexGroupData]
+
+    if filename.endswith(".npz"):
+        with np.load(filename) as npz:
+            for key in npz.files:
+                if not key.endswith(RANGES_SUFFIX):
+                    continue
+                group_name = key[:-len(RANGES_SUFFIX)]
+                indices = ranges_to_indices(npz[key])
+                weights_key = group_name + WEIGHTS_SUFFIX
+                weights = npz[weights_key] if weights_key in npz.files else None
+                out[group_name] = indices, weights
+
+        return out
+
+    with open(filename, "r") as in_file:
+        in_dict = json.load(fp=in_file)
+
+    for group_name, entry in in_dict.items():
+        if isinstance(entry, list):
+            out[group_name] = np.asarray(entry, dtype=np.int32), None
+        elif isinstance(entry, dict):
+            if "ranges" in entry:
+                indices = ranges_to_indices(np.asarray(entry["ranges"]))
+            else:
+                indices = np.asarray(entry["indices"], dtype=np.int32)
+            weights = np.asarray(entry["weights"], dtype=np.float32) if "weights" in entry else None
+            out[group_name] = indices, weights
+        else:
+            raise Exception("Unexpected entry type {} for vertex group '{}'".format(type(entry), group_name))
+
+    return out
+
+
+def save_vertex_groups_file(filename: str, groups: Dict[str, VertexGroupData], use_ranges: bool = False) -> None:
+    """Save the vertex groups. The format is chosen by the filename extension.
+
+    :param filename: The .json or .npz file to write.
+    :param groups: A dictionary {group_name: (indices, weights)}. weights can be None.
+    :param use_ranges: For JSON files, encode the indices as ranges. NPZ files always use ranges.
+    """
+
+    if filename.endswith(".npz"):
+        arrays = {}  # type: Dict[str, np.ndarray]
+        for group_name, (indices, weights) in groups.items():
+            indices, weights = sort_vertex_group(np.asarray(indices), weights)
+            arrays[group_name + RANGES_SUFFIX] = indices_to_ranges(indices)
+            if weights is not None:
+                arrays[group_name + WEIGHTS_SUFFIX] = np.asarray(weights, dtype=np.float32)
+
+        np.savez(filename, **arrays)
+        return
+
+    out_dict = {}
+    for group_name, (indices, weights) in groups.items():
+        if use_ranges:
+            indices, weights = sort_vertex_group(np.asarray(indices), weights)
+            entry = {"ranges": indices_to_ranges(indices).tolist()}
+            if weights is not None:
+                entry["weights"] = np.asarray(weights).tolist()
+            out_dict[group_name] = entry
+        elif weights is not None:
+            out_dict[group_name] = {"indices": np.asarray(indices).tolist(), "weights": np.asarray(weights).tolist()}
+        else:
+            out_dict[group_name] = np.asarray(indices).tolist()
+
+    with open(filename, "w") as out_file:
+        json.dump(obj=out_dict, fp=out_file)
+
+
+def convert_vertex_groups_file(in_filename: str, out_filename: str, use_ranges: bool = True) -> None:
+    """Convert a vertex groups file into another format (e.g., the JSON clothes masks into .npz)."""
+
+    groups = load_vertex_groups_file(in_filename)
+    save_vertex_groups_file(out_filename, groups, use_ranges=use_ranges)
+
+    print("Converted {} groups: '{}' ({} bytes) -> '{}' ({} bytes)".format(
+        len(groups), in_filename, os.path.getsize(in_filename), out_filename, os.path.getsize(out_filename)))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert YALLAH vertex groups files (.json, ranges .json, .npz)")
+    parser.add_argument("in_filename", help="The file to read")
+    parser.add_argument("out_filename", help="The file to write. The format is chosen from the extension.")
+    parser.add_argument("--no-ranges", action="store_true", help="For JSON output, write plain index lists.")
+    args = parser.parse_args()
+
+    convert_vertex_groups_file(args.in_filename, args.out_filename, use_ranges=not args.no_ranges)
@@ -1,15 +1,63 @@
 import bpy
 
+from typing import Dict
+from typing import List
+
+
+def add_weighted_vertices(vg: bpy.types.VertexGroup, indices: List[int], weights: List[float]) -> None:
+    """Add the vertices to the group with their own weight.
+    vg.add() accepts only one weight per call, so the vertices are batched by weight value."""
+
+    assert len(indices) == len(weights)
+
+    by_weight = {}  # type: Dict[float, List[int]]
+    for idx, w in zip(indices, weights):
+        by_weight.setdefault(w, []).append(idx)
+
+    for w, idxs in by_weight.items():
+        vg.add(idxs, weight=w, type='REPLACE')
+
+
+def collect_vertex_groups(obj: bpy.types.Object, group_names: List[str]) -> Dict[str, Dict[str, list]]:
+    """Collect indices and weights of the requested vertex groups with a single pass over the mesh vertices.
+
+    :param obj: The MESH object.
+    :param group_names: The names of the groups to collect. If empty, all groups are collected.
+    :return: A dictionary {group_name: {"indices": [...], "weights": [...]}, ...}
+    """
+
+    mesh = obj.data  # type: bpy.types.Mesh
+
+    if len(group_names) == 0:
+        group_names = [vg.name for vg in obj.vertex_groups]
+
+    # Map from group index to the output entry. Groups not requested are not in the map.
+    out_dict = {}  # type: Dict[str, Dict[str, list]]
+    entries = {}  # type: Dict[int, Dict[str, list]]
+    for name in group_names:
+        entry = {"indices": [], "weights": []}
+        out_dict[name] = entry
+        entries[obj.vertex_groups[name].index] = entry
+
+    for v in mesh.vertices:
+        for g in v.groups:
+            entry = entries.get(g.group)
+            if entry is not None:
+                entry["indices"].append(v.index)
+                entry["weights"].append(g.weight)
+
+    return out_dict
+
 
 class LoadVertexGroups(bpy.types.Operator):
-    """Operator to load the vertex groups from a JSON file."""
+    """Operator to load the vertex groups from a JSON (plain, weighted, or ranges) or NPZ file."""
 
     bl_idname = "object.load_vertex_groups"
     bl_label = "Load and create a vertex group from a JSON dictionary file."
 
     vertex_groups_filename: bpy.props.StringProperty(
         name="VertexGroupdFile",
-        description="The json file with the description of the vertex groups to load",
+        description="The json or npz file with the description of the vertex groups to load",
         subtype="FILE_PATH")
 
     replace_existing: bpy.props.BoolProperty(
@@ -29,8 +77,6 @@ class LoadVertexGroups(bpy.types.Operator):
 
     def execute(self, context):
 
-        import json
-
         obj = context.active_object  # type: bpy.types.Object
 
         if not obj.type == 'MESH':
@@ -38,13 +84,13 @@ class LoadVertexGroups(bpy.types.Operator):
 
         try:
             print("Loading groups info from '{}'".format(self.vertex_groups_filename))
-            with open(self.vertex_groups_filename, "r") as in_file:
-                in_dict = json.load(fp=in_file)
+            from . vertex_groups_io import load_vertex_groups_file
+            groups = load_vertex_groups_file(self.vertex_groups_filename)
         except Exception as e:
-            self.report({'ERROR'}, "Exception loading JON file: {}.".format(e))
+            self.report({'ERROR'}, "Exception loading vertex groups file: {}.".format(e))
             return {'CANCELLED'}
 
-        for groupName in in_dict.keys():
+        for groupName, (group_vertices, group_weights) in groups.items():
 
             # If the group already exist, remove it
             if groupName in obj.vertex_groups:
@@ -57,9 +103,10 @@ class LoadVertexGroups(bpy.types.Operator):
 
             # print("Creating group '{}'".format(groupName))
             vg = obj.vertex_groups.new(name=groupName)
-            group_vertices = in_dict[groupName]
-            assert isinstance(group_vertices, list)
-            vg.add(group_vertices, weight=1.0, type='REPLACE')
+            if group_weights is not None:
+                add_weighted_vertices(vg=vg, indices=group_vertices.tolist(), weights=group_weights.tolist())
+            else:
+                vg.add(group_vertices.tolist(), weight=1.0, type='REPLACE')
 
         return {'FINISHED'}
 
@@ -89,15 +136,11 @@ class SaveVertexGroups(bpy.types.Operator):
 
         import json
 
-        #
-        # Solution found here:
-        # https://blender.stackexchange.com/questions/75223/python-finding-vertices-in-a-vertex-group
         obj = context.active_object  # type: bpy.types.Object
-        mesh = obj.data  # type: bpy.types.Mesh
         vg_idx = obj.vertex_groups.active_index
-        vs = [v.index for v in mesh.vertices if vg_idx in [vg.group for vg in v.groups]]
-
         vg_name = obj.vertex_groups[vg_idx].name
+        vs = collect_vertex_groups(obj=obj, group_names=[vg_name])[vg_name]["indices"]
+
         out_dict = {vg_name: vs}
 
         try:
@@ -111,11 +154,83 @@ class SaveVertexGroups(bpy.types.Operator):
         return {'FINISHED'}
 
 
+class SaveAllVertexGroups(bpy.types.Operator):
+    """Save the indices and weights of all the vertex groups (or a subset of them) onto a JSON or NPZ file."""
+
+    bl_idname = "object.save_all_vertex_groups"
+    bl_label = "Save the indices and weights of all the vertex groups onto a JSON or NPZ file."
+
+    vertex_groups_filename: bpy.props.StringProperty(
+        name="VertexGroupsFile",
+        description="The json or npz file that will be written.",
+        subtype="FILE_PATH")
+
+    group_names: bpy.props.StringProperty(
+        name="Group Names",
+        default="",
+        description="Comma-separated list of the vertex groups to save. If empty, all groups are saved.")
+
+    save_weights: bpy.props.BoolProperty(
+        name="Save Weights",
+        default=True,
+        description="If True, groups with weights different from 1.0 are saved with their weights."
+                    " Otherwise, only the indices are saved, as for the Clothes masks.")
+
+    use_ranges: bpy.props.BoolProperty(
+        name="Use Ranges",
+        default=False,
+        description="If True, JSON files store the indices as [start, stop] ranges. NPZ files always use ranges.")
+
+    @classmethod
+    def poll(cls, context):
+        obj = context.active_object
+        if obj is not None:
+            if obj.type == 'MESH':
+                if context.mode == 'OBJECT':
+                    return True
+
+        return False
+
+    def execute(self, context):
+
+        obj = context.active_object  # type: bpy.types.Object
+
+        group_names = [n.strip() for n in self.group_names.split(",") if n.strip() != ""]
+        for name in group_names:
+            if name not in obj.vertex_groups:
+                self.report({'ERROR'}, "Object {} has no vertex group named '{}'.".format(obj.name, name))
+                return {'CANCELLED'}
+
+        groups = collect_vertex_groups(obj=obj, group_names=group_names)
+
+        # Groups with uniform unit weight are saved without weights, so that they stay readable by older versions.
+        out_groups = {}
+        for name, entry in groups.items():
+            if self.save_weights and any(w != 1.0 for w in entry["weights"]):
+                out_groups[name] = entry["indices"], entry["weights"]
+            else:
+                out_groups[name] = entry["indices"], None
+
+        try:
+            from . vertex_groups_io import save_vertex_groups_file
+            save_vertex_groups_file(self.vertex_groups_filename, out_groups, use_ranges=self.use_ranges)
+
+        except Exception as e:
+            self.report({'ERROR'}, "Exception saving the vertex groups file: {}.".format(e))
+            return {'CANCELLED'}
+
+        self.report({'INFO'}, "Saved {} vertex groups.".format(len(out_groups)))
+
+        return {'FINISHED'}
+
+
 def register():
     bpy.utils.register_class(LoadVertexGroups)
     bpy.utils.register_class(SaveVertexGroups)
+    bpy.utils.register_class(SaveAllVertexGroups)
 
 
 def unregister():
     bpy.utils.unregister_class(LoadVertexGroups)
     bpy.utils.unregister_class(SaveVertexGroups)
+    bpy.utils.unregister_class(SaveAllVertexGroups)
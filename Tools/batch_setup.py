@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+#
+# Headless batch setup of MBLab characters.
+#
+# Runs the YALLAH setup on a set of .blend files, each in its own background Blender process,
+# with N processes in parallel. No display is needed.
+#
+# Usage:
+#   python3 batch_setup.py Characters/ --output-dir SetupCharacters/ --jobs 4
+#   python3 batch_setup.py manifest.txt --blender /opt/blender/blender
+#
+# The input is either a directory (all .blend files in it) or a manifest: a text file with one .blend path per line,
+# or a JSON file with a list of paths. Relative paths in a manifest are relative to the manifest itself.
+#
+# For each file, a <name>.json report is written next to the output .blend (files with the same name from
+# different directories get a -2, -3, ... suffix),
+# and all the reports are collected into the summary file (default: <output-dir>/batch_report.json).
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from typing import List
+
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Same layout used by the BlenderScenes launch scripts
+DEFAULT_BLENDER_EXE = os.path.join(TOOLS_DIR, "..", "BlenderExe", "blender")
+BLENDER_USER_SCRIPTS = os.path.join(TOOLS_DIR, "..", "BlenderScripts")
+
+WORKER_EXPR = "import addon_utils; addon_utils.enable('yallah', default_set=False);" \
+              " import yallah.batch_setup; yallah.batch_setup.main()"
+
+
+def list_input_files(input_path: str) -> List[str]:
+    if os.path.isdir(input_path):
+        return sorted(os.path.join(input_path, f) for f in os.listdir(input_path) if f.endswith(".blend"))
+
+    manifest_dir = os.path.dirname(os.path.abspath(input_path))
+    with open(input_path, "r") as manifest_file:
+        if input_path.endswith(".json"):
+            entries = json.load(manifest_file)
+        else:
+            entries = [line.strip() for line in manifest_file if line.strip() != "" and not line.startswith("#")]
+
+    return [os.path.join(manifest_dir, e) for e in entries]
+
+
+def output_base_names(in_files: List[str]) -> List[str]:
+    """The base name of the output files of each input file.
+    Input files with the same name (from different directories) get a numeric suffix, in input order."""
+
+    out = []
+    used = set()
+    for in_filename in in_files:
+        base_name = os.path.splitext(os.path.basename(in_filename))[0]
+        candidate = base_name
+        n = 2
+        while candidate in used:
+            candidate = "{}-{}".format(base_name, n)
+            n += 1
+        used.add(candidate)
+        out.append(candidate)
+
+    return out
+
+
+def run_worker(blender_exe: str, in_filename: str, base_name: str, output_dir: str, timeout: float) -> dict:
+    out_filename = os.path.abspath(os.path.join(output_dir, base_name + ".blend"))
+    report_filename = os.path.abspath(os.path.join(output_dir, base_name + ".json"))
+    log_filename = os.path.abspath(os.path.join(output_dir, base_name + ".log"))
+
+    env = dict(os.environ)
+    env["BLENDER_USER_SCRIPTS"] = os.path.abspath(BLENDER_USER_SCRIPTS)
+
+    cmd = [blender_exe, "-b", in_filename, "--python-exit-code", "1", "--python-expr", WORKER_EXPR,
+           "--", "--output", out_filename, "--report", report_filename]
+
+    # The results of a previous run must not be taken for the ones of this run
+    for filename in [out_filename, report_filename]:
+        if os.path.exists(filename):
+            os.remove(filename)
+
+    print("Starting '{}'".format(in_filename))
+    start = time.perf_counter()
+    try:
+        with open(log_filename, "w") as log_file:
+            proc = subprocess.run(cmd, env=env, stdout=log_file, stderr=subprocess.STDOUT, timeout=timeout)
+        exit_code = proc.returncode
+    except subprocess.TimeoutExpired:
+        exit_code = None
+    wall_seconds = time.perf_counter() - start
+
+    if os.path.exists(report_filename):
+        with open(report_filename, "r") as report_file:
+            report = json.load(report_file)
+    else:
+        report = {"file": in_filename, "output": out_filename, "status": "error",
+                  "error": "timeout" if exit_code is None else "no report (see log)"}
+
+    if exit_code != 0 and report["status"] != "error":
+        report["status"] = "error"
+        report["error"] = "timeout" if exit_code is None else "exit code {} (see log)".format(exit_code)
+
+    report["exit_code"] = exit_code
+    report["wall_seconds"] = wall_seconds
+    report["log"] = log_filename
+
+    print("Done '{}': {} ({:.1f}s)".format(in_filename, report["status"], wall_seconds))
+
+    return report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Setup MBLab characters with YALLAH in background Blender processes.")
+    parser.add_argument("input", help="A directory with .blend files, or a manifest (.txt or .json) listing them")
+    parser.add_argument("--output-dir", required=True, help="Where to save the set up .blend files and the reports")
+    parser.add_argument("--blender", default=DEFAULT_BLENDER_EXE, help="The Blender executable")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count(), help="Number of parallel Blender processes")
+    parser.add_argument("--timeout", type=float, default=None, help="Maximum seconds per file")
+    parser.add_argument("--report", default=None, help="The summary report file")
+    args = parser.parse_args()
+
+    in_files = list_input_files(args.input)
+    base_names = output_base_names(in_files)
+
+    # The outputs must not overwrite the inputs (e.g., when the output dir is the input dir)
+    in_real_paths = {os.path.realpath(f) for f in in_files}
+    for base_name in base_names:
+        out_filename = os.path.realpath(os.path.join(args.output_dir, base_name + ".blend"))
+        if out_filename in in_real_paths:
+            parser.error("The output file '{}' would overwrite an input file. Choose another --output-dir".format(
+                out_filename))
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    # Threads are enough: the work is done by the Blender subprocesses.
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        reports = list(executor.map(lambda f, b: run_worker(args.blender, f, b, args.output_dir, args.timeout),
+                                    in_files, base_names))
+
+    summary = {
+        "files": reports,
+        "n_ok": sum(1 for r in reports if r["status"] == "ok"),
+        "n_skipped": sum(1 for r in reports if r["status"] == "skipped"),
+        "n_error": sum(1 for r in reports if r["status"] == "error"),
+        "jobs": args.jobs,
+        "wall_seconds": time.perf_counter() - start,
+    }
+
+    summary_filename = args.report if args.report is not None else os.path.join(args.output_dir, "batch_report.json")
+    with open(summary_filename, "w") as summary_file:
+        json.dump(obj=summary, fp=summary_file, indent=2)
+
+    print("{} ok, {} skipped, {} errors. Report in '{}'".format(
+        summary["n_ok"], summary["n_skipped"], summary["n_error"], summary_filename))
+
+    return 0 if summary["n_error"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
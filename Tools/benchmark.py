@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+#
+# Benchmarks of the YALLAH operators on synthetic MBLab-like fixtures, in a background Blender process.
+#
+# Usage:
+#   python3 benchmark.py run --output bench-before.json --vertices 20000 --keys 80
+#   python3 benchmark.py run --output bench-after.json --vertices 20000 --keys 80
+#   python3 benchmark.py compare bench-before.json bench-after.json --threshold 0.1
+#
+# The results of "run" are a JSON file with the timings of each benchmark (see yallah/benchmark.py),
+# labelled with the current git commit. "compare" prints the ratio of the median times,
+# and exits with an error code if any benchmark got slower than the threshold.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from typing import List
+from typing import Optional
+
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Same layout used by the BlenderScenes launch scripts
+DEFAULT_BLENDER_EXE = os.path.join(TOOLS_DIR, "..", "BlenderExe", "blender")
+BLENDER_USER_SCRIPTS = os.path.join(TOOLS_DIR, "..", "BlenderScripts")
+
+WORKER_EXPR = "import addon_utils; addon_utils.enable('yallah', default_set=False);" \
+              " import yallah.benchmark; yallah.benchmark.main()"
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=TOOLS_DIR,
+                                       stderr=subprocess.DEVNULL).decode("utf-8").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args: argparse.Namespace, worker_args: List[str]) -> int:
+    commit = git_commit()
+    output = args.output if args.output is not None else "benchmark-{}.json".format(commit or "unknown")
+    output = os.path.abspath(output)
+
+    env = dict(os.environ)
+    env["BLENDER_USER_SCRIPTS"] = os.path.abspath(BLENDER_USER_SCRIPTS)
+
+    cmd = [args.blender, "-b", "--factory-startup", "--python-exit-code", "1", "--python-expr", WORKER_EXPR,
+           "--", "--output", output, "--label", commit or ""] + worker_args
+
+    proc = subprocess.run(cmd, env=env)
+    if proc.returncode != 0 or not os.path.exists(output):
+        print("Benchmark process failed with exit code {}".format(proc.returncode))
+        return 1
+
+    with open(output, "r") as in_file:
+        results = json.load(in_file)
+    print_results(results)
+
+    return 0
+
+
+def print_results(results: dict) -> None:
+    print("YALLAH {} on Blender {} ({})".format(results["yallah_version"], results["blender_version"],
+                                               results.get("label", "")))
+    print("Params: {}".format(results["params"]))
+    if results.get("addon_ready_seconds") is not None:
+        print("  {:<40} {:9.4f}s".format("add-on time-to-ready", results["addon_ready_seconds"]))
+    for name, res in results["benchmarks"].items():
+        if "error" in res:
+            print("  {:<40} error: {}".format(name, res["error"]))
+        else:
+            print("  {:<40} min {:9.4f}s  median {:9.4f}s".format(name, res["min"], res["median"]))
+
+
+def compare(args: argparse.Namespace) -> int:
+    with open(args.baseline, "r") as in_file:
+        baseline = json.load(in_file)
+    with open(args.current, "r") as in_file:
+        current = json.load(in_file)
+
+    if baseline["params"] != current["params"]:
+        print("WARNING: the results were computed with different params:\n  {}\n  {}".format(
+            baseline["params"], current["params"]))
+
+    n_regressions = 0
+    print("{:<40} {:>10} {:>10} {:>8}".format("benchmark", baseline.get("label", "baseline"),
+                                              current.get("label", "current"), "ratio"))
+    for name, cur in current["benchmarks"].items():
+        base = baseline["benchmarks"].get(name)
+        if base is None or "median" not in base or "median" not in cur:
+            print("{:<40} {:>10} {:>10}".format(name, "-" if base is None or "median" not in base else "",
+                                               "error" if "median" not in cur else ""))
+            continue
+
+        ratio = cur["median"] / base["median"] if base["median"] > 0 else float("inf")
+        flag = ""
+        if ratio > 1 + args.threshold:
+            flag = "  REGRESSION"
+            n_regressions += 1
+        print("{:<40} {:9.4f}s {:9.4f}s {:7.2f}x{}".format(name, base["median"], cur["median"], ratio, flag))
+
+    return 0 if n_regressions == 0 else 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the YALLAH operators in a background Blender process.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="Run the benchmarks. Unknown arguments (e.g., --vertices 20000 --keys 80"
+                                            " --benchmarks CreateShapeKeys) are passed to yallah.benchmark")
+    run_parser.add_argument("--output", default=None, help="The results file (default: benchmark-<commit>.json)")
+    run_parser.add_argument("--blender", default=DEFAULT_BLENDER_EXE, help="The Blender executable")
+
+    compare_parser = sub.add_parser("compare", help="Compare two results files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="Relative slowdown of the median time considered a regression")
+
+    args, worker_args = parser.parse_known_args()
+
+    if args.command == "run":
+        return run(args, worker_args)
+    else:
+        if len(worker_args) > 0:
+            parser.error("unrecognized arguments: {}".format(" ".join(worker_args)))
+        return compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())